@@ -0,0 +1,133 @@
+"""Admission control for assessment submissions.
+
+Under a traffic spike every worker ends up waiting on SQLite commits. New
+requests then sit in the socket backlog until their clients give up. Instead,
+a submission is refused at once with 503 and Retry-After when:
+
+- the worker already runs max_in_flight submissions (this matters for
+  threaded workers; a sync worker only ever runs one);
+- the request waited in the router queue longer than max_queue_ms, as told
+  by the X-Request-Start header. This is the signal that reaches across
+  workers: with sync workers a backlog shows up as queue time, not in-flight
+  requests;
+- the circuit breaker is open. The breaker tracks a moving average of save
+  latency, where a failed save counts as a slow one, and opens when the
+  average passes latency_ms. Each sample is capped at twice latency_ms, so a
+  single lock timeout cannot open it alone. After cooldown seconds a single
+  probe submission is let through; its outcome decides whether the breaker
+  closes or opens again.
+
+Breaker and in-flight state are per worker process, like the login limiter.
+Every worker writes to the same database, so their breakers trip together.
+"""
+import math
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class Overloaded(Exception):
+    """A submission was shed; reason is 'in_flight', 'queue' or 'circuit'."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"shed: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def queue_ms(header, now=None):
+    """Milliseconds since an X-Request-Start value ('t=' optional; seconds, ms or µs since the epoch), or None."""
+    try:
+        start = float((header or '').strip().removeprefix('t='))
+    except ValueError:
+        return None
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+    return max(0.0, ((now or time.time()) - start) * 1000)
+
+
+class AdmissionController:
+    """In-flight limit, queue-age check and save-latency circuit breaker for one worker process."""
+
+    def __init__(self, max_in_flight=8, max_queue_ms=3000, latency_ms=500, cooldown=5.0, smoothing=0.2,
+                 min_samples=5):
+        self.max_in_flight = max_in_flight
+        self.max_queue_ms = max_queue_ms
+        self.latency_ms = latency_ms
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.min_samples = min_samples
+        self.in_flight = 0
+        self.state = CLOSED
+        self.shed = Counter()
+        self._average_ms = 0.0
+        self._samples = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def _trip(self, now):
+        self.state = OPEN
+        self._open_until = now + self.cooldown
+
+    @contextmanager
+    def admit(self, request_start=None):
+        """Run a submission inside the limits, or raise Overloaded before it starts."""
+        now = time.monotonic()
+        probe = False
+        with self._lock:
+            if self.state == OPEN and now >= self._open_until:
+                self.state = HALF_OPEN
+                probe = True
+            elif self.state != CLOSED:
+                self.shed['circuit'] += 1
+                raise Overloaded('circuit', max(1, math.ceil(self._open_until - now)))
+            if self.in_flight >= self.max_in_flight:
+                self.shed['in_flight'] += 1
+                if probe:
+                    self.state = OPEN
+                raise Overloaded('in_flight', 1)
+            waited = queue_ms(request_start) if self.max_queue_ms and request_start else None
+            if waited is not None and waited > self.max_queue_ms:
+                self.shed['queue'] += 1
+                if probe:
+                    self.state = OPEN
+                raise Overloaded('queue', 1)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                if probe and self.state == HALF_OPEN:
+                    # The probe ended without reaching the database (e.g. invalid input); let the next one probe
+                    self.state = OPEN
+                    self._open_until = time.monotonic()
+
+    def observe(self, seconds, failed=False):
+        """Record how long a save took; a failed save counts as the slowest sample the average takes."""
+        cap = 2 * self.latency_ms
+        elapsed_ms = cap if failed else min(seconds * 1000, cap)
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed or elapsed_ms > self.latency_ms:
+                    self._trip(now)
+                else:
+                    self.state = CLOSED
+                    self._average_ms = elapsed_ms
+                    self._samples = 1
+                return
+            self._samples += 1
+            self._average_ms += self.smoothing * (elapsed_ms - self._average_ms) if self._samples > 1 else elapsed_ms
+            if self.state == CLOSED and self._samples >= self.min_samples and self._average_ms > self.latency_ms:
+                self._trip(now)
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'in_flight': self.in_flight, 'shed': dict(self.shed),
+                    'average_save_ms': round(self._average_ms, 2)}
@@ -1,325 +1,908 @@
 import os
-import io
-import csv
+import math
+import time
+import atexit
+import hashlib
 import sqlite3
 import logging
-from datetime import datetime
-from flask import Flask, render_template_string, request, session, redirect, url_for, send_file, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+import click
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from flask import (Flask, render_template, request, session, redirect, url_for, flash, jsonify,
+                   Response, stream_with_context, g)
+from flask.json.provider import DefaultJSONProvider
+from jinja2 import DictLoader, FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
+import db
+import auth
+import admission
+import i18n
+import importer
+import tips
+import codes
+import batch
+import cohorts
+import conditions
+import distributions
+import compression
+import exports
+import metrics
+import migrations
+import partitions
+import write_behind
 
 # Configure logging and Flask app
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+
+class FiniteJSONProvider(DefaultJSONProvider):
+    """jsonify() that writes NaN/inf as null instead of the invalid JSON tokens NaN and Infinity."""
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return super().dumps(obj, allow_nan=False, **kwargs)
+        except ValueError:
+            return super().dumps(exports.json_safe(obj), allow_nan=False, **kwargs)
+
 app = Flask(__name__)
+app.json = FiniteJSONProvider(app)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', os.urandom(24))
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600
-DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'healthbuddy.db')
-
-# Translations for English and Swahili
-translations = {
-    "en": {
-        "title": "HealthBuddy - Your Wellness Companion",
-        "intro": "Your personal wellness companion – enter your details for tailored health advice!",
-        "about_us_title": "Welcome to HealthBuddy",
-        "about_us_content": """
-            HealthBuddy is your trusted partner in achieving a healthier lifestyle. 
-            We provide personalized health advice based on your unique profile, 
-            empowering you to make informed decisions for your well-being. 
-            Whether you're managing daily habits or seeking guidance on specific health concerns, 
-            we're here to support you every step of the way! 
-            <a href='https://www.who.int/health-topics/' class='text-blue-600 underline' target='_blank'>Learn more about health</a> 
-            from reliable sources in English and Swahili.
-        """,
-        "learn_health": "Learn About Health",
-        "start_assessment": "Start Health Assessment",
-        "agreement_label": "I agree to share my details for health advice",
-        "basic_info": "Basic Info",
-        "lifestyle": "Lifestyle",
-        "nutrition": "Nutrition",
-        "female_specific": "Female-Specific Info",
-        "weight_label": "Weight (kg):",
-        "height_label": "Height (cm):",
-        "age_label": "Age:",
-        "gender_label": "Gender:",
-        "activity_label": "Daily Exercise Level:",
-        "chronic_diseases_label": "Chronic Diseases (e.g., diabetes, hypertension, asthma, heart disease):",
-        "sleep_hours_label": "Sleep Hours per Night:",
-        "sleep_disturbance_label": "Sleep Disturbance at Night:",
-        "substance_use_label": "Substance Use (e.g., alcohol, tobacco, marijuana):",
-        "mental_health_label": "Mental Health:",
-        "fruit_veggie_label": "Vegetable/Fruit Intake (e.g., sukuma wiki, mangoes):",
-        "water_consumption_label": "Daily Clean, Safe Water Intake (not juice/soda):",
-        "oily_sugary_food_label": "Oily/Sugary Foods (e.g., chips, sweets, sodas):",
-        "menstrual_regularity_label": "Menstrual Regularity:",
-        "pregnancy_history_label": "Pregnancy History:",
-        "contraceptive_use_label": "Contraceptive Use:",
-        "submit": "Get Health Advice",
-        "select_gender": "Select Gender",
-        "select_activity": "Select exercise level",
-        "select_mental_health": "Select mental health",
-        "select_fruit_veggie": "Select frequency",
-        "select_water": "Select amount",
-        "select_oily_sugary": "Select frequency",
-        "select_sleep_disturbance": "Select sleep disturbance",
-        "select_menstrual_regularity": "Select menstrual regularity",
-        "select_pregnancy_history": "Select pregnancy history",
-        "male": "Male",
-        "female": "Female",
-        "low": "Low (mostly sitting, <30 min exercise)",
-        "moderate": "Moderate (light walking, 30-60 min exercise)",
-        "high": "High (active, e.g., sports, >60 min exercise)",
-        "yes": "Yes",
-        "no": "No",
-        "regular": "Regular",
-        "irregular": "Irregular",
-        "none": "None",
-        "insomnia": "Insomnia",
-        "waking_tired": "Waking tired",
-        "no_disturbance": "No disturbance",
-        "good_mental": "Good (happy, calm)",
-        "moderate_mental": "Moderate (some stress)",
-        "poor_mental": "Poor (frequent stress or sadness)",
-        "fruit_veggie_no": "No veggie/fruits",
-        "fruit_veggie_daily": "Daily veggie/fruits",
-        "fruit_veggie_rarely": "Rarely veggie/fruits",
-        "water_glass_1": "1 glass daily",
-        "water_glass_2_3": "2-3 glasses daily",
-        "water_liter_1": "1 liter daily",
-        "water_liter_1_plus": "1+ liters daily",
-        "oily_sugary_no": "No Oily/Sugary Foods",
-        "oily_sugary_moderate": "Moderate Oily/Sugary Foods",
-        "oily_sugary_frequent": "Frequent Oily/Sugary Foods",
-        "oily_sugary_daily": "Daily Oily/Sugary Foods",
-        "has_pregnancy": "Yes, past pregnancies",
-        "no_pregnancy": "No pregnancies",
-        "contraceptive_none": "None",
-        "contraceptive_pill": "Pill",
-        "contraceptive_iud": "IUD",
-        "contraceptive_other": "Other",
-        "report_title": "Your Health Report",
-        "water_intake_title": "Daily Water Intake",
-        "health_tips_title": "Your Health Tips",
-        "bmi_label": "BMI:",
-        "about_us_label": "About Us",
-        "about_us_content_short": "HealthBuddy gives simple health advice.",
-        "disclaimer_label": "Disclaimer",
-        "disclaimer_content": "This app is not a doctor. Consult a healthcare provider.",
-        "copyright": "© 2025 HealthToTech",
-        "error_weight": "Enter valid weight (e.g., 70).",
-        "error_height": "Enter valid height (e.g., 170).",
-        "error_age": "Enter valid age (e.g., 30).",
-        "error_sleep_hours": "Enter valid sleep hours (0-24, e.g., 7).",
-        "error_gender": "Select gender.",
-        "error_activity": "Select exercise level.",
-        "error_mental_health": "Select mental health status.",
-        "error_fruit_veggie": "Select vegetable/fruit intake frequency.",
-        "error_water": "Select clean, safe water intake amount.",
-        "error_oily_sugary": "Select oily/sugary food frequency.",
-        "error_sleep_disturbance": "Select sleep disturbance.",
-        "error_agreement": "You must agree to share details to start the assessment.",
-        "error_menstrual_regularity": "Select menstrual regularity.",
-        "error_pregnancy_history": "Select pregnancy history.",
-        "bmi_underweight": "Underweight: Eat more fruits, veggies, ugali, or beans to gain healthy weight.",
-        "bmi_healthy": "Healthy weight: Keep eating well and staying active!",
-        "bmi_overweight": "Overweight: Walk more, eat less oily/sugary foods to manage weight.",
-        "bmi_obese": "High weight: See a doctor, eat more veggies, and reduce oily/sugary foods.",
-        "activity_low_youth": "Young? Walk or play sports for 30 min daily to stay active.",
-        "activity_low_elderly": "Gentle walking or gardening keeps you strong.",
-        "activity_moderate_youth": "Good activity! Try more activity  like walking at range for 20 -30 min per day needed to stay fit.",
-        "activity_moderate_elderly": "Keep moving with light chores or walking like walking at range for 20 -30 min per.",
-        "activity_high_youth": "Very active! Rest well, drink clean water to maintain energy.",
-        "activity_high_elderly": "Great activity! Rest and eat healthy to stay strong.",
-        "sleep_poor_youth": "Poor sleep? Aim for 7-9 hours nightly and avoid screens before bed.",
-        "sleep_poor_elderly": "Tired from poor sleep? Aim for 7-9 hours and relax before bed.",
-        "sleep_good": "Good sleep keeps you strong and happy! Maintain 7-9 hours.",
-        "sleep_disturbance_insomnia": "Insomnia? Try a bedtime routine or consult a doctor .",
-        "sleep_disturbance_waking_tired": "Waking tired? Ensure 7-9 hours and limit caffeine.",
-        "sleep_disturbance_no_disturbance": "No sleep issues? Keep your routine for good health!",
-        "mental_poor_youth": "Stressed or sad? Talk to a friend or counselor to feel better.",
-        "mental_poor_elderly": "Feeling down? Share with family or a doctor for support.",
-        "mental_moderate_youth": "Some stress? Relax talk to someone or go counselling to stay calm.",
-        "mental_moderate_elderly": "Feeling okay? Rest with family or light activity for peace.",
-        "mental_good": "Feeling great! Keep doing what you love to stay happy.",
-        "chronic_disease": "For {} (e.g., diabetes, hypertension), see a doctor regularly.",
-        "substance_use_yes_youth": "Substance use harms you. Try to stop or seek help from a counselor.",
-        "substance_use_yes_elderly": "Substances hurt health. Talk to a doctor for support.",
-        "substance_use_no": "Great avoiding substances! Stay healthy.",
-        "menstrual_irregular": "Irregular periods? See a doctor for advice.",
-        "menstrual_regular": "Regular periods show good health. Keep monitoring.",
-        "pregnancy_history": "Past pregnancies? Talk to a doctor for tailored advice.",
-        "contraceptive_use": "Using contraceptives? Discuss with a doctor for guidance.",
-        "general_nutrition_youth": "Eat health food available at your community, such as beans, greens for healthy.",
-        "general_nutrition_elderly": "Choose veggies and fruits to stay healthy and strong."
-    },
-    "sw": {
-        "title": "HealthBuddy - Rafiki Yako wa Afya",
-        "intro": "Rafiki yako wa afya – ingiza maelezo yako kwa ushauri wa afya wa kibinafsi!",
-        "about_us_title": "Karibu HealthBuddy",
-        "about_us_content": """
-            HealthBuddy ni mshirika wako wa kuaminika katika kupata maisha yenye afya bora. 
-            Tunatoa ushauri wa afya wa kibinafsi kulingana na maelezo yako ya kipekee, 
-            tukikupa uwezo wa kufanya maamuzi bora kwa ajili ya afya yako. 
-            Iwe unashughulikia tabia za kila siku au unatafuta mwongozo kuhusu masuala ya afya, 
-            tuna hapa kukusaidia kila hatua! 
-            <a href='https://www.who.int/health-topics/' class='text-blue-600 underline' target='_blank'>Jifunze zaidi kuhusu afya</a> 
-            kutoka vyanzo vya kuaminika kwa Kiingereza na Kiswahili.
-        """,
-        "learn_health": "Jifunze Kuhusu Afya",
-        "start_assessment": "Anza Tathmini ya Afya",
-        "agreement_label": "Nakubali kushiriki maelezo yangu kwa ushauri wa afya",
-        "basic_info": "Taarifa za Msingi",
-        "lifestyle": "Mtindo wa Maisha",
-        "nutrition": "Lishe",
-        "female_specific": "Taarifa za Wanawake",
-        "weight_label": "Uzito (kg):",
-        "height_label": "Urefu (cm):",
-        "age_label": "Umri:",
-        "gender_label": "Jinsia:",
-        "activity_label": "Kiwango cha Mazoezi ya Kila Siku:",
-        "chronic_diseases_label": "Magonjwa ya Muda Mrefu (k.m., kisukari, shinikizo la damu, pumu, ugonjwa wa moyo):",
-        "sleep_hours_label": "Saa za Kulala Usiku:",
-        "sleep_disturbance_label": "Usumbufu wa Usingizi Usiku:",
-        "substance_use_label": "Utumiaji wa Dawa za Kulevya (k.m., pombe, sigara, bangi):",
-        "mental_health_label": "Afya ya Akili:",
-        "fruit_veggie_label": "Ulaji wa Mboga na Matunda (k.m., sukuma wiki, embe):",
-        "water_consumption_label": "UnywajI wa Maji Safi na Salama wa Kila Siku (sio juisi/soda):",
-        "oily_sugary_food_label": "Vyakula vya Mafuta/Sukari (k.m., chips, peremende, soda):",
-        "menstrual_regularity_label": "Uratibu wa Hedhi:",
-        "pregnancy_history_label": "Historia ya Ujauzito:",
-        "contraceptive_use_label": "Uzazi wa Mpango:",
-        "submit": "Pata Ushauri wa Afya",
-        "select_gender": "Chagua Jinsia",
-        "select_activity": "Chagua kiwango cha mazoezi",
-        "select_mental_health": "Chagua afya ya akili",
-        "select_fruit_veggie": "Chagua mara ngapi",
-        "select_water": "Chagua kiasi",
-        "select_oily_sugary": "Chagua mara ngapi",
-        "select_sleep_disturbance": "Chagua usumbufu wa usingizi",
-        "select_menstrual_regularity": "Chagua uratibu wa hedhi",
-        "select_pregnancy_history": "Chagua historia ya ujauzito",
-        "male": "Mwanaume",
-        "female": "Mwanamke",
-        "low": "Chini (kukaa sana, mazoezi <30 min)",
-        "moderate": "Wastani (kutembea kidogo, mazoezi 30-60 min)",
-        "high": "Juu (shughuli kama michezo, mazoezi >60 min)",
-        "yes": "Ndiyo",
-        "no": "Hapana",
-        "regular": "Mara kwa mara",
-        "irregular": "Sio ya mara kwa mara",
-        "none": "Hakuna",
-        "insomnia": "Kukosa usingizi",
-        "waking_tired": "Kuamka ukiwa umechoka",
-        "no_disturbance": "Hakuna usumbufu",
-        "good_mental": "Nzuri (furaha, utulivu)",
-        "moderate_mental": "Wastani (msongo kidogo)",
-        "poor_mental": "Duni (msongo wa mara kwa mara au huzuni)",
-        "fruit_veggie_no": "Hakuna mboga/matunda",
-        "fruit_veggie_daily": "Mboga/matunda kila siku",
-        "fruit_veggie_rarely": "Mboga/matunda mara chache",
-        "water_glass_1": "Glasi 1 kila siku",
-        "water_glass_2_3": "Glasi 2-3 kila siku",
-        "water_liter_1": "Lita 1 kila siku",
-        "water_liter_1_plus": "Lita 1+ kila siku",
-        "oily_sugary_no": "Hakuna Vyakula vya Mafuta/Sukari",
-        "oily_sugary_moderate": "Vyakula vya Mafuta/Sukari Wastani",
-        "oily_sugary_frequent": "Vyakula vya Mafuta/Sukari Mara kwa Mara",
-        "oily_sugary_daily": "Vyakula vya Mafuta/Sukari Kila Siku",
-        "has_pregnancy": "Ndiyo, mimba za awali",
-        "no_pregnancy": "Hapana mimba",
-        "contraceptive_none": "Hakuna",
-        "contraceptive_pill": "Vidonge",
-        "contraceptive_iud": "IUD",
-        "contraceptive_other": "Nyingine",
-        "report_title": "Ripoti Yako ya Afya",
-        "water_intake_title": "Ulaji wa Maji",
-        "health_tips_title": "Vidokezo vya Afya",
-        "bmi_label": "BMI:",
-        "about_us_label": "Kuhusu Sisi",
-        "about_us_content_short": "HealthBuddy inakupa ushauri rahisi wa afya.",
-        "disclaimer_label": "Kanusho",
-        "disclaimer_content": "Programu sio daktari. Ongea na daktari.",
-        "copyright": "© 2025 HealthToTech",
-        "error_weight": "Ingiza uzito halali (k.m., 70).",
-        "error_height": "Ingiza urefu halali (k.m., 170).",
-        "error_age": "Ingiza umri halali (k.m., 30).",
-        "error_sleep_hours": "Ingiza saa za kulala (0-24, k.m., 7).",
-        "error_gender": "Chagua jinsia.",
-        "error_activity": "Chagua kiwango cha mazoezi.",
-        "error_mental_health": "Chagua hali ya afya ya akili.",
-        "error_fruit_veggie": "Chagua mara ngapi unakula mboga/matunda.",
-        "error_water": "Chagua kiasi cha maji safi na salama.",
-        "error_oily_sugary": "Chagua mara ngapi unakula vyakula vya mafuta/sukari.",
-        "error_sleep_disturbance": "Chagua usumbufu wa usingizi.",
-        "error_agreement": "Lazima ukubali kushiriki maelezo ili kuanza tathmini.",
-        "error_menstrual_regularity": "Chagua uratibu wa hedhi.",
-        "error_pregnancy_history": "Chagua historia ya ujauzito.",
-        "bmi_underweight": "Uzito chini: Kula matunda, mboga, ugali, au maharagwe zaidi ili kupata uzito wa afya.",
-        "bmi_healthy": "Uzito sawa: Endelea kula vizuri na kushiriki shughuli!",
-        "bmi_overweight": "Uzito zaidi: Tembea zaidi, punguza vyakula vya mafuta/sukari ili kudhibiti uzito.",
-        "bmi_obese": "Uzito wa juu: Ongea na daktari, kula mboga zaidi, na punguza vyakula vya mafuta/sukari.",
-        "activity_low_youth": "Kijana? Tembea au cheza michezo kwa dakika 30 kila siku ili uwe na shughuli.",
-        "activity_low_elderly": "Tembea au lima kwa upole ili uwe na nguvu.",
-        "activity_moderate_youth": "Shughuli nzuri! Jaribu zaidi mazoezi hta ya kutembea kila siku kwa muda wa dk 25-30 ili uwe na afya.",
-        "activity_moderate_elderly": "Endelea na kazi za nyumbani au kutembea  kila siku kwa muda wa dk 25-30.",
-        "activity_high_youth": "Mwenye shughuli! Pumzika vizuri, kunywa maji safi ili kudumisha nguvu.",
-        "activity_high_elderly": "Shughuli nzuri! Pumzika na kula vizuri ili uwe na nguvu.",
-        "sleep_poor_youth": "Usingizi hafifu? Lenga saa 7-9 usiku na epuka skrini kabla ya kulala.",
-        "sleep_poor_elderly": "Usingizi duni? Jaribu saa 7-9 na pumzika kabla ya kulala .",
-        "sleep_good": "Usingizi mzuri unakufanya uwe na nguvu! Dumisha saa 7-9 .",
-        "sleep_disturbance_insomnia": "Kukosa usingizi? Jaribu ratiba ya kulala au ongea na daktari.",
-        "sleep_disturbance_waking_tired": "Kuamka ukiwa umechoka? Hakikisha saa 7-9 na punguza kafeini.",
-        "sleep_disturbance_no_disturbance": "Hakuna usumbufu wa usingizi? Dumisha ratiba yako kwa afya njema!",
-        "mental_poor_youth": "Huzuni au msongo? Ongea na rafiki au mshauri ili ujisikie vizuri.",
-        "mental_poor_elderly": "Unahisi chini? Ongea na familia au daktari kwa msaada.",
-        "mental_moderate_youth": "Msongo kidogo? Pumzika na ongea na mtu au mshauri nasaha ili uwe na utulivu.",
-        "mental_moderate_elderly": "Sawa? Pumzika na familia au shughuli za upole kwa amani.",
-        "mental_good": "Unahisi vizuri! Endelea na mambo unayopenda ili uwe na furaha.",
-        "chronic_disease": "Kwa {} (k.m., kisukari, shinikizo la damu), tembelea daktari mara kwa mara.",
-        "substance_use_yes_youth": "Dawa za kulevya zinadhuru. Jaribu kuacha au tafuta msaada kutoka kwa mshauri.",
-        "substance_use_yes_elderly": "Dawa za kulevya zinaumiza afya. Ongea na daktari kwa msaada.",
-        "substance_use_no": "Nzuri kuepuka dawa za kulevya! Endelea kuwa na afya.",
-        "menstrual_irregular": "Hedhi isiyo ya kawaida? Tembelea daktari kwa ushauri.",
-        "menstrual_regular": "Hedhi ya kawaida inaonyesha afya njema. Endelea kufuatilia.",
-        "pregnancy_history": "Mimba za zamani? Ongea na daktari kwa ushauri wa kibinafsi.",
-        "contraceptive_use": "Unatumia uzazi wa mpango? Jadiliana na daktari kwa mwongozo.",
-        "general_nutrition_youth": "kula vyakula vyenye afya  vinavyopatikana kwenye jamii yako,kama maharagwe, mbogamboga, matunda kwa  afya.",
-        "general_nutrition_elderly": "Chagua mboga na matunda kwa afya na nguvu."
-    }
-}
+app.config['WRITE_BEHIND'] = os.environ.get('HEALTHBUDDY_WRITE_BEHIND', '0') == '1'
+app.config['WRITE_BEHIND_STRICT'] = os.environ.get('HEALTHBUDDY_WRITE_BEHIND_STRICT', '0') == '1'
+app.config['WRITE_BEHIND_BATCH_SIZE'] = int(os.environ.get('HEALTHBUDDY_WRITE_BEHIND_BATCH_SIZE', 100))
+app.config['WRITE_BEHIND_MAX_DELAY_MS'] = int(os.environ.get('HEALTHBUDDY_WRITE_BEHIND_MAX_DELAY_MS', 50))
+app.config['JINJA_BYTECODE_CACHE_DIR'] = os.environ.get('HEALTHBUDDY_JINJA_CACHE_DIR', '')
+app.config['ASSESSMENT_MAX_IN_FLIGHT'] = int(os.environ.get('HEALTHBUDDY_ASSESSMENT_MAX_IN_FLIGHT', 8))
+app.config['ASSESSMENT_MAX_QUEUE_MS'] = int(os.environ.get('HEALTHBUDDY_ASSESSMENT_MAX_QUEUE_MS', 3000))
+app.config['ASSESSMENT_LATENCY_MS'] = float(os.environ.get('HEALTHBUDDY_ASSESSMENT_LATENCY_MS', 500))
+app.config['ASSESSMENT_COOLDOWN_SECONDS'] = float(os.environ.get('HEALTHBUDDY_ASSESSMENT_COOLDOWN_SECONDS', 5))
+app.config['BATCH_MAX_RECORDS'] = int(os.environ.get('HEALTHBUDDY_BATCH_MAX_RECORDS', 5000))
+app.config['DASHBOARD_PAGE_SIZE'] = int(os.environ.get('HEALTHBUDDY_DASHBOARD_PAGE_SIZE', 50))
+app.config['COHORT_REFRESH_SECONDS'] = float(os.environ.get('HEALTHBUDDY_COHORT_REFRESH_SECONDS', 5))
+app.config['COHORT_FULL_RELOAD_SECONDS'] = float(os.environ.get('HEALTHBUDDY_COHORT_FULL_RELOAD_SECONDS', 600))
+app.config['SNAPSHOT_SECONDS'] = float(os.environ.get('HEALTHBUDDY_SNAPSHOT_SECONDS', 60))
+app.config['SNAPSHOT_PATH'] = os.environ.get('HEALTHBUDDY_SNAPSHOT_PATH',
+                                             os.path.splitext(db.DATABASE)[0] + '.snapshot.db')
+app.config['ARCHIVE_DIR'] = os.environ.get('HEALTHBUDDY_ARCHIVE_DIR',
+                                           os.path.join(os.path.dirname(os.path.abspath(db.DATABASE)), 'archive'))
+app.config['ARCHIVE_CACHE_DIR'] = os.environ.get('HEALTHBUDDY_ARCHIVE_CACHE_DIR', '')
+app.config['ARCHIVE_KEEP_MONTHS'] = int(os.environ.get('HEALTHBUDDY_ARCHIVE_KEEP_MONTHS', 1))
+app.config['ARCHIVE_COMPRESS'] = os.environ.get('HEALTHBUDDY_ARCHIVE_COMPRESS', '0') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('HEALTHBUDDY_METRICS_TOKEN', '')
+app.config['STATIC_PAGE_MAX_AGE'] = int(os.environ.get('HEALTHBUDDY_STATIC_PAGE_MAX_AGE', 300))
+app.config['COMPRESSION_MIN_BYTES'] = int(os.environ.get('HEALTHBUDDY_COMPRESSION_MIN_BYTES', 500))
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('HEALTHBUDDY_PASSWORD_HASH_METHOD', auth.DEFAULT_HASH_METHOD)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('HEALTHBUDDY_PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('HEALTHBUDDY_PASSWORD_HASH_MAX_PENDING', 4))
+app.config['LOGIN_MAX_FAILURES_PER_IP'] = int(os.environ.get('HEALTHBUDDY_LOGIN_MAX_FAILURES_PER_IP', 20))
+app.config['LOGIN_MAX_FAILURES_PER_USER'] = int(os.environ.get('HEALTHBUDDY_LOGIN_MAX_FAILURES_PER_USER', 5))
+app.config['LOGIN_FAILURE_WINDOW'] = int(os.environ.get('HEALTHBUDDY_LOGIN_FAILURE_WINDOW', 300))
+# Reverse proxies in front of the app; Heroku (which sets DYNO) has one router
+app.config['PROXY_HOPS'] = int(os.environ.get('HEALTHBUDDY_PROXY_HOPS', 1 if 'DYNO' in os.environ else 0))
+DATABASE = db.DATABASE
+
+# Behind a proxy remote_addr is the proxy's address, which would put every client in one login limiter bucket
+if app.config['PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'], x_proto=app.config['PROXY_HOPS'])
+
+# Metrics, aggregated across gunicorn workers through per-process snapshot files
+metrics_registry = metrics.Registry()
+metrics_registry.histogram('healthbuddy_request_duration_seconds', 'Request latency by Flask endpoint.', 'endpoint')
+metrics_registry.histogram('healthbuddy_sql_duration_seconds', 'Execution time of each SQL statement.', 'statement')
+metrics_registry.histogram('healthbuddy_template_render_seconds', 'Template render time.', 'template')
+db.pool.observers.append(lambda sql, seconds: metrics_registry.observe(
+    'healthbuddy_sql_duration_seconds', metrics.statement_label(sql), seconds))
+atexit.register(metrics_registry.flush, force=True)
+
+# Admin exports and analytics read a periodically refreshed copy of the database (0 seconds reads it live)
+snapshot = (db.SnapshotPool(db.DATABASE, app.config['SNAPSHOT_PATH'], app.config['SNAPSHOT_SECONDS'])
+            if app.config['SNAPSHOT_SECONDS'] > 0 else None)
+if snapshot:
+    snapshot.observers = db.pool.observers
+
+def analytics_db():
+    """This request's connection for admin reads: the snapshot when enabled, else the live database."""
+    if 'analytics_db' not in g:
+        # Pinned for the request so a snapshot refresh cannot swap the connection under an open cursor
+        g.analytics_db = snapshot.connection() if snapshot else db.get_db()
+    return g.analytics_db
+
+password_hasher = auth.PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                                      app.config['PASSWORD_HASH_MAX_PENDING'])
+login_limiter = auth.LoginLimiter(app.config['LOGIN_MAX_FAILURES_PER_IP'], app.config['LOGIN_MAX_FAILURES_PER_USER'],
+                                  app.config['LOGIN_FAILURE_WINDOW'])
+# Sheds assessment submissions with a fast 503 when this worker is saturated or saves are slow
+assessment_admission = admission.AdmissionController(app.config['ASSESSMENT_MAX_IN_FLIGHT'],
+                                                     app.config['ASSESSMENT_MAX_QUEUE_MS'],
+                                                     app.config['ASSESSMENT_LATENCY_MS'],
+                                                     app.config['ASSESSMENT_COOLDOWN_SECONDS'])
+
+# Months past the retention window live in read-only per-month SQLite files (see partitions.py)
+partition_store = partitions.PartitionStore(app.config['ARCHIVE_DIR'], app.config['ARCHIVE_CACHE_DIR'] or None)
+
+def record_sources(conn):
+    """Yield every health_records table: each archived partition (attached while in use), then the hot table."""
+    yield from partition_store.each(conn)
+    yield "health_records"
+
+# Translations, compiled from translations/<lang>.json and memory-mapped on first use (see i18n.py)
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'translations')
+translations = i18n.Catalogs(TRANSLATIONS_DIR, required=tips.all_tip_keys())
+
+# Categorical columns hold codes.CATEGORY_CODES integers and tip_mask a codes.TIP_CODES bitmask
+HEALTH_RECORDS_DDL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        weight REAL, height REAL, age INTEGER, gender INTEGER, activity_level INTEGER,
+        water_intake REAL, tip_mask INTEGER, chronic_diseases TEXT, sleep_hours REAL,
+        sleep_disturbance INTEGER, substance_use TEXT, mental_health INTEGER,
+        fruit_veggie_intake INTEGER, water_consumption INTEGER, oily_sugary_food_use INTEGER,
+        menstrual_regularity INTEGER, pregnancy_history INTEGER, contraceptive_use INTEGER,
+        timestamp TEXT
+    )
+'''
+MIGRATION_CHUNK_ROWS = 5000
 
 def init_db():
-    """Initialize SQLite database."""
+    """Bring the database schema up to date; only reads PRAGMA user_version when it already is."""
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            c = conn.cursor()
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS health_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    weight REAL, height REAL, age INTEGER, gender TEXT, activity_level TEXT,
-                    water_intake REAL, health_tips TEXT, chronic_diseases TEXT, sleep_hours REAL,
-                    sleep_disturbance TEXT, substance_use TEXT, mental_health TEXT, 
-                    fruit_veggie_intake TEXT, water_consumption TEXT, oily_sugary_food_use TEXT, 
-                    menstrual_regularity TEXT, pregnancy_history TEXT, contraceptive_use TEXT, 
-                    timestamp TEXT
-                )
-            ''')
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password_hash TEXT
-                )
-            ''')
-            c.execute("SELECT * FROM users WHERE username = 'admin'")
-            if not c.fetchone():
-                c.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
-                         ('admin', generate_password_hash('admin123')))
-            conn.commit()
-            logger.info("Database initialized successfully")
+        migrations.run(db.pool, MIGRATIONS)
     except sqlite3.Error as e:
         logger.error(f"Database initialization error: {e}")
         raise
 
+def create_users(c):
+    """Users table and the default admin account."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password_hash TEXT
+        )
+    ''')
+    c.execute("SELECT 1 FROM users WHERE username = 'admin'")
+    if not c.fetchone():
+        c.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                  ('admin', password_hasher.hash('admin123')))
+
+def create_compact_storage(c):
+    """Code lookup tables and the integer-coded health_records table with its indexes and summaries."""
+    codes.seed_code_tables(c)
+    c.execute(HEALTH_RECORDS_DDL.format(table='health_records'))
+    create_record_indexes(c)
+    create_summary_tables(c)
+
+def legacy_storage_job(c):
+    """The online copy when a pre-v2 health_records table exists, else None."""
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'health_records'")
+    return migrate_storage if c.fetchone() else None
+
+def create_record_indexes(c):
+    """Indexes backing the dashboard filters."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_health_records_timestamp ON health_records(timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_health_records_gender ON health_records(gender)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_health_records_activity_level ON health_records(activity_level)")
+
+def legacy_record_values(row):
+    """Encode one pre-v2 health_records row (text categories, translated tips) as v2 insert parameters.
+
+    Categorical answers go through codes.legacy_value. A blank answer stays NULL, and one it cannot map
+    is stored as 'other'; migrate_storage then keeps the old table so the original text survives.
+    """
+    values = {field: row[field] for field in HEALTH_RECORD_COLUMNS if field != 'tip_mask'}
+    for field in codes.CATEGORY_CODES:
+        value = codes.legacy_value(field, values[field])
+        values[field] = value if value is not None or not (values[field] or '').strip() else 'other'
+    try:
+        # Stored tips are sentences in whichever language the user picked; re-derive the keys from the answers
+        keys = health_tip_keys(**{field: values[field] for field in ASSESSMENT_FIELDS})
+        values['tip_mask'] = codes.encode_tips(keys)
+    except (KeyError, TypeError, AttributeError, ZeroDivisionError):
+        values['tip_mask'] = None
+    for field in codes.CATEGORY_CODES:
+        values[field] = codes.encode(field, values[field])
+    return (row['id'],) + tuple(values[column] for column in HEALTH_RECORD_COLUMNS)
+
+def _copy_legacy_chunk(conn, chunk_rows):
+    """Copy the next chunk of legacy rows above the health_records_v2 watermark; return the row count."""
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM health_records_v2")
+    watermark = c.fetchone()[0]
+    c.execute("SELECT * FROM health_records WHERE id > ? ORDER BY id LIMIT ?", (watermark, chunk_rows))
+    rows = [legacy_record_values(row) for row in c.fetchall()]
+    conn.executemany(f"INSERT INTO health_records_v2 (id, {', '.join(HEALTH_RECORD_COLUMNS)}) "
+                     f"VALUES ({', '.join('?' * (len(HEALTH_RECORD_COLUMNS) + 1))})", rows)
+    return len(rows)
+
+def unmapped_legacy_values(c):
+    """{field: [(legacy answer, rows)]} for non-blank legacy answers codes.legacy_value cannot map."""
+    unmapped = {}
+    for field in codes.CATEGORY_CODES:
+        c.execute(f"SELECT {field}, COUNT(*) FROM health_records WHERE TRIM(COALESCE({field}, '')) != '' "
+                  f"GROUP BY {field}")
+        values = [(value, count) for value, count in c.fetchall() if codes.legacy_value(field, value) is None]
+        if values:
+            unmapped[field] = values
+    return unmapped
+
+def migrate_storage(chunk_rows=MIGRATION_CHUNK_ROWS):
+    """Migration of legacy health_records to the compact v2 encoding.
+
+    Rows are copied in short per-chunk transactions, so instances still running the pre-v2 code
+    keep writing text rows to the old table meanwhile. The final transaction holds the write lock
+    while it copies the tail and swaps the tables, so no row lands in between. This version's
+    writers insert coded columns and fail against the old table, so run it (init_db does) before
+    starting workers of this version. The copy resumes from the health_records_v2 watermark if
+    interrupted.
+
+    The old table is dropped only when every categorical answer mapped to a code. Otherwise it is
+    kept as health_records_legacy (same ids), so answers stored as 'other' can still be recovered.
+    """
+    with db.pool.transaction() as conn:
+        codes.seed_code_tables(conn.cursor())
+        conn.execute(HEALTH_RECORDS_DDL.format(table='health_records_v2'))
+    copied = 0
+    while True:
+        with db.pool.transaction() as conn:
+            count = _copy_legacy_chunk(conn, chunk_rows)
+        copied += count
+        if count < chunk_rows:
+            break
+    with db.pool.transaction() as conn:
+        while True:
+            count = _copy_legacy_chunk(conn, chunk_rows)
+            copied += count
+            if not count:
+                break
+        unmapped = unmapped_legacy_values(conn.cursor())
+        if unmapped:
+            details = '; '.join(f"{field}: {', '.join(f'{value!r} x{count}' for value, count in values)}"
+                                for field, values in unmapped.items())
+            logger.warning(f"Stored unrecognized legacy answers as 'other' and kept the old table as "
+                           f"health_records_legacy: {details}")
+            conn.execute("ALTER TABLE health_records RENAME TO health_records_legacy")
+        else:
+            conn.execute("DROP TABLE health_records")
+        conn.execute("ALTER TABLE health_records_v2 RENAME TO health_records")
+        c = conn.cursor()
+        create_record_indexes(c)
+        create_summary_tables(c)
+        rebuild_summary(c)
+        c.execute(f"PRAGMA user_version = {codes.SCHEMA_VERSION}")
+    logger.info(f"Migrated {copied} health record(s) to storage schema v{codes.SCHEMA_VERSION}")
+
+# Running totals kept up to date by triggers so the dashboard reads its statistics in O(1)
+GENDER_NAME = "COALESCE((SELECT value FROM category_codes WHERE field = 'gender' AND code = {row}.gender), '')"
+SUMMARY_METRICS = {
+    'bmi': "{row}.weight / (({row}.height / 100) * ({row}.height / 100))",
+    'water': "{row}.water_intake",
+    'sleep': "{row}.sleep_hours"
+}
+
+def _summary_delta(row, sign):
+    """SET clause applying one inserted (sign '+') or deleted (sign '-') row to health_stats."""
+    parts = [f"record_count = record_count {sign} 1"]
+    for metric, expr in SUMMARY_METRICS.items():
+        value = expr.format(row=row)
+        parts.append(f"{metric}_sum = {metric}_sum {sign} COALESCE({value}, 0)")
+        parts.append(f"{metric}_count = {metric}_count {sign} (({value}) IS NOT NULL)")
+    return ", ".join(parts)
+
+def create_summary_tables(c):
+    """Create the health_stats / health_gender_counts summary tables and their maintenance triggers."""
+    columns = ", ".join(f"{metric}_sum REAL NOT NULL DEFAULT 0, {metric}_count INTEGER NOT NULL DEFAULT 0"
+                        for metric in SUMMARY_METRICS)
+    c.execute(f"CREATE TABLE IF NOT EXISTS health_stats (id INTEGER PRIMARY KEY CHECK (id = 1), "
+              f"record_count INTEGER NOT NULL DEFAULT 0, {columns})")
+    c.execute("CREATE TABLE IF NOT EXISTS health_gender_counts (gender TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_stats_insert AFTER INSERT ON health_records BEGIN
+            UPDATE health_stats SET {_summary_delta("NEW", "+")} WHERE id = 1;
+            INSERT INTO health_gender_counts (gender, count) VALUES ({GENDER_NAME.format(row="NEW")}, 1)
+                ON CONFLICT(gender) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_stats_delete AFTER DELETE ON health_records BEGIN
+            UPDATE health_stats SET {_summary_delta("OLD", "-")} WHERE id = 1;
+            UPDATE health_gender_counts SET count = count - 1 WHERE gender = {GENDER_NAME.format(row="OLD")};
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_stats_update AFTER UPDATE ON health_records BEGIN
+            UPDATE health_stats SET {_summary_delta("OLD", "-")} WHERE id = 1;
+            UPDATE health_stats SET {_summary_delta("NEW", "+")} WHERE id = 1;
+            UPDATE health_gender_counts SET count = count - 1 WHERE gender = {GENDER_NAME.format(row="OLD")};
+            INSERT INTO health_gender_counts (gender, count) VALUES ({GENDER_NAME.format(row="NEW")}, 1)
+                ON CONFLICT(gender) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    c.execute("SELECT 1 FROM health_stats WHERE id = 1")
+    if not c.fetchone():
+        rebuild_summary(c)
+
+# Measurements the summary sums are built from; SQLite already stores NaN as NULL, which the sums skip
+FINITE_COLUMNS = ('weight', 'height', 'age', 'sleep_hours', 'water_intake')
+
+def create_finite_guards(c):
+    """Refuse infinite measurements on write; one would turn the trigger-kept sums into inf, and deleting
+    the row cannot bring them back (inf - inf has no value) until rebuild-stats recomputes them."""
+    condition = " OR ".join(f"NEW.{column} IN (9e999, -9e999)" for column in FINITE_COLUMNS)
+    for event in ('INSERT', 'UPDATE'):
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_health_records_finite_{event.lower()} "
+                  f"BEFORE {event} ON health_records WHEN {condition} BEGIN "
+                  f"SELECT RAISE(ABORT, 'health_records: non-finite measurement'); END")
+
+def rebuild_summary(c):
+    """Recompute the summary tables from a full scan of health_records."""
+    selects = ", ".join(f"COALESCE(SUM({expr.format(row='r')}), 0), COUNT({expr.format(row='r')})"
+                        for expr in SUMMARY_METRICS.values())
+    columns = ", ".join(f"{metric}_sum, {metric}_count" for metric in SUMMARY_METRICS)
+    c.execute("DELETE FROM health_stats")
+    c.execute(f"INSERT INTO health_stats (id, record_count, {columns}) SELECT 1, COUNT(*), {selects} FROM health_records r")
+    c.execute("DELETE FROM health_gender_counts")
+    gender = GENDER_NAME.format(row='r')
+    c.execute(f"INSERT INTO health_gender_counts (gender, count) "
+              f"SELECT {gender}, COUNT(*) FROM health_records r GROUP BY {gender}")
+
+def summary_partials(c, tables):
+    """(record count, {metric: [sum, count]}, Counter(gender -> count)) over health_records tables by full scan."""
+    selects = ", ".join(f"COALESCE(SUM({expr.format(row='r')}), 0), COUNT({expr.format(row='r')})"
+                        for expr in SUMMARY_METRICS.values())
+    record_count, totals, genders = 0, {metric: [0, 0] for metric in SUMMARY_METRICS}, Counter()
+    for table in tables:
+        # fetchall() so no statement is left open on an attached partition when the next one is requested
+        row = c.execute(f"SELECT COUNT(*), {selects} FROM {table} r").fetchall()[0]
+        record_count += row[0]
+        for i, metric in enumerate(SUMMARY_METRICS):
+            totals[metric][0] += row[1 + 2 * i]
+            totals[metric][1] += row[2 + 2 * i]
+        for code, count in c.execute(f"SELECT gender, COUNT(*) FROM {table} GROUP BY gender").fetchall():
+            genders[codes.decode('gender', code)] += count
+    return record_count, totals, genders
+
+def add_summary_partials(c, partials):
+    """Add summary_partials() of rows outside health_records (archived partitions) to the summary tables."""
+    record_count, totals, genders = partials
+    sets = ", ".join(f"{metric}_sum = {metric}_sum + ?, {metric}_count = {metric}_count + ?" for metric in totals)
+    c.execute(f"UPDATE health_stats SET record_count = record_count + ?, {sets} WHERE id = 1",
+              [record_count] + [value for metric in totals for value in totals[metric]])
+    c.executemany("INSERT INTO health_gender_counts (gender, count) VALUES (?, ?) "
+                  "ON CONFLICT(gender) DO UPDATE SET count = count + excluded.count", list(genders.items()))
+
+def read_summary(c):
+    """Return (stats, record_count, gender_counts) for the dashboard from the summary tables."""
+    c.execute("SELECT * FROM health_stats WHERE id = 1")
+    row = c.fetchone()
+    stats = {}
+    for metric in SUMMARY_METRICS:
+        total, count = (row[f"{metric}_sum"], row[f"{metric}_count"]) if row else (0, 0)
+        stats[f"avg_{metric}"] = round(total / count, 2) if count else 0
+    c.execute("SELECT gender, count FROM health_gender_counts")
+    gender_counts = {'male': 0, 'female': 0}
+    for gender, count in c.fetchall():
+        gender_counts[gender] = count
+    return stats, row["record_count"] if row else 0, gender_counts
+
+def check_summary(c):
+    """Compare the summary tables with full-scan aggregates of every partition; return a list of mismatches."""
+    problems = []
+    stats, record_count, gender_counts = read_summary(c)
+    expected_count, totals, genders = summary_partials(c, record_sources(c.connection))
+    for metric, (total, count) in totals.items():
+        key = f"avg_{metric}"
+        expected = round(total / count, 2) if count else 0
+        # Non-finite sums cannot be repaired by the triggers' deltas, so point at the fix
+        if not math.isfinite(stats[key]):
+            problems.append(f"{key}: summary is {stats[key]}; run rebuild-stats")
+        elif abs(stats[key] - expected) > 0.01:
+            problems.append(f"{key}: summary {stats[key]} != scan {expected}")
+    if record_count != expected_count:
+        problems.append(f"record_count: summary {record_count} != scan {expected_count}")
+    for gender, count in genders.items():
+        if gender_counts.get(gender, 0) != count:
+            problems.append(f"gender {gender!r}: summary {gender_counts.get(gender, 0)} != scan {count}")
+    return problems
+
+# Fixed-bin histograms of the main metrics (see distributions.py), kept by triggers so percentiles never scan
+DISTRIBUTION_METRICS = {
+    'bmi': SUMMARY_METRICS['bmi'],
+    'sleep_hours': "{row}.sleep_hours",
+    'water_intake': "{row}.water_intake",
+    'age': "{row}.age"
+}
+# (metric, label, threshold, below) tail shares shown with the percentiles
+DISTRIBUTION_TAILS = (
+    ('bmi', 'Underweight (BMI < 18.5)', tips.BMI_BANDS[0][0], True),
+    ('bmi', 'Obese (BMI ≥ 30)', tips.BMI_BANDS[-1][0], False),
+    ('sleep_hours', f'Short sleep (< {tips.GOOD_SLEEP_HOURS} h)', tips.GOOD_SLEEP_HOURS, True)
+)
+
+def _distribution_add(row):
+    statements = []
+    for metric, expr in DISTRIBUTION_METRICS.items():
+        value = expr.format(row=row)
+        statements.append(f"INSERT INTO health_distribution (metric, bin, count) "
+                          f"SELECT '{metric}', {distributions.bin_sql(metric, value)}, 1 WHERE ({value}) IS NOT NULL "
+                          f"ON CONFLICT(metric, bin) DO UPDATE SET count = count + 1;")
+    return "\n".join(statements)
+
+def _distribution_remove(row):
+    return "\n".join(f"UPDATE health_distribution SET count = count - 1 WHERE metric = '{metric}' "
+                     f"AND bin = {distributions.bin_sql(metric, expr.format(row=row))};"
+                     for metric, expr in DISTRIBUTION_METRICS.items())
+
+def create_distribution_tables(c):
+    """Create the health_distribution histogram table and its triggers, then fill it from health_records."""
+    c.execute("CREATE TABLE IF NOT EXISTS health_distribution (metric TEXT NOT NULL, bin INTEGER NOT NULL, "
+              "count INTEGER NOT NULL, PRIMARY KEY (metric, bin)) WITHOUT ROWID")
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_distribution_insert AFTER INSERT ON health_records BEGIN
+            {_distribution_add("NEW")}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_distribution_delete AFTER DELETE ON health_records BEGIN
+            {_distribution_remove("OLD")}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_distribution_update
+        AFTER UPDATE OF weight, height, age, sleep_hours, water_intake ON health_records BEGIN
+            {_distribution_remove("OLD")}
+            {_distribution_add("NEW")}
+        END
+    ''')
+    rebuild_distributions(c)
+
+def _scanned_distribution_sql(metric, table="health_records"):
+    value = DISTRIBUTION_METRICS[metric].format(row='r')
+    return (f"SELECT {distributions.bin_sql(metric, value)} AS bin, COUNT(*) AS count FROM {table} r "
+            f"WHERE ({value}) IS NOT NULL GROUP BY bin")
+
+def scanned_distributions(c, tables):
+    """{metric: Counter(bin -> count)} binned by full scan of health_records tables."""
+    histograms = {metric: Counter() for metric in DISTRIBUTION_METRICS}
+    for table in tables:
+        for metric in DISTRIBUTION_METRICS:
+            histograms[metric].update(dict(c.execute(_scanned_distribution_sql(metric, table)).fetchall()))
+    return histograms
+
+def rebuild_distributions(c, archived=None):
+    """Recompute the histograms from a full scan of health_records, plus scanned_distributions() of archived rows."""
+    c.execute("DELETE FROM health_distribution")
+    for metric in DISTRIBUTION_METRICS:
+        c.execute(f"INSERT INTO health_distribution (metric, bin, count) "
+                  f"SELECT '{metric}', bin, count FROM ({_scanned_distribution_sql(metric)})")
+    for metric, counts in (archived or {}).items():
+        c.executemany("INSERT INTO health_distribution (metric, bin, count) VALUES (?, ?, ?) "
+                      "ON CONFLICT(metric, bin) DO UPDATE SET count = count + excluded.count",
+                      [(metric, index, count) for index, count in counts.items()])
+
+def read_distributions(c):
+    """{metric: Counter(bin -> count)} from the histogram table."""
+    histograms = {metric: Counter() for metric in DISTRIBUTION_METRICS}
+    c.execute("SELECT metric, bin, count FROM health_distribution WHERE count > 0")
+    for metric, index, count in c.fetchall():
+        if metric in histograms:
+            histograms[metric][index] = count
+    return histograms
+
+def distribution_report(histograms):
+    """Chart bins, percentiles and tail shares for the dashboard from {metric: bin counts}."""
+    report = {}
+    for metric, counts in histograms.items():
+        labels, values = distributions.display_bins(metric, counts)
+        report[metric] = {
+            'labels': labels, 'counts': values, 'total': sum(counts.values()),
+            'percentiles': {f"p{round(q * 100)}": distributions.quantile(metric, counts, q)
+                            for q in distributions.QUANTILES}
+        }
+    tails = []
+    for metric, label, threshold, below in DISTRIBUTION_TAILS:
+        share = distributions.share_below(metric, histograms[metric], threshold)
+        if share is not None and not below:
+            share = 1 - share
+        tails.append({'label': label, 'percent': round(share * 100, 1) if share is not None else None})
+    return report, tails
+
+def check_distributions(c):
+    """Compare the histogram table with a full-scan binning of every partition; return a list of mismatches."""
+    problems = []
+    stored = read_distributions(c)
+    scanned = scanned_distributions(c, record_sources(c.connection))
+    for metric in DISTRIBUTION_METRICS:
+        if +stored[metric] != +scanned[metric]:
+            problems.append(f"{metric} histogram: {sum(stored[metric].values())} values stored, "
+                            f"{sum(scanned[metric].values())} scanned, bins differ")
+    return problems
+
+# Hourly and daily rollups by gender, activity level and age group, kept current by triggers for trend charts
+ROLLUP_BUCKETS = {
+    'hourly': "strftime('%Y-%m-%d %H:00', {row}.timestamp)",
+    'daily': "date({row}.timestamp)"
+}
+ROLLUP_BUCKET_FORMAT = {
+    'hourly': lambda moment: f"{moment:%Y-%m-%d %H}:00",
+    'daily': lambda moment: f"{moment:%Y-%m-%d}"
+}
+# (upper bound, label) per age group; ages at or above the last bound fall into ROLLUP_AGE_OVER
+ROLLUP_AGE_GROUPS = ((18, 'under 18'), (35, '18-34'), (50, '35-49'), (65, '50-64'))
+ROLLUP_AGE_OVER = '65+'
+ROLLUP_DIMENSIONS = ('gender', 'activity_level', 'age_group')
+ROLLUP_BACKFILL_DAYS = 31
+
+def _age_group_sql(row):
+    cases = " ".join(f"WHEN {row}.age < {bound} THEN {i}" for i, (bound, _) in enumerate(ROLLUP_AGE_GROUPS))
+    return f"CASE WHEN {row}.age IS NULL THEN -1 {cases} ELSE {len(ROLLUP_AGE_GROUPS)} END"
+
+def _rollup_keys(granularity, row):
+    """SQL for the (bucket, gender, activity_level, age_group) of a row; unknown values are stored as -1."""
+    return (ROLLUP_BUCKETS[granularity].format(row=row), f"COALESCE({row}.gender, -1)",
+            f"COALESCE({row}.activity_level, -1)", _age_group_sql(row))
+
+def _rollup_add(granularity, row):
+    values = ", ".join(f"COALESCE({expr.format(row=row)}, 0), (({expr.format(row=row)}) IS NOT NULL)"
+                       for expr in SUMMARY_METRICS.values())
+    return (f"INSERT INTO health_rollup_{granularity} VALUES ({', '.join(_rollup_keys(granularity, row))}, 1, "
+            f"{values}) ON CONFLICT(bucket, {', '.join(ROLLUP_DIMENSIONS)}) DO UPDATE SET {_summary_delta(row, '+')};")
+
+def _rollup_remove(granularity, row):
+    match = " AND ".join(f"{column} = {expr}" for column, expr
+                         in zip(('bucket',) + ROLLUP_DIMENSIONS, _rollup_keys(granularity, row)))
+    return f"UPDATE health_rollup_{granularity} SET {_summary_delta(row, '-')} WHERE {match};"
+
+def create_rollup_tables(c):
+    """Create the hourly/daily rollup tables and their maintenance triggers, then backfill them."""
+    columns = ", ".join(f"{metric}_sum REAL NOT NULL DEFAULT 0, {metric}_count INTEGER NOT NULL DEFAULT 0"
+                        for metric in SUMMARY_METRICS)
+    for granularity in ROLLUP_BUCKETS:
+        c.execute(f"CREATE TABLE IF NOT EXISTS health_rollup_{granularity} (bucket TEXT NOT NULL, "
+                  f"gender INTEGER NOT NULL, activity_level INTEGER NOT NULL, age_group INTEGER NOT NULL, "
+                  f"record_count INTEGER NOT NULL DEFAULT 0, {columns}, "
+                  f"PRIMARY KEY (bucket, {', '.join(ROLLUP_DIMENSIONS)})) WITHOUT ROWID")
+    # Rows without a parseable timestamp have no bucket and are left out of the trends
+    for event, row in (('INSERT', 'NEW'), ('DELETE', 'OLD'), ('UPDATE', 'OLD'), ('UPDATE', 'NEW')):
+        change = _rollup_add if row == 'NEW' else _rollup_remove
+        body = "\n                ".join(change(granularity, row) for granularity in ROLLUP_BUCKETS)
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_health_rollup_{event.lower()}_{row.lower()}
+            AFTER {event} ON health_records WHEN date({row}.timestamp) IS NOT NULL BEGIN
+                {body}
+            END
+        ''')
+    backfill_rollups(c)
+
+def backfill_rollups(c, start=None, end=None):
+    """Recompute the rollups for the days in [start, end), or for the whole history by default."""
+    selects = ", ".join(f"COALESCE(SUM({expr.format(row='r')}), 0), COUNT({expr.format(row='r')})"
+                        for expr in SUMMARY_METRICS.values())
+    # 'YYYY-MM-DD' sorts before every timestamp and hourly bucket of that day, so one bound serves both
+    low = f"{start:%Y-%m-%d}" if start else ''
+    high = f"{end:%Y-%m-%d}" if end else '~'
+    for granularity in ROLLUP_BUCKETS:
+        c.execute(f"DELETE FROM health_rollup_{granularity} WHERE bucket >= ? AND bucket < ?", (low, high))
+        c.execute(f"INSERT INTO health_rollup_{granularity} SELECT {', '.join(_rollup_keys(granularity, 'r'))}, "
+                  f"COUNT(*), {selects} FROM health_records r "
+                  f"WHERE r.timestamp >= ? AND r.timestamp < ? AND date(r.timestamp) IS NOT NULL "
+                  f"GROUP BY 1, 2, 3, 4", (low, high))
+
+def backfill_rollups_in_chunks(start, end, days=ROLLUP_BACKFILL_DAYS):
+    """Backfill the days in [start, end) with one short transaction per chunk so inserts are never held up for long."""
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=days), end)
+        with db.pool.transaction() as conn:
+            backfill_rollups(conn.cursor(), chunk_start, chunk_end)
+        chunk_start = chunk_end
+
+def rollup_label(dimension, value):
+    """Display name for a stored rollup dimension value."""
+    if value < 0:
+        return 'unknown'
+    if dimension == 'age_group':
+        return ROLLUP_AGE_GROUPS[value][1] if value < len(ROLLUP_AGE_GROUPS) else ROLLUP_AGE_OVER
+    return codes.decode(dimension, value)
+
+# granularity -> (number of buckets shown, bucket width)
+TREND_WINDOWS = {'daily': (30, timedelta(days=1)), 'hourly': (48, timedelta(hours=1))}
+
+# Per-worker columnar copy of health_records for cohort breakdowns (see cohorts.py)
+cohort_cache = cohorts.CohortCache(ROLLUP_AGE_GROUPS, ROLLUP_AGE_OVER, app.config['COHORT_REFRESH_SECONDS'],
+                                   app.config['COHORT_FULL_RELOAD_SECONDS'], archived=partition_store.each)
+COHORT_COUNT_SQL = "SELECT COALESCE((SELECT record_count FROM health_stats WHERE id = 1), 0)"
+
+def cohort_request(values):
+    """(group_by, filters, from, to) from request values; ValueError for unknown dimensions or bad dates."""
+    group_by = [name for value in values.getlist("group_by") for name in value.split(",") if name]
+    filters = {name: values[name] for name in cohort_cache.labels if values.get(name)}
+    dates = []
+    for key in ("from", "to"):
+        day = values.get(key) or None
+        if day:
+            datetime.strptime(day, "%Y-%m-%d")
+        dates.append(day)
+    return group_by, filters, dates[0], dates[1]
+
+def read_cohorts(values):
+    """Refresh this worker's cohort cache if due and aggregate it for the request; ValueError on bad input."""
+    group_by, filters, date_from, date_to = cohort_request(values)
+    cohort_cache.refresh(analytics_db(), COHORT_COUNT_SQL)
+    started = time.perf_counter()
+    groups = cohort_cache.aggregate(group_by, filters, date_from, date_to)
+    return {'group_by': group_by, 'filters': filters, 'from': date_from, 'to': date_to, 'groups': groups,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2), 'cache': cohort_cache.stats()}
+
+def read_trends(c, granularity='daily', by=None, now=None):
+    """Record counts per bucket (split by one rollup dimension if given) and average metrics, from the rollups only."""
+    buckets, width = TREND_WINDOWS[granularity]
+    now = now or datetime.now()
+    labels = [ROLLUP_BUCKET_FORMAT[granularity](now - width * i) for i in range(buckets - 1, -1, -1)]
+    position = {label: i for i, label in enumerate(labels)}
+    group = f", {by}" if by else ", NULL"
+    sums = ", ".join(f"SUM({metric}_sum), SUM({metric}_count)" for metric in SUMMARY_METRICS)
+    c.execute(f"SELECT bucket{group}, SUM(record_count), {sums} FROM health_rollup_{granularity} "
+              f"WHERE bucket >= ? GROUP BY bucket{group}", (labels[0],))
+    series = {}
+    totals = {metric: [[0, 0] for _ in labels] for metric in SUMMARY_METRICS}
+    for bucket, value, count, *metric_values in c.fetchall():
+        i = position.get(bucket)
+        if i is None:
+            continue
+        series.setdefault(rollup_label(by, value) if by else 'all', [0] * len(labels))[i] += count
+        for j, metric in enumerate(SUMMARY_METRICS):
+            totals[metric][i][0] += metric_values[2 * j]
+            totals[metric][i][1] += metric_values[2 * j + 1]
+    trends = {'labels': labels, 'series': series}
+    for metric, values in totals.items():
+        trends[f"avg_{metric}"] = [round(total / count, 2) if count else None for total, count in values]
+    return trends
+
+def create_condition_tables(c):
+    """Chronic-disease tags, their full-text index and maintenance triggers, backfilled from existing records."""
+    conditions.seed_condition_tables(c)
+    fts = conditions.fts5_available(c)
+    if fts:
+        c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS health_records_fts USING fts5(chronic_diseases, "
+                  "content='health_records', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+    # FTS5 'delete' must be given exactly what was indexed, so only non-empty answers are ever indexed
+    index_new = ("INSERT INTO health_records_fts (rowid, chronic_diseases) SELECT NEW.id, NEW.chronic_diseases "
+                 "WHERE NEW.chronic_diseases != '';") if fts else ""
+    unindex_old = ("INSERT INTO health_records_fts (health_records_fts, rowid, chronic_diseases) "
+                   "SELECT 'delete', OLD.id, OLD.chronic_diseases WHERE OLD.chronic_diseases != '';") if fts else ""
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_conditions_insert AFTER INSERT ON health_records BEGIN
+            {conditions.tag_records_sql("NEW")};
+            {index_new}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_conditions_delete AFTER DELETE ON health_records BEGIN
+            DELETE FROM health_record_conditions WHERE record_id = OLD.id;
+            {unindex_old}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_health_conditions_update AFTER UPDATE OF id, chronic_diseases ON health_records
+        BEGIN
+            DELETE FROM health_record_conditions WHERE record_id = OLD.id;
+            {conditions.tag_records_sql("NEW")};
+            {unindex_old}
+            {index_new}
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_condition_counts_insert AFTER INSERT ON health_record_conditions BEGIN
+            UPDATE condition_tags SET record_count = record_count + 1 WHERE id = NEW.tag_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_condition_counts_delete AFTER DELETE ON health_record_conditions BEGIN
+            UPDATE condition_tags SET record_count = record_count - 1 WHERE id = OLD.tag_id;
+        END
+    ''')
+    rebuild_conditions(c)
+
+def rebuild_conditions(c):
+    """Re-tag every hot record and rebuild the full-text index, e.g. after the synonyms change.
+
+    Archived records keep the tags they had when archived, and are not in the full-text index.
+    """
+    conditions.seed_condition_tables(c)
+    c.execute("DELETE FROM health_record_conditions WHERE record_id IN (SELECT id FROM health_records)")
+    c.execute(conditions.tag_records_sql("r", "health_records"))
+    c.execute("UPDATE condition_tags SET record_count = "
+              "(SELECT COUNT(*) FROM health_record_conditions WHERE tag_id = condition_tags.id)")
+    if fts_enabled(c):
+        c.execute("INSERT INTO health_records_fts (health_records_fts) VALUES ('delete-all')")
+        c.execute("INSERT INTO health_records_fts (rowid, chronic_diseases) "
+                  "SELECT id, chronic_diseases FROM health_records WHERE chronic_diseases != ''")
+
+def fts_enabled(c):
+    """Whether the chronic_diseases full-text index exists (it is skipped when SQLite lacks FTS5)."""
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'health_records_fts'")
+    return c.fetchone() is not None
+
+def read_condition_counts(c):
+    """Record count per condition tag, in CONDITIONS order."""
+    c.execute("SELECT name, record_count FROM condition_tags ORDER BY id")
+    return dict(c.fetchall())
+
+def unindex_archived(c, where, params):
+    """Drop records about to be archived from the full-text index; their condition tags stay for the filters."""
+    if fts_enabled(c):
+        c.execute(f"INSERT INTO health_records_fts (health_records_fts, rowid, chronic_diseases) "
+                  f"SELECT 'delete', id, chronic_diseases FROM health_records WHERE {where} AND chronic_diseases != ''",
+                  params)
+
+def archive_records(keep_months=None, compress=None):
+    """Move months older than the retention window into partition files; returns {month: rows moved}."""
+    keep_months = app.config['ARCHIVE_KEEP_MONTHS'] if keep_months is None else keep_months
+    compress = app.config['ARCHIVE_COMPRESS'] if compress is None else compress
+    moved = partition_store.archive(db.pool, HEALTH_RECORDS_DDL, keep_months, compress,
+                                    before_delete=unindex_archived)
+    if snapshot and any(moved.values()):
+        # The old copy lists the hot rows just moved and may name a partition file that was replaced
+        snapshot.refresh(force=True)
+    return moved
+
+# Schema history, applied in order by migrations.run(); append new versions, never edit applied ones.
+# Appending to codes.CATEGORY_CODES or codes.TIP_CODES needs a migration that calls codes.seed_code_tables.
+# Delete triggers added on health_records after version 7 need a WHEN partitions.ARCHIVE_GUARD clause.
+MIGRATIONS = [
+    migrations.Migration(1, 'users table and default admin', create_users),
+    migrations.Migration(codes.SCHEMA_VERSION, 'compact integer-coded health_records', create_compact_storage,
+                         online=legacy_storage_job),
+    migrations.Migration(3, 'hourly and daily rollups by gender, activity level and age group', create_rollup_tables),
+    migrations.Migration(4, 'chronic-disease tags and full-text index', create_condition_tables),
+    migrations.Migration(5, 'bulk import checkpoints', importer.create_import_progress),
+    migrations.Migration(6, 'BMI, sleep, water and age histograms', create_distribution_tables),
+    migrations.Migration(7, 'monthly partition catalog and archival guard', partitions.create_catalog),
+    migrations.Migration(8, 'reject infinite measurements', create_finite_guards),
+    migrations.Migration(9, "'other' code for unrecognized legacy answers", codes.seed_code_tables),
+    migrations.Migration(10, 'file size and mtime on import checkpoints', importer.add_import_file_state),
+    migrations.Migration(11, 'stricter condition synonyms', rebuild_conditions),
+    migrations.Migration(12, 'fingerprint length on import checkpoints', importer.add_fingerprint_length),
+]
+
+HEALTH_RECORD_COLUMNS = (
+    'weight', 'height', 'age', 'gender', 'activity_level', 'water_intake',
+    'tip_mask', 'chronic_diseases', 'sleep_hours', 'sleep_disturbance',
+    'substance_use', 'mental_health', 'fruit_veggie_intake',
+    'water_consumption', 'oily_sugary_food_use', 'menstrual_regularity',
+    'pregnancy_history', 'contraceptive_use', 'timestamp'
+)
+INSERT_HEALTH_RECORD = (f"INSERT INTO health_records ({', '.join(HEALTH_RECORD_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(HEALTH_RECORD_COLUMNS))})")
+
+record_writer = write_behind.WriteBehindQueue(
+    db.pool, INSERT_HEALTH_RECORD,
+    batch_size=app.config['WRITE_BEHIND_BATCH_SIZE'],
+    max_delay=app.config['WRITE_BEHIND_MAX_DELAY_MS'] / 1000
+)
+
+def health_record_values(values, water_intake, tip_keys, timestamp=None):
+    """Encoded insert parameters for one assessment, in HEALTH_RECORD_COLUMNS order."""
+    row = dict(values, water_intake=water_intake, tip_mask=codes.encode_tips(tip_keys),
+               timestamp=timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    for field in codes.CATEGORY_CODES:
+        row[field] = codes.encode(field, row[field])
+    return tuple(row[column] for column in HEALTH_RECORD_COLUMNS)
+
+def decode_record(row):
+    """Turn a stored health_records row back into readable values (tips stay as a bitmask)."""
+    record = dict(row)
+    for field in codes.CATEGORY_CODES:
+        if field in record:
+            record[field] = codes.decode(field, record[field])
+    return record
+
+def save_health_record(values):
+    """Insert a health record, directly or through the write-behind queue.
+
+    Returns True once the row has committed, or False if it is still queued (which is not a failure).
+    """
+    if not app.config['WRITE_BEHIND']:
+        with db.pool.transaction() as conn:
+            conn.execute(INSERT_HEALTH_RECORD, values)
+        logger.info("Health record saved successfully")
+        return True
+    pending = record_writer.submit(values)
+    if app.config['WRITE_BEHIND_STRICT']:
+        if pending.wait(timeout=db.pool.busy_timeout_ms / 1000 + 5):
+            logger.info("Health record saved successfully")
+            return True
+        logger.warning("Health record still queued after waiting for its commit")
+    else:
+        logger.info("Health record queued for write-behind")
+    return False
+
+ASSESSMENT_CHOICES = {
+    "gender": ['male', 'female'],
+    "activity_level": ['low', 'moderate', 'high'],
+    "sleep_disturbance": ['insomnia', 'waking_tired', 'no_disturbance'],
+    "mental_health": ['good_mental', 'moderate_mental', 'poor_mental'],
+    "fruit_veggie_intake": ['fruit_veggie_no', 'fruit_veggie_daily', 'fruit_veggie_rarely'],
+    "water_consumption": ['water_glass_1', 'water_glass_2_3', 'water_liter_1', 'water_liter_1_plus'],
+    "oily_sugary_food_use": ['oily_sugary_no', 'oily_sugary_moderate', 'oily_sugary_frequent', 'oily_sugary_daily'],
+    "menstrual_regularity": ['regular', 'irregular'],
+    "pregnancy_history": ['has_pregnancy', 'no_pregnancy']
+}
+# Translation keys for fields whose error message is not simply error_<field>
+ASSESSMENT_ERROR_KEYS = {
+    "activity_level": "error_activity",
+    "fruit_veggie_intake": "error_fruit_veggie",
+    "water_consumption": "error_water",
+    "oily_sugary_food_use": "error_oily_sugary"
+}
+
+def parse_assessment(form):
+    """Read and validate assessment fields from a form-like mapping.
+
+    Returns (values, invalid_field), where invalid_field is the first field that
+    failed validation or None. Raises ValueError/TypeError for non-numeric input.
+    Text fields are read with str(), so JSON numbers, booleans or lists there fail
+    the choice checks instead of raising.
+    """
+    def text(field, default=""):
+        return str(form.get(field, default) or "")
+
+    gender = text("gender")
+    female = gender == "female"
+    values = {
+        "weight": float(form.get("weight", 0)),
+        "height": float(form.get("height", 0)),
+        "age": int(form.get("age", 0)),
+        "gender": gender,
+        "activity_level": text("activity_level"),
+        "chronic_diseases": text("chronic_diseases").strip(),
+        "sleep_hours": float(form.get("sleep_hours", 0)),
+        "sleep_disturbance": text("sleep_disturbance"),
+        "substance_use": text("substance_use", "no").lower(),
+        "mental_health": text("mental_health"),
+        "fruit_veggie_intake": text("fruit_veggie_intake"),
+        "water_consumption": text("water_consumption"),
+        "oily_sugary_food_use": text("oily_sugary_food_use"),
+        "menstrual_regularity": text("menstrual_regularity") if female else "",
+        "pregnancy_history": text("pregnancy_history") if female else "",
+        "contraceptive_use": text("contraceptive_use", "none") if female else "none"
+    }
+    if values["contraceptive_use"] not in codes.CATEGORY_CODES["contraceptive_use"]:
+        values["contraceptive_use"] = "other"
+    # float() accepts "nan" and "inf", which would poison the summary sums kept by triggers
+    errors = {
+        "weight": not math.isfinite(values["weight"]) or values["weight"] <= 0,
+        "height": not math.isfinite(values["height"]) or values["height"] <= 0,
+        "age": values["age"] <= 0,
+        "sleep_hours": not math.isfinite(values["sleep_hours"]) or values["sleep_hours"] < 0 or values["sleep_hours"] > 24
+    }
+    for field, allowed in ASSESSMENT_CHOICES.items():
+        if field in ("menstrual_regularity", "pregnancy_history") and not female:
+            continue
+        errors[field] = values[field] not in allowed
+    # Report problems in form order
+    for field in values:
+        if errors.get(field):
+            return values, field
+    return values, None
+
+ASSESSMENT_FIELDS = (
+    "weight", "height", "age", "gender", "activity_level", "chronic_diseases", "sleep_hours",
+    "sleep_disturbance", "substance_use", "mental_health", "fruit_veggie_intake", "water_consumption",
+    "oily_sugary_food_use", "menstrual_regularity", "pregnancy_history", "contraceptive_use"
+)
+
+# Every validation message, and the overload message, must exist in every catalog, checked when catalogs are built
+translations.require(['error_busy'])
+translations.require(ASSESSMENT_ERROR_KEYS.get(field, f"error_{field}")
+                     for field in ("weight", "height", "age", "sleep_hours", *ASSESSMENT_CHOICES))
+
+def assessment_error_message(t, field):
+    """Localized validation message for an invalid assessment field."""
+    return t[ASSESSMENT_ERROR_KEYS.get(field, f"error_{field}")]
+
 def calculate_bmi(weight, height):
     """Calculate BMI."""
     return round(weight / ((height / 100) ** 2), 2)
@@ -333,178 +916,396 @@ def calculate_water_intake(weight, activity_level, water_consumption):
         water_ml += 500
     return round(water_ml / 1000, 2)
 
+def health_tip_keys(age, gender, weight, height, activity_level, chronic_diseases, sleep_hours,
+                    sleep_disturbance, substance_use, mental_health, fruit_veggie_intake,
+                    water_consumption, oily_sugary_food_use, menstrual_regularity,
+                    pregnancy_history, contraceptive_use):
+    """Look up the ordered tip translation keys for an assessment in the decision table."""
+    return tips.tip_keys(tips.profile(age, gender, calculate_bmi(weight, height), activity_level, chronic_diseases,
+                                      sleep_hours, sleep_disturbance, substance_use, mental_health,
+                                      menstrual_regularity, pregnancy_history, contraceptive_use))
+
 def generate_health_tips(age, gender, weight, height, activity_level, chronic_diseases, sleep_hours,
                         sleep_disturbance, substance_use, mental_health, fruit_veggie_intake,
                         water_consumption, oily_sugary_food_use, menstrual_regularity,
                         pregnancy_history, contraceptive_use, lang="en"):
     """Generate personalized health tips, excluding nutrition-related advice."""
     t = translations.get(lang, translations["en"])
-    tips = []
-    bmi = calculate_bmi(weight, height)
-    bmi_categories = {18.5: "bmi_underweight", 25: "bmi_healthy", 30: "bmi_overweight"}
-    for threshold, key in bmi_categories.items():
-        if bmi < threshold or (key == "bmi_obese" and bmi >= 30):
-            tips.append(t[key if key != "bmi_obese" else "bmi_obese"])
-            break
-    age_group = "youth" if age <= 35 else "elderly"
-    tips.append(t[f"activity_{activity_level}_{age_group}"])
-    tips.append(t["sleep_good"] if sleep_hours >= 7 else t[f"sleep_poor_{age_group}"])
-    tips.append(t[f"sleep_disturbance_{sleep_disturbance}"])
-    mental_health_base = mental_health.replace("_mental", "")
-    tips.append(t[f"mental_{mental_health_base}_{age_group}"])
-    if chronic_diseases:
-        tips.append(t["chronic_disease"].format(chronic_diseases))
-    if substance_use.lower() == 'yes':
-        tips.append(t[f"substance_use_yes_{age_group}"])
-    else:
-        tips.append(t["substance_use_no"])
-    if gender == 'female':
-        if menstrual_regularity:
-            tips.append(t[f"menstrual_{menstrual_regularity.lower()}"])
-        if pregnancy_history:
-            tips.append(t["pregnancy_history"])
-        if contraceptive_use != 'none':
-            tips.append(t["contraceptive_use"])
-    tips.append(t[f"general_nutrition_{age_group}"])
-    return tips
+    keys = health_tip_keys(age, gender, weight, height, activity_level, chronic_diseases, sleep_hours,
+                           sleep_disturbance, substance_use, mental_health, fruit_veggie_intake,
+                           water_consumption, oily_sugary_food_use, menstrual_regularity,
+                           pregnancy_history, contraceptive_use)
+    return render_tip_keys(keys, chronic_diseases, t)
+
+def score_assessment(values):
+    """Water intake, tip keys and BMI for validated assessment values."""
+    water_intake = calculate_water_intake(values["weight"], values["activity_level"], values["water_consumption"])
+    return water_intake, health_tip_keys(**values), calculate_bmi(values["weight"], values["height"])
+
+def render_tip_keys(keys, chronic_diseases, t):
+    """Translate tip keys into tip text, filling in the chronic disease name."""
+    return [t[key].format(chronic_diseases) if key == "chronic_disease" else t[key] for key in keys]
+
+def render_page(name, **context):
+    """Render a template from the precompiled registry."""
+    started = time.perf_counter()
+    html = render_template(template_registry[name], **context)
+    metrics_registry.observe('healthbuddy_template_render_seconds', name, time.perf_counter() - started)
+    return html
+
+class PrerenderedPage:
+    """A rendered page kept with its validators and lazily built compressed variants."""
+
+    def __init__(self, html):
+        self.body = html.encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+        self.variants = {}
+
+    def response(self):
+        """A conditional response in the best encoding the client accepts (304 when its copy is current)."""
+        encoding = compression.choose_encoding(request.accept_encodings)
+        if encoding and len(self.body) >= app.config['COMPRESSION_MIN_BYTES']:
+            if encoding not in self.variants:
+                self.variants[encoding] = compression.compress(self.body, encoding, precompressed=True)
+            response = Response(self.variants[encoding], mimetype='text/html')
+            response.headers['Content-Encoding'] = encoding
+            # Each encoding is a different representation, so it needs its own strong validator
+            response.set_etag(f"{self.etag}-{encoding}")
+        else:
+            response = Response(self.body, mimetype='text/html')
+            response.set_etag(self.etag)
+        response.vary.add('Accept-Encoding')
+        response.last_modified = PAGES_MODIFIED
+        response.headers['Cache-Control'] = f"private, max-age={app.config['STATIC_PAGE_MAX_AGE']}"
+        return response.make_conditional(request)
+
+def render_static_page(name, t, lang):
+    """Serve a page that only varies by language from its pre-rendered copy unless messages are pending."""
+    if lang not in translations or session.get('_flashes'):
+        return render_page(name, t=t, lang=lang)
+    page = prerendered_pages.get((name, lang))
+    if page is None:
+        page = prerendered_pages[(name, lang)] = PrerenderedPage(render_page(name, t=t, lang=lang))
+    return page.response()
+
+def remember_lang(lang):
+    """Store the chosen language, touching the session (and so sending a cookie) only when it changes."""
+    if session.get('lang') != lang:
+        session['lang'] = lang
+
+@app.after_request
+def finalize_response(response):
+    """Default to no-store and compress sizeable buffered text responses the client accepts compressed."""
+    response.headers.setdefault('Cache-Control', 'no-store')
+    if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or response.mimetype not in compression.COMPRESSIBLE_MIMETYPES):
+        return response
+    encoding = compression.choose_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding and len(data) >= app.config['COMPRESSION_MIN_BYTES']:
+        response.set_data(compression.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.teardown_request
+def record_request_latency(exc):
+    """Observe request latency per endpoint; streamed responses are timed until the stream closes."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics_registry.observe('healthbuddy_request_duration_seconds', request.endpoint or 'unmatched',
+                                 time.perf_counter() - started)
+    metrics_registry.flush()
+
+@app.teardown_appcontext
+def release_db(exc):
+    """Roll back any transaction a request left open on its pooled connections."""
+    db.pool.release()
+    if snapshot:
+        snapshot.release()
 
 @app.route("/", methods=["GET"])
 def about():
     """Display About Us page."""
     lang = request.args.get('lang', session.get('lang', 'en'))  # Get lang from URL or session
-    session['lang'] = lang  # Store lang in session
+    remember_lang(lang)
     t = translations.get(lang, translations["en"])  # Get translations for selected language
-    return render_template_string(about_template, t=t, lang=lang)
+    return render_static_page('about', t, lang)
+
+def submit_assessment(t, lang):
+    """Validate, score and save a submitted assessment form and render the result."""
+    try:
+        values, invalid_field = parse_assessment(request.form)
+
+        # Log form data for debugging
+        logger.info("Form data: " + ", ".join(f"{field}={value}" for field, value in values.items()))
+
+        if invalid_field:
+            flash(assessment_error_message(t, invalid_field), "error")
+            return render_page('assessment', t=t, lang=lang)
+
+        # Calculate derived values
+        water_intake, tip_keys, bmi = score_assessment(values)
+        health_tips = render_tip_keys(tip_keys, values["chronic_diseases"], t)
+
+        # Insert into database; the save time feeds the admission circuit breaker
+        started = time.perf_counter()
+        try:
+            save_health_record(health_record_values(values, water_intake, tip_keys))
+        except sqlite3.Error as e:
+            assessment_admission.observe(time.perf_counter() - started, failed=True)
+            logger.error(f"Failed to save health record: {e}")
+            flash(f"Failed to save record: {str(e)}", "error")
+            return render_page('assessment', t=t, lang=lang)
+        assessment_admission.observe(time.perf_counter() - started)
+
+        # Prepare result for display
+        result = dict(values, water_intake=water_intake, health_tips=health_tips, bmi=bmi)
+        return render_page('assessment', result=result, t=t, lang=lang)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Invalid input: {e}")
+        flash("Enter valid numeric values.", "error")
+        return render_page('assessment', t=t, lang=lang)
 
 @app.route("/assessment", methods=["GET", "POST"])
 def assessment():
     """Handle health assessment."""
     lang = request.args.get('lang', session.get('lang', 'en'))  # Get lang from URL or session
-    session['lang'] = lang  # Store lang in session
+    remember_lang(lang)
     t = translations.get(lang, translations["en"])  # Get translations for selected language
     if request.method == "POST":
         try:
-            # Get form data with explicit defaults
-            weight = float(request.form.get("weight", 0))
-            height = float(request.form.get("height", 0))
-            age = int(request.form.get("age", 0))
-            gender = request.form.get("gender", "")
-            activity_level = request.form.get("activity_level", "")
-            chronic_diseases = request.form.get("chronic_diseases", "").strip()
-            sleep_hours = float(request.form.get("sleep_hours", 0))
-            sleep_disturbance = request.form.get("sleep_disturbance", "")
-            substance_use = request.form.get("substance_use", "no").lower()
-            mental_health = request.form.get("mental_health", "")
-            fruit_veggie_intake = request.form.get("fruit_veggie_intake", "")
-            water_consumption = request.form.get("water_consumption", "")
-            oily_sugary_food_use = request.form.get("oily_sugary_food_use", "")
-            menstrual_regularity = request.form.get("menstrual_regularity", "") if gender == "female" else ""
-            pregnancy_history = request.form.get("pregnancy_history", "") if gender == "female" else ""
-            contraceptive_use = request.form.get("contraceptive_use", "none") if gender == "female" else "none"
-
-            # Log form data for debugging
-            logger.info(f"Form data: weight={weight}, height={height}, age={age}, gender={gender}, "
-                        f"activity_level={activity_level}, chronic_diseases={chronic_diseases}, "
-                        f"sleep_hours={sleep_hours}, sleep_disturbance={sleep_disturbance}, "
-                        f"substance_use={substance_use}, mental_health={mental_health}, "
-                        f"fruit_veggie_intake={fruit_veggie_intake}, water_consumption={water_consumption}, "
-                        f"oily_sugary_food_use={oily_sugary_food_use}, menstrual_regularity={menstrual_regularity}, "
-                        f"pregnancy_history={pregnancy_history}, contraceptive_use={contraceptive_use}")
-
-            # Validate inputs
-            errors = {
-                "weight": weight <= 0,
-                "height": height <= 0,
-                "age": age <= 0,
-                "gender": gender not in ['male', 'female'],
-                "activity_level": activity_level not in ['low', 'moderate', 'high'],
-                "sleep_hours": sleep_hours < 0 or sleep_hours > 24,
-                "sleep_disturbance": sleep_disturbance not in ['insomnia', 'waking_tired', 'no_disturbance'],
-                "mental_health": mental_health not in ['good_mental', 'moderate_mental', 'poor_mental'],
-                "fruit_veggie_intake": fruit_veggie_intake not in ['fruit_veggie_no', 'fruit_veggie_daily', 'fruit_veggie_rarely'],
-                "water_consumption": water_consumption not in ['water_glass_1', 'water_glass_2_3', 'water_liter_1', 'water_liter_1_plus'],
-                "oily_sugary_food_use": oily_sugary_food_use not in ['oily_sugary_no', 'oily_sugary_moderate', 'oily_sugary_frequent', 'oily_sugary_daily'],
-                "menstrual_regularity": menstrual_regularity not in ['regular', 'irregular'] and gender == 'female',
-                "pregnancy_history": pregnancy_history not in ['has_pregnancy', 'no_pregnancy'] and gender == 'female'
-            }
-            for field, invalid in errors.items():
-                if invalid:
-                    flash(t[f"error_{field}"], "error")
-                    return render_template_string(assessment_template, t=t, lang=lang)
-
-            # Calculate derived values
-            water_intake = calculate_water_intake(weight, activity_level, water_consumption)
-            health_tips = generate_health_tips(age, gender, weight, height, activity_level, chronic_diseases,
-                                             sleep_hours, sleep_disturbance, substance_use, mental_health,
-                                             fruit_veggie_intake, water_consumption, oily_sugary_food_use,
-                                             menstrual_regularity, pregnancy_history, contraceptive_use, lang)
-
-            # Insert into database
-            try:
-                with sqlite3.connect(DATABASE) as conn:
-                    c = conn.cursor()
-                    c.execute('''
-                        INSERT INTO health_records (
-                            weight, height, age, gender, activity_level, water_intake, 
-                            health_tips, chronic_diseases, sleep_hours, sleep_disturbance, 
-                            substance_use, mental_health, fruit_veggie_intake, 
-                            water_consumption, oily_sugary_food_use, menstrual_regularity, 
-                            pregnancy_history, contraceptive_use, timestamp
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        weight, height, age, gender, activity_level, water_intake,
-                        ';'.join(health_tips), chronic_diseases, sleep_hours, sleep_disturbance,
-                        substance_use, mental_health, fruit_veggie_intake, water_consumption,
-                        oily_sugary_food_use, menstrual_regularity, pregnancy_history,
-                        contraceptive_use, datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    ))
-                    conn.commit()
-                    logger.info("Health record saved successfully")
-            except sqlite3.Error as e:
-                logger.error(f"Failed to save health record: {e}")
-                flash(f"Failed to save record: {str(e)}", "error")
-                return render_template_string(assessment_template, t=t, lang=lang)
-
-            # Prepare result for display
-            result = {
-                "weight": weight, "height": height, "age": age, "gender": gender,
-                "activity_level": activity_level, "water_intake": water_intake,
-                "health_tips": health_tips, "bmi": calculate_bmi(weight, height),
-                "chronic_diseases": chronic_diseases, "sleep_hours": sleep_hours,
-                "sleep_disturbance": sleep_disturbance, "substance_use": substance_use,
-                "mental_health": mental_health, "fruit_veggie_intake": fruit_veggie_intake,
-                "water_consumption": water_consumption, "oily_sugary_food_use": oily_sugary_food_use,
-                "menstrual_regularity": menstrual_regularity, "pregnancy_history": pregnancy_history,
-                "contraceptive_use": contraceptive_use
-            }
-            return render_template_string(assessment_template, result=result, t=t, lang=lang)
-        except (ValueError, TypeError) as e:
-            logger.error(f"Invalid input: {e}")
-            flash("Enter valid numeric values.", "error")
-            return render_template_string(assessment_template, t=t, lang=lang)
-    return render_template_string(assessment_template, t=t, lang=lang)
+            with assessment_admission.admit(request.headers.get('X-Request-Start')):
+                return submit_assessment(t, lang)
+        except admission.Overloaded as e:
+            logger.warning(f"Assessment submission refused ({e.reason}), retry after {e.retry_after} s")
+            flash(t['error_busy'], "error")
+            return render_page('assessment', t=t, lang=lang), 503, {'Retry-After': str(e.retry_after)}
+    return render_static_page('assessment', t, lang)
+
+def request_flag(value):
+    """Interpret a JSON boolean or a form-style '1'/'true' flag."""
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+def payload_translations(payload):
+    """Catalog for an API body's lang (English by default), or None when lang is not a supported code."""
+    lang = payload.get('lang', 'en')
+    return translations[lang] if isinstance(lang, str) and lang in translations else None
+
+def unsupported_lang_response():
+    return jsonify(error=f"lang must be one of {', '.join(sorted(translations))}.", field='lang'), 400
+
+def api_assessment(queue_save):
+    """Validate and score one assessment from a JSON (or form-encoded) body, then store it.
+
+    With queue_save the record is handed to the write-behind queue and the response does not wait
+    for the commit; otherwise it is saved the same way as the HTML form.
+    """
+    payload = request.get_json(silent=True) if request.is_json else request.form.to_dict()
+    if not isinstance(payload, dict):
+        return jsonify(error="Expected a JSON object with the assessment fields."), 400
+    t = payload_translations(payload)
+    if t is None:
+        return unsupported_lang_response()
+    try:
+        values, invalid_field = parse_assessment(payload)
+    except (ValueError, TypeError):
+        return jsonify(error="Enter valid numeric values.", field=None), 400
+    if invalid_field:
+        return jsonify(error=assessment_error_message(t, invalid_field), field=invalid_field), 422
+    water_intake, tip_keys, bmi = score_assessment(values)
+    result = {'bmi': bmi, 'water_intake': water_intake, 'tip_keys': list(tip_keys)}
+    if request_flag(payload.get('include_text')):
+        result['health_tips'] = render_tip_keys(tip_keys, values["chronic_diseases"], t)
+    if not request_flag(payload.get('save', True)):
+        return jsonify(dict(result, saved=False))
+    record = health_record_values(values, water_intake, tip_keys)
+    try:
+        if queue_save:
+            record_writer.submit(record, timeout=0.1)
+            saved = False
+        else:
+            saved = save_health_record(record)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save health record: {e}")
+        return jsonify(error="Failed to save record; try again shortly."), 503
+    if not saved:
+        return jsonify(dict(result, saved='queued')), 202
+    return jsonify(dict(result, saved=True))
+
+@app.route("/api/v1/assessments", methods=["POST"])
+def assessment_api():
+    """Score one assessment and return JSON instead of the HTML page."""
+    return api_assessment(queue_save=False)
+
+@app.route("/api/v1/assessments/async", methods=["POST"])
+def assessment_api_async():
+    """Like /api/v1/assessments, but answers 202 as soon as the record is queued for write-behind."""
+    return api_assessment(queue_save=True)
+
+@app.route("/api/v1/assessments/batch", methods=["POST"])
+def assessment_batch():
+    """Score a batch of assessments with the vectorized engine and return JSON."""
+    payload = request.get_json(silent=True)
+    records = payload.get('records') if isinstance(payload, dict) else None
+    if not isinstance(records, list):
+        return jsonify(error="Expected a JSON object with a 'records' list."), 400
+    if len(records) > app.config['BATCH_MAX_RECORDS']:
+        return jsonify(error=f"At most {app.config['BATCH_MAX_RECORDS']} records per batch."), 413
+    t = payload_translations(payload)
+    if t is None:
+        return unsupported_lang_response()
+    valid, indexes, errors = [], [], []
+    for i, record in enumerate(records):
+        try:
+            values, invalid_field = parse_assessment(record if isinstance(record, dict) else {})
+        except (ValueError, TypeError):
+            errors.append({'index': i, 'field': None, 'error': "Enter valid numeric values."})
+            continue
+        if invalid_field:
+            errors.append({'index': i, 'field': invalid_field, 'error': assessment_error_message(t, invalid_field)})
+            continue
+        valid.append(values)
+        indexes.append(i)
+    results = []
+    if valid:
+        scored = batch.assess(valid)
+        for row, i in enumerate(indexes):
+            keys = batch.row_tip_keys(scored['tip_keys'], row)
+            result = {'index': i, 'bmi': float(scored['bmi'][row]),
+                      'water_intake': float(scored['water_intake'][row]), 'tip_keys': keys}
+            if payload.get('include_text'):
+                result['health_tips'] = render_tip_keys(keys, valid[row]['chronic_diseases'], t)
+            results.append(result)
+    return jsonify(results=results, errors=errors)
 
 @app.route("/admin/login", methods=["GET", "POST"])
 def admin_login():
     """Handle admin login."""
     if request.method == "POST":
-        username = request.form.get("username")
-        password = request.form.get("password")
+        username = request.form.get("username") or ''
+        password = request.form.get("password") or ''
+        ip = request.remote_addr
+        # Refuse before any hashing so a brute-force burst cannot occupy the workers
+        if not login_limiter.allow(ip, username):
+            logger.warning(f"Login attempts for {username} from {ip} rate limited")
+            flash("Too many login attempts. Please try again later.", "error")
+            return render_page('admin_login'), 429
         try:
-            with sqlite3.connect(DATABASE) as conn:
-                c = conn.cursor()
-                c.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
-                user = c.fetchone()
-                if user and check_password_hash(user[0], password):
-                    session['admin'] = True
-                    session.permanent = True
-                    logger.info(f"Admin {username} logged in successfully")
-                    return redirect(url_for('admin_dashboard'))
-                flash("Invalid credentials.", "error")
+            c = db.get_db().cursor()
+            c.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,))
+            user = c.fetchone()
+            if user and password_hasher.verify(user[1], password):
+                login_limiter.succeeded(username)
+                if password_hasher.needs_rehash(user[1]):
+                    rehash_password(user[0], password)
+                session['admin'] = True
+                session.permanent = True
+                logger.info(f"Admin {username} logged in successfully")
+                return redirect(url_for('admin_dashboard'))
+            login_limiter.failed(ip, username)
+            flash("Invalid credentials.", "error")
+        except auth.HasherBusy as e:
+            logger.warning(f"Login refused: {e}")
+            flash("Login is busy. Please try again shortly.", "error")
+            return render_page('admin_login'), 503
         except sqlite3.Error as e:
             logger.error(f"Login error: {e}")
             flash("Login error.", "error")
-    return render_template_string(admin_login_template)
+    return render_page('admin_login')
+
+def rehash_password(user_id, password):
+    """Upgrade a stored hash to the configured method; a failure here must not block the login."""
+    try:
+        with db.pool.transaction() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hasher.hash(password), user_id))
+        logger.info(f"Rehashed password for user {user_id} with {password_hasher.method}")
+    except (sqlite3.Error, auth.HasherBusy) as e:
+        logger.warning(f"Password rehash failed: {e}")
+
+DASHBOARD_COLUMNS = "id, weight, height, age, gender, activity_level, water_intake, chronic_diseases, timestamp"
+# Filter name -> (column, allowed values)
+DASHBOARD_FILTERS = {
+    'gender_filter': ('gender', ['male', 'female']),
+    'activity_filter': ('activity_level', ['low', 'moderate', 'high'])
+}
+
+def dashboard_filters(values):
+    """Pick the valid record filters out of request values."""
+    filters = {}
+    date_filter = values.get("date_filter", "")
+    try:
+        datetime.strptime(date_filter, "%Y-%m-%d")
+        filters["date_filter"] = date_filter
+    except ValueError:
+        pass
+    for f, (column, allowed) in DASHBOARD_FILTERS.items():
+        if values.get(f) in allowed:
+            filters[f] = values[f]
+    if values.get("condition_filter") in conditions.CONDITIONS:
+        filters["condition_filter"] = values["condition_filter"]
+    if conditions.fts_query(values.get("condition_search", "")):
+        filters["condition_search"] = values["condition_search"].strip()
+    return filters
+
+def dashboard_query(filters, before=None, limit=50, fts=True, table="health_records"):
+    """Build a keyset-paginated record query whose predicates can use the health_records indexes.
+
+    fts=False falls back to a LIKE scan for condition_search when SQLite was built without FTS5, and for
+    archived partitions, which are not in the full-text index.
+    """
+    query = f"SELECT {DASHBOARD_COLUMNS} FROM {table} WHERE 1=1"
+    params = []
+    if "date_filter" in filters:
+        # Range on the raw timestamp instead of date(timestamp) so idx_health_records_timestamp applies
+        day = datetime.strptime(filters["date_filter"], "%Y-%m-%d")
+        query += " AND timestamp >= ? AND timestamp < ?"
+        params += [day.strftime("%Y-%m-%d"), (day + timedelta(days=1)).strftime("%Y-%m-%d")]
+    for f, (column, allowed) in DASHBOARD_FILTERS.items():
+        if f in filters:
+            query += f" AND {column} = ?"
+            params.append(codes.encode(column, filters[f]))
+    if "condition_filter" in filters:
+        query += (" AND id IN (SELECT record_id FROM health_record_conditions"
+                  " WHERE tag_id = (SELECT id FROM condition_tags WHERE name = ?))")
+        params.append(filters["condition_filter"])
+    if "condition_search" in filters:
+        if fts:
+            query += " AND id IN (SELECT rowid FROM health_records_fts WHERE health_records_fts MATCH ?)"
+            params.append(conditions.fts_query(filters["condition_search"]))
+        else:
+            query += " AND chronic_diseases LIKE ?"
+            params.append(f"%{filters['condition_search']}%")
+    if before is not None:
+        query += " AND id < ?"
+        params.append(before)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    return query, params
+
+def read_dashboard_records(c, filters, before=None, limit=50, fts=True):
+    """Newest-first page of matching records from health_records and the archived months the filters reach."""
+    c.execute(*dashboard_query(filters, before, limit, fts))
+    rows = c.fetchall()
+    day = filters.get("date_filter")
+    archived = partitions.list_partitions(c.connection, day, day, before_id=before)
+    for partition in sorted(archived, key=lambda p: p.max_id, reverse=True):
+        # Ids grow over time, so once the page is full no older partition can contribute
+        if len(rows) >= limit and partition.max_id < rows[limit - 1]["id"]:
+            break
+        with partition_store.attached(c.connection, partition) as table:
+            c.execute(*dashboard_query(filters, before, limit, fts=False, table=table))
+            rows = sorted(rows + c.fetchall(), key=lambda row: row["id"], reverse=True)[:limit]
+    return rows
+
+def snapshot_time():
+    """When the admin snapshot was taken, for display; None when admin pages read the live database."""
+    taken_at = snapshot.taken_at() if snapshot else None
+    return datetime.fromtimestamp(taken_at).strftime("%Y-%m-%d %H:%M:%S") if taken_at is not None else None
 
 @app.route("/admin/dashboard", methods=["GET", "POST"])
 def admin_dashboard():
@@ -513,38 +1314,114 @@ def admin_dashboard():
         flash("Please log in.", "error")
         return redirect(url_for('admin_login'))
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            query = "SELECT * FROM health_records WHERE 1=1"
-            params = []
-            for f, v in [("date_filter", ""), ("gender_filter", ['male', 'female']), ("activity_filter", ['low', 'moderate', 'high'])]:
-                val = request.form.get(f)
-                if val and (not v or val in v):
-                    if f == "date_filter":
-                        query += " AND date(timestamp) = ?"
-                    else:
-                        query += f" AND {f.replace('_filter', '')} = ?"
-                    params.append(val)
-            c.execute(query, params)
-            records = [dict(row) for row in c.fetchall()]
-            c.execute("SELECT AVG(weight / ((height / 100) * (height / 100))) as avg_bmi, AVG(water_intake) as avg_water, AVG(sleep_hours) as avg_sleep FROM health_records")
-            stats = c.fetchone()
-            stats_dict = {key: round(stats[key], 2) if stats[key] is not None else 0 for key in stats.keys()}
-            c.execute("SELECT COUNT(DISTINCT id) as total_users FROM health_records")
-            user_count = c.fetchone()['total_users']
-            # Fetch gender distribution for pie chart
-            c.execute("SELECT gender, COUNT(*) as count FROM health_records GROUP BY gender")
-            gender_data = c.fetchall()
-            gender_counts = {'male': 0, 'female': 0}
-            for row in gender_data:
-                gender_counts[row['gender']] = row['count']
-        return render_template_string(admin_dashboard_template, records=records, stats=stats_dict, user_count=user_count, gender_counts=gender_counts)
+        c = analytics_db().cursor()
+        c.row_factory = sqlite3.Row
+        filters = dashboard_filters(request.values)
+        before = request.values.get("before", type=int)
+        page_size = app.config['DASHBOARD_PAGE_SIZE']
+        # Fetch one extra row to know whether another page follows
+        records = [decode_record(row) for row in read_dashboard_records(c, filters, before, page_size + 1,
+                                                                         fts_enabled(c))]
+        next_before = records[page_size - 1]['id'] if len(records) > page_size else None
+        records = records[:page_size]
+        stats_dict, user_count, gender_counts = read_summary(c)
+        trend = request.values.get("trend") if request.values.get("trend") in TREND_WINDOWS else "daily"
+        trend_by = request.values.get("trend_by") if request.values.get("trend_by") in ROLLUP_DIMENSIONS else ""
+        trends = read_trends(c, trend, trend_by or None)
+        distribution, distribution_tails = distribution_report(read_distributions(c))
+        cohort, cohort_error = None, None
+        if request.values.get("group_by"):
+            try:
+                cohort = read_cohorts(request.values)
+            except ValueError as e:
+                cohort_error = str(e)
+        # Everything the page shows except the cursor, so "Newest" and "Older" keep the trend and cohort views too
+        page_args = dict(filters, trend=trend, trend_by=trend_by or None, group_by=request.values.getlist("group_by"),
+                         **{name: request.values[name] for name in (*cohort_cache.labels, "from", "to")
+                            if request.values.get(name)})
+        return render_page('admin_dashboard', records=records, stats=stats_dict, user_count=user_count,
+                           gender_counts=gender_counts, filters=filters, before=before, next_before=next_before,
+                           page_args=page_args, trends=trends, trend=trend, trend_by=trend_by,
+                           condition_counts=read_condition_counts(c),
+                           distribution_report=distribution, distribution_tails=distribution_tails,
+                           cohort=cohort, cohort_error=cohort_error, cohort_dimensions=cohort_cache.labels,
+                           export_formats=exports.available_formats(), snapshot_at=snapshot_time())
     except sqlite3.Error as e:
         logger.error(f"Dashboard error: {e}")
         flash("Dashboard error.", "error")
         return redirect(url_for('admin_login'))
 
+@app.route("/admin/cohorts")
+def admin_cohorts():
+    """Group-by breakdown of health records from the columnar cache, e.g. ?group_by=age_band,bmi_category&gender=female."""
+    if not session.get('admin'):
+        flash("Please log in.", "error")
+        return redirect(url_for('admin_login'))
+    try:
+        return jsonify(read_cohorts(request.args))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+@app.route("/admin/db_stats")
+def admin_db_stats():
+    """Report connection pool and lock-wait counters for this worker."""
+    if not session.get('admin'):
+        flash("Please log in.", "error")
+        return redirect(url_for('admin_login'))
+    return jsonify(dict(db.pool.stats(), write_behind=record_writer.stats,
+                        snapshot=snapshot.stats() if snapshot else None, admission=assessment_admission.stats()))
+
+def collect_db_metrics():
+    """Lock-wait, connection and write-behind counters for the metrics registry."""
+    stats = db.pool.stats()
+    collected = {
+        'healthbuddy_db_lock_waits_total': ('counter', 'Statements that had to wait on a database lock.', None,
+                                            {None: stats['lock_waits']}),
+        'healthbuddy_db_lock_timeouts_total': ('counter', 'Statements that gave up waiting on a database lock.', None,
+                                               {None: stats['lock_timeouts']}),
+        'healthbuddy_db_lock_wait_seconds_total': ('counter', 'Time spent waiting on database locks.', None,
+                                                   {None: stats['lock_wait_seconds']}),
+        'healthbuddy_db_connections_opened_total': ('counter', 'SQLite connections opened.', None,
+                                                    {None: stats['opened']}),
+        'healthbuddy_db_connections_open': ('gauge', 'SQLite connections currently open.', None,
+                                            {None: stats['open_connections']}),
+        'healthbuddy_write_behind_records_total': ('counter', 'Health records handled by the write-behind queue.',
+                                                   'outcome', {'written': record_writer.stats['written'],
+                                                               'failed': record_writer.stats['failed']}),
+    }
+    if snapshot:
+        # Its age is in /admin/db_stats; a gauge would be summed across workers
+        snapshot_stats = snapshot.stats()
+        collected['healthbuddy_snapshot_refreshes_total'] = ('counter', 'Admin read snapshots copied.', None,
+                                                             {None: snapshot_stats['refreshes']})
+        collected['healthbuddy_snapshot_refresh_seconds_total'] = ('counter', 'Time spent copying admin read snapshots.',
+                                                                   None, {None: snapshot_stats['refresh_seconds']})
+    return collected
+
+metrics_registry.add_collector(collect_db_metrics)
+metrics_registry.add_collector(lambda: {
+    'healthbuddy_assessment_shed_total': ('counter', 'Assessment submissions refused with 503, by reason.', 'reason',
+                                          dict(assessment_admission.shed)),
+    'healthbuddy_assessment_in_flight': ('gauge', 'Assessment submissions being processed.', None,
+                                         {None: assessment_admission.in_flight}),
+    'healthbuddy_assessment_circuit_open': ('gauge', 'Workers whose assessment circuit breaker is not closed.', None,
+                                            {None: int(assessment_admission.state != admission.CLOSED)}),
+})
+metrics_registry.add_collector(lambda: {
+    'healthbuddy_login_rate_limited_total': ('counter', 'Login attempts refused by the attempt limiter.', None,
+                                             {None: login_limiter.stats()['rejected']}),
+})
+
+@app.route("/admin/metrics")
+def admin_metrics():
+    """Expose metrics from all workers in Prometheus text format (admin session or bearer token)."""
+    token = app.config['METRICS_TOKEN']
+    authorized = session.get('admin') or (token and request.headers.get('Authorization') == f"Bearer {token}")
+    if not authorized:
+        flash("Please log in.", "error")
+        return redirect(url_for('admin_login'))
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route("/admin/logout")
 def admin_logout():
     """Handle admin logout."""
@@ -552,40 +1429,100 @@ def admin_logout():
     flash("Logged out.", "success")
     return redirect(url_for('admin_login'))
 
+EXPORT_CHUNK_ROWS = 1000
+
+def export_query(args, table="health_records"):
+    """Build the export query for ?from=/?to= dates (inclusive) and ?min_id=/?max_id=; ValueError on bad input."""
+    query = f"SELECT * FROM {table} WHERE 1=1"
+    params = []
+    if args.get("from"):
+        query += " AND timestamp >= ?"
+        params.append(datetime.strptime(args["from"], "%Y-%m-%d").strftime("%Y-%m-%d"))
+    if args.get("to"):
+        query += " AND timestamp < ?"
+        params.append((datetime.strptime(args["to"], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+    if args.get("min_id"):
+        query += " AND id >= ?"
+        params.append(int(args["min_id"]))
+    if args.get("max_id"):
+        query += " AND id <= ?"
+        params.append(int(args["max_id"]))
+    return query + " ORDER BY id", params
+
+def export_partitions(conn, args):
+    """Archived partitions overlapping an export range already validated by export_query()."""
+    return partitions.list_partitions(conn, args.get("from") or None, args.get("to") or None,
+                                      int(args["min_id"]) if args.get("min_id") else None,
+                                      int(args["max_id"]) if args.get("max_id") else None)
+
+def iter_export_cursors(conn, args, archived):
+    """Executed export cursors: one per archived partition in month order (attached while read), then health_records."""
+    for partition in archived:
+        with partition_store.attached(conn, partition) as table:
+            cursor = conn.cursor()
+            cursor.execute(*export_query(args, table))
+            yield cursor
+    cursor = conn.cursor()
+    cursor.execute(*export_query(args))
+    yield cursor
+
+def iter_export_chunks(cursor, cursors, t):
+    """Column chunks for exports.stream() from cursor and then the rest of cursors, with tips in t's language."""
+    tip_texts = {}
+
+    def render_tips(mask, chronic_diseases):
+        if mask not in tip_texts:
+            keys = codes.decode_tips(mask)
+            tip_texts[mask] = list(zip(keys, (t[key] for key in keys)))
+        return [text.format(chronic_diseases) if key == "chronic_disease" else text for key, text in tip_texts[mask]]
+
+    try:
+        while cursor is not None:
+            try:
+                yield from exports.iter_chunks(cursor, render_tips, EXPORT_CHUNK_ROWS)
+            finally:
+                # Closed before the next cursor is requested, so its partition can be detached
+                cursor.close()
+            cursor = next(cursors, None)
+    except (sqlite3.Error, OSError) as e:
+        # Headers are already sent, so the best we can do is end the stream early (but well-formed)
+        logger.error(f"Export aborted mid-stream: {e}")
+    finally:
+        cursors.close()
+
+@app.route("/admin/export")
 @app.route("/admin/export_csv")
 def export_csv():
-    """Export health records to CSV."""
+    """Stream health records as ?format=csv|csv.gz|ndjson|ndjson.gz|parquet, limited to a date or id range.
+
+    Tips are rendered in ?lang= (default en); ?gzip=1 is kept as a shorthand for csv.gz.
+    """
     if not session.get('admin'):
         flash("Please log in.", "error")
         return redirect(url_for('admin_login'))
+    fmt = request.args.get('format') or ('csv.gz' if request.args.get('gzip') == '1' else 'csv')
+    if fmt not in exports.available_formats():
+        flash(f"Export format {fmt} is not available." + (" Install pyarrow for Parquet." if fmt == 'parquet' else ""),
+              "error")
+        return redirect(url_for('admin_dashboard'))
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute("SELECT * FROM health_records")
-            records = c.fetchall()
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['ID', 'Weight (kg)', 'Height (cm)', 'Age', 'Gender', 'Activity Level',
-                         'Water Intake (L)', 'BMI', 'Chronic Diseases', 'Sleep Hours', 'Sleep Disturbance',
-                         'Substance Use', 'Mental Health', 'Fruit/Veggie Intake', 'Water Consumption',
-                         'Oily/Sugary Food Use', 'Menstrual Regularity', 'Pregnancy History',
-                         'Contraceptive Use', 'Health Tips', 'Timestamp'])
-        for r in records:
-            bmi = calculate_bmi(r['weight'], r['height'])
-            writer.writerow([r['id'], r['weight'], r['height'], r['age'], r['gender'], r['activity_level'],
-                            r['water_intake'], round(bmi, 2), r['chronic_diseases'], r['sleep_hours'],
-                            r['sleep_disturbance'], r['substance_use'], r['mental_health'],
-                            r['fruit_veggie_intake'], r['water_consumption'], r['oily_sugary_food_use'],
-                            r['menstrual_regularity'], r['pregnancy_history'], r['contraceptive_use'],
-                            r['health_tips'], r['timestamp']])
-        output.seek(0)
-        return send_file(io.BytesIO(output.getvalue().encode('utf-8')), mimetype='text/csv',
-                        as_attachment=True, download_name='healthbuddy_records.csv')
-    except sqlite3.Error as e:
+        export_query(request.args)
+    except ValueError:
+        flash("Invalid export range.", "error")
+        return redirect(url_for('admin_dashboard'))
+    try:
+        conn = analytics_db()
+        cursors = iter_export_cursors(conn, request.args, export_partitions(conn, request.args))
+        # Run the first query now so an error still gets a redirect rather than a truncated download
+        first = next(cursors)
+    except (sqlite3.Error, OSError) as e:
         logger.error(f"Export error: {e}")
         flash("Export error.", "error")
         return redirect(url_for('admin_dashboard'))
+    t = translations.get(request.args.get('lang', 'en'), translations["en"])
+    mimetype, extension = exports.FORMATS[fmt]
+    return Response(stream_with_context(exports.stream(fmt, iter_export_chunks(first, cursors, t))), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=healthbuddy_records.{extension}'})
 
 # Templates
 about_template = """
@@ -673,7 +1610,7 @@ assessment_template = """
             };
             for (let [key, { value, error, cond }] of Object.entries(fields)) {
                 if (cond(value)) {
-                    document.getElementById('error').innerText = translations['{{ lang }}'][error];
+                    document.getElementById('error').innerText = translations[error];
                     document.getElementById('error').style.display = 'block';
                     return false;
                 }
@@ -686,7 +1623,7 @@ assessment_template = """
         function changeLanguage(lang) {
             window.location.href = '{{ url_for("assessment") }}?lang=' + lang;
         }
-        const translations = {{ t | tojson | safe }};
+        const translations = {{ t.to_json() }};
     </script>
 </head>
 <body class="min-h-screen bg-gradient-to-br from-cyan-50 to-green-100 flex flex-col">
@@ -858,6 +1795,7 @@ admin_dashboard_template = """
                 {% endfor %}
             {% endif %}
         {% endwith %}
+        {% if snapshot_at %}<p class="text-gray-600 text-sm mb-4">Data as of {{ snapshot_at }}.</p>{% endif %}
         <div class="bg-white p-6 rounded-lg shadow-md mb-6">
             <h2 class="text-lg sm:text-xl font-semibold text-green-800 mb-4">Statistics</h2>
             <div class="grid grid-cols-1 sm:grid-cols-2 gap-4 text-sm sm:text-base">
@@ -901,30 +1839,174 @@ admin_dashboard_template = """
                 });
             </script>
         </div>
+        <div class="bg-white p-6 rounded-lg shadow-md mb-6">
+            <h2 class="text-lg sm:text-xl font-semibold text-green-800 mb-4">Trends</h2>
+            <form method="GET" class="flex flex-col sm:flex-row gap-4 mb-4 text-sm sm:text-base">
+                {% for name, value in filters.items() %}<input type="hidden" name="{{ name }}" value="{{ value }}">{% endfor %}
+                <select name="trend" onchange="this.form.submit()" class="p-2 border border-green-300 rounded">
+                    <option value="daily" {% if trend == 'daily' %}selected{% endif %}>Last 30 days</option>
+                    <option value="hourly" {% if trend == 'hourly' %}selected{% endif %}>Last 48 hours</option>
+                </select>
+                <select name="trend_by" onchange="this.form.submit()" class="p-2 border border-green-300 rounded">
+                    <option value="">All records</option>
+                    <option value="gender" {% if trend_by == 'gender' %}selected{% endif %}>By gender</option>
+                    <option value="activity_level" {% if trend_by == 'activity_level' %}selected{% endif %}>By activity level</option>
+                    <option value="age_group" {% if trend_by == 'age_group' %}selected{% endif %}>By age group</option>
+                </select>
+            </form>
+            <canvas id="trendChart" height="120"></canvas>
+            <script>
+                const trends = {{ trends | tojson }};
+                const palette = ['#16A34A', '#36A2EB', '#FF6384', '#F59E0B', '#8B5CF6', '#6B7280'];
+                const datasets = Object.entries(trends.series).map(([name, counts], i) => ({
+                    type: 'bar', label: 'Assessments (' + name + ')', data: counts, stack: 'count',
+                    backgroundColor: palette[i % palette.length], yAxisID: 'y'
+                }));
+                [['avg_bmi', 'Average BMI', '#B91C1C'], ['avg_water', 'Average water (L)', '#0EA5E9'],
+                 ['avg_sleep', 'Average sleep (h)', '#7C3AED']].forEach(([key, label, color]) => datasets.push({
+                    type: 'line', label: label, data: trends[key], borderColor: color, backgroundColor: color,
+                    spanGaps: true, yAxisID: 'y1'
+                }));
+                new Chart(document.getElementById('trendChart').getContext('2d'), {
+                    data: { labels: trends.labels, datasets: datasets },
+                    options: {
+                        responsive: true,
+                        scales: {
+                            y: { stacked: true, beginAtZero: true, title: { display: true, text: 'Assessments' } },
+                            y1: { position: 'right', grid: { drawOnChartArea: false } }
+                        }
+                    }
+                });
+            </script>
+        </div>
+        <div class="bg-white p-6 rounded-lg shadow-md mb-6">
+            <h2 class="text-lg sm:text-xl font-semibold text-green-800 mb-4">Distributions</h2>
+            <div class="grid grid-cols-1 sm:grid-cols-3 gap-4 mb-4 text-sm sm:text-base">
+                {% for tail in distribution_tails %}
+                    <p><strong>{{ tail.label }}:</strong> {{ tail.percent if tail.percent is not none else '-' }}{% if tail.percent is not none %}%{% endif %}</p>
+                {% endfor %}
+            </div>
+            <div class="grid grid-cols-1 sm:grid-cols-2 gap-6">
+                {% for metric, title in [('bmi', 'BMI'), ('age', 'Age'), ('sleep_hours', 'Sleep (h)'), ('water_intake', 'Recommended water (L)')] %}
+                    <div>
+                        <canvas id="distribution_{{ metric }}" height="160"></canvas>
+                        <p class="text-xs sm:text-sm text-gray-600 mt-1">{{ title }}:
+                            {% for name, value in distribution_report[metric].percentiles.items() %}{{ name }} {{ value if value is not none else '-' }}{% if not loop.last %} · {% endif %}{% endfor %}
+                        </p>
+                    </div>
+                {% endfor %}
+            </div>
+            <script>
+                const distributionReport = {{ distribution_report | tojson }};
+                [['bmi', 'BMI'], ['age', 'Age'], ['sleep_hours', 'Sleep (h)'], ['water_intake', 'Recommended water (L)']].forEach(([metric, title]) => {
+                    new Chart(document.getElementById('distribution_' + metric).getContext('2d'), {
+                        type: 'bar',
+                        data: {
+                            labels: distributionReport[metric].labels,
+                            datasets: [{ label: title + ' (n=' + distributionReport[metric].total + ')', data: distributionReport[metric].counts,
+                                         backgroundColor: '#16A34A', barPercentage: 1.0, categoryPercentage: 1.0 }]
+                        },
+                        options: { responsive: true, scales: { y: { beginAtZero: true } } }
+                    });
+                });
+            </script>
+        </div>
+        <div class="bg-white p-6 rounded-lg shadow-md mb-6">
+            <h2 class="text-lg sm:text-xl font-semibold text-green-800 mb-4">Cohorts</h2>
+            <form method="GET" class="text-sm sm:text-base mb-4">
+                <p class="text-green-700 font-medium mb-1">Group by (up to 4)</p>
+                <div class="flex flex-wrap gap-x-4 gap-y-1 mb-3">
+                    {% for name in cohort_dimensions %}<label><input type="checkbox" name="group_by" value="{{ name }}" {% if cohort and name in cohort.group_by %}checked{% endif %}> {{ name | replace('_', ' ') | capitalize }}</label>{% endfor %}
+                </div>
+                <div class="grid grid-cols-2 sm:grid-cols-4 gap-2 mb-3">
+                    {% for name, labels in cohort_dimensions.items() %}
+                        <select name="{{ name }}" title="{{ name | replace('_', ' ') | capitalize }}" class="p-2 border border-green-300 rounded">
+                            <option value="">{{ name | replace('_', ' ') | capitalize }}: all</option>
+                            {% for label in labels if label %}<option value="{{ label }}" {% if cohort and cohort.filters.get(name) == label %}selected{% endif %}>{{ label }}</option>{% endfor %}
+                        </select>
+                    {% endfor %}
+                    <input type="date" name="from" title="From date" value="{{ cohort.from if cohort and cohort.from else '' }}" class="p-2 border border-green-300 rounded">
+                    <input type="date" name="to" title="To date" value="{{ cohort.to if cohort and cohort.to else '' }}" class="p-2 border border-green-300 rounded">
+                </div>
+                <button type="submit" class="bg-green-600 text-white py-2 px-4 rounded hover:bg-green-700">Break down</button>
+            </form>
+            {% if cohort_error %}<p class="text-red-600 text-sm sm:text-base">{{ cohort_error }}</p>{% endif %}
+            {% if cohort %}
+                <div class="overflow-x-auto">
+                    <table class="w-full border-collapse text-sm sm:text-base">
+                        <thead>
+                            <tr class="bg-green-600 text-white">
+                                {% for name in cohort.group_by %}<th class="p-2 border">{{ name | replace('_', ' ') | capitalize }}</th>{% endfor %}
+                                <th class="p-2 border">Records</th>
+                                <th class="p-2 border">Avg BMI</th>
+                                <th class="p-2 border">Avg Age</th>
+                                <th class="p-2 border">Avg Sleep (h)</th>
+                                <th class="p-2 border">Avg Water (L)</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+                            {% for group in cohort.groups %}
+                                <tr class="hover:bg-green-50">
+                                    {% for name in cohort.group_by %}<td class="p-2 border">{{ group[name] or '(blank)' }}</td>{% endfor %}
+                                    <td class="p-2 border">{{ group.count }}</td>
+                                    <td class="p-2 border">{{ group.avg_bmi }}</td>
+                                    <td class="p-2 border">{{ group.avg_age }}</td>
+                                    <td class="p-2 border">{{ group.avg_sleep_hours }}</td>
+                                    <td class="p-2 border">{{ group.avg_water_intake }}</td>
+                                </tr>
+                            {% endfor %}
+                        </tbody>
+                    </table>
+                </div>
+                <p class="text-gray-500 text-xs mt-2">{{ cohort.cache.rows }} cached records up to ID {{ cohort.cache.watermark }}; aggregated in {{ cohort.elapsed_ms }} ms. <a href="{{ url_for('admin_cohorts') }}?{{ request.query_string.decode() }}" class="underline">JSON</a></p>
+            {% endif %}
+        </div>
+        <div class="bg-white p-6 rounded-lg shadow-md mb-6">
+            <h2 class="text-lg sm:text-xl font-semibold text-green-800 mb-4">Conditions</h2>
+            <div class="grid grid-cols-2 sm:grid-cols-4 gap-4 text-sm sm:text-base">
+                {% for name, count in condition_counts.items() %}
+                    <a href="{{ url_for('admin_dashboard', condition_filter=name) }}" class="p-3 border border-green-300 rounded hover:bg-green-50 {% if filters.condition_filter == name %}bg-green-100{% endif %}">
+                        <span class="block text-green-700 font-medium">{{ name | capitalize }}</span>
+                        <span class="text-2xl font-semibold text-green-800">{{ count }}</span>
+                    </a>
+                {% endfor %}
+            </div>
+        </div>
         <div class="bg-white p-6 rounded-lg shadow-md mb-6">
             <h2 class="text-lg sm:text-xl font-semibold text-green-800 mb-4">Filter Records</h2>
-            <form method="POST" class="grid grid-cols-1 sm:grid-cols-3 gap-4">
+            <form method="GET" class="grid grid-cols-1 sm:grid-cols-3 gap-4">
                 <div>
                     <label class="block text-green-700 font-medium mb-1 text-sm sm:text-base">Date</label>
-                    <input type="date" name="date_filter" class="w-full p-2 border border-green-300 rounded text-sm sm:text-base">
+                    <input type="date" name="date_filter" value="{{ filters.date_filter }}" class="w-full p-2 border border-green-300 rounded text-sm sm:text-base">
                 </div>
                 <div>
                     <label class="block text-green-700 font-medium mb-1 text-sm sm:text-base">Gender</label>
                     <select name="gender_filter" class="w-full p-2 border border-green-300 rounded text-sm sm:text-base">
                         <option value="">All</option>
-                        <option value="male">Male</option>
-                        <option value="female">Female</option>
+                        <option value="male" {% if filters.gender_filter == 'male' %}selected{% endif %}>Male</option>
+                        <option value="female" {% if filters.gender_filter == 'female' %}selected{% endif %}>Female</option>
                     </select>
                 </div>
                 <div>
                     <label class="block text-green-700 font-medium mb-1 text-sm sm:text-base">Activity Level</label>
                     <select name="activity_filter" class="w-full p-2 border border-green-300 rounded text-sm sm:text-base">
                         <option value="">All</option>
-                        <option value="low">Low</option>
-                        <option value="moderate">Moderate</option>
-                        <option value="high">High</option>
+                        <option value="low" {% if filters.activity_filter == 'low' %}selected{% endif %}>Low</option>
+                        <option value="moderate" {% if filters.activity_filter == 'moderate' %}selected{% endif %}>Moderate</option>
+                        <option value="high" {% if filters.activity_filter == 'high' %}selected{% endif %}>High</option>
                     </select>
                 </div>
+                <div>
+                    <label class="block text-green-700 font-medium mb-1 text-sm sm:text-base">Condition</label>
+                    <select name="condition_filter" class="w-full p-2 border border-green-300 rounded text-sm sm:text-base">
+                        <option value="">All</option>
+                        {% for name in condition_counts %}<option value="{{ name }}" {% if filters.condition_filter == name %}selected{% endif %}>{{ name | capitalize }}</option>{% endfor %}
+                    </select>
+                </div>
+                <div class="sm:col-span-2">
+                    <label class="block text-green-700 font-medium mb-1 text-sm sm:text-base">Chronic Diseases Text</label>
+                    <input type="search" name="condition_search" value="{{ filters.condition_search }}" placeholder="e.g. kidney, pumu" class="w-full p-2 border border-green-300 rounded text-sm sm:text-base">
+                </div>
                 <div class="sm:col-span-3">
                     <button type="submit" class="w-full bg-green-600 text-white py-2 rounded hover:bg-green-700 text-sm sm:text-base">Filter</button>
                 </div>
@@ -932,7 +2014,16 @@ admin_dashboard_template = """
         </div>
         <div class="bg-white p-6 rounded-lg shadow-md">
             <h2 class="text-lg sm:text-xl font-semibold text-green-800 mb-4">Health Records</h2>
-            <a href="{{ url_for('export_csv') }}" class="bg-blue-600 text-white py-2 px-4 rounded hover:bg-blue-700 mb-4 inline-block text-sm sm:text-base">Export to CSV</a>
+            <form method="GET" action="{{ url_for('export_csv') }}" class="grid grid-cols-2 sm:grid-cols-6 gap-2 mb-4 text-sm sm:text-base">
+                <select name="format" class="p-2 border border-green-300 rounded">
+                    {% for fmt in export_formats %}<option value="{{ fmt }}">{{ fmt | upper }}</option>{% endfor %}
+                </select>
+                <input type="date" name="from" title="From date" class="p-2 border border-green-300 rounded">
+                <input type="date" name="to" title="To date" class="p-2 border border-green-300 rounded">
+                <input type="number" name="min_id" min="1" placeholder="From ID" class="p-2 border border-green-300 rounded">
+                <input type="number" name="max_id" min="1" placeholder="To ID" class="p-2 border border-green-300 rounded">
+                <button type="submit" class="bg-blue-600 text-white py-2 px-4 rounded hover:bg-blue-700">Export</button>
+            </form>
             <div class="overflow-x-auto">
                 <table class="w-full border-collapse">
                     <thead>
@@ -944,6 +2035,7 @@ admin_dashboard_template = """
                             <th class="p-2 border text-sm sm:text-base">Gender</th>
                             <th class="p-2 border text-sm sm:text-base">Activity</th>
                             <th class="p-2 border text-sm sm:text-base">Water (L)</th>
+                            <th class="p-2 border text-sm sm:text-base">Chronic Diseases</th>
                             <th class="p-2 border text-sm sm:text-base">Timestamp</th>
                         </tr>
                     </thead>
@@ -957,18 +2049,263 @@ admin_dashboard_template = """
                                 <td class="p-2 border text-sm sm:text-base">{{ record.gender | capitalize }}</td>
                                 <td class="p-2 border text-sm sm:text-base">{{ record.activity_level | capitalize }}</td>
                                 <td class="p-2 border text-sm sm:text-base">{{ record.water_intake }}</td>
+                                <td class="p-2 border text-sm sm:text-base">{{ record.chronic_diseases }}</td>
                                 <td class="p-2 border text-sm sm:text-base">{{ record.timestamp }}</td>
                             </tr>
                         {% endfor %}
                     </tbody>
                 </table>
             </div>
+            <div class="flex justify-between mt-4 text-sm sm:text-base">
+                {% if before %}<a href="{{ url_for('admin_dashboard', **page_args) }}" class="text-green-700 underline">&laquo; Newest</a>{% else %}<span></span>{% endif %}
+                {% if next_before %}<a href="{{ url_for('admin_dashboard', before=next_before, **page_args) }}" class="text-green-700 underline">Older &raquo;</a>{% endif %}
+            </div>
         </div>
     </main>
 </body>
 </html>
 """
 
+TEMPLATE_SOURCES = {
+    'about': about_template,
+    'assessment': assessment_template,
+    'admin_login': admin_login_template,
+    'admin_dashboard': admin_dashboard_template
+}
+template_registry = {}
+# (name, lang) -> PrerenderedPage
+prerendered_pages = {}
+# Pages are built from the inline templates and the translation sources, so they change only when those do
+PAGES_MODIFIED = datetime.fromtimestamp(max(
+    os.path.getmtime(path) for path in [os.path.abspath(__file__)] + [
+        os.path.join(TRANSLATIONS_DIR, f"{lang}.json") for lang in translations.languages]), timezone.utc)
+
+def precompile_templates():
+    """Compile every inline template once, caching bytecode on disk when JINJA_BYTECODE_CACHE_DIR is set."""
+    cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_loader = DictLoader({f"{name}.html": source for name, source in TEMPLATE_SOURCES.items()})
+    for name in TEMPLATE_SOURCES:
+        template_registry[name] = app.jinja_env.get_template(f"{name}.html")
+    prerendered_pages.clear()
+
+precompile_templates()
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if any dashboard record query falls back to a full table scan."""
+    init_db()
+    problems = check_query_plans()
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo("All dashboard queries use an index.")
+
+def check_query_plans():
+    """Run EXPLAIN QUERY PLAN over every dashboard filter combination and report full scans."""
+    conn = db.get_db()
+    problems = []
+    choices = [("date_filter", [None, "2025-01-01"])] + [(f, [None] + allowed) for f, (column, allowed) in DASHBOARD_FILTERS.items()]
+    choices += [("condition_filter", [None, "diabetes"]), ("condition_search", [None, "sukari"])]
+    combos = [{}]
+    for f, values in choices:
+        combos = [dict(combo, **({f: v} if v else {})) for combo in combos for v in values]
+    for filters in combos:
+        for before in (None, 1000):
+            if not filters and before is None:
+                # The unfiltered first page walks the rowid backwards and stops at LIMIT
+                continue
+            query, params = dashboard_query(filters, before)
+            for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params):
+                detail = row[3]
+                if detail.split()[:2] == ["SCAN", "health_records"] and "USING" not in detail:
+                    problems.append(f"Full scan for filters={filters} before={before}: {detail}")
+    return problems
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Recompute the dashboard summary tables from health_records and its archived partitions.
+
+    This is the recovery path whenever check-stats reports a mismatch or a non-finite average: the
+    triggers only apply deltas, so a bad value that reached the sums is not undone by deleting its row.
+    """
+    init_db()
+    conn = db.pool.connection()
+    archived = partitions.list_partitions(conn)
+    # Partitions are read-only, so scan them before the write transaction (they cannot be detached inside it)
+    c = conn.cursor()
+    archived_summary = summary_partials(c, partition_store.each(conn, archived))
+    archived_distributions = scanned_distributions(c, partition_store.each(conn, archived))
+    with db.pool.transaction() as conn:
+        if partitions.list_partitions(conn) != archived:
+            raise click.ClickException("Records were archived meanwhile; run rebuild-stats again.")
+        c = conn.cursor()
+        c.row_factory = sqlite3.Row
+        rebuild_summary(c)
+        add_summary_partials(c, archived_summary)
+        rebuild_distributions(c, archived_distributions)
+    click.echo("Summary tables rebuilt.")
+
+@app.cli.command("check-stats")
+def check_stats_command():
+    """Verify the dashboard summary tables against full-scan aggregates."""
+    init_db()
+    c = db.get_db().cursor()
+    c.row_factory = sqlite3.Row
+    problems = check_summary(c) + check_distributions(c)
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo("Summary tables match health_records.")
+
+@app.cli.command("rebuild-conditions")
+def rebuild_conditions_command():
+    """Re-tag chronic-disease answers and rebuild their full-text index after the synonyms change."""
+    init_db()
+    with db.pool.transaction() as conn:
+        rebuild_conditions(conn.cursor())
+    click.echo("Condition tags rebuilt.")
+
+@app.cli.command("compile-translations")
+def compile_translations_command():
+    """Validate translations/*.json and compile them into memory-mappable catalogs."""
+    try:
+        translations.build(force=True)
+    except i18n.CatalogError as e:
+        click.echo(str(e), err=True)
+        raise SystemExit(1)
+    click.echo(f"Compiled {', '.join(translations)} into {os.path.join(TRANSLATIONS_DIR, 'compiled')}.")
+
+@app.cli.command("backfill-rollups")
+@click.option("--days", type=int, default=None, help="Only recompute the last N days (default: whole history).")
+def backfill_rollups_command(days):
+    """Recompute the hourly and daily trend rollups from health_records.
+
+    Archived months are left alone: their rollups were complete when they were archived.
+    """
+    init_db()
+    archived_until = partitions.archived_until(db.pool.connection())
+    if days is None:
+        with db.pool.transaction() as conn:
+            backfill_rollups(conn.cursor(), archived_until)
+        click.echo("Rebuilt rollups for the whole history" + (f" since {archived_until}." if archived_until else "."))
+        return
+    end = datetime.now().date() + timedelta(days=1)
+    start = end - timedelta(days=days)
+    backfill_rollups_in_chunks(max(start, archived_until) if archived_until else start, end)
+    click.echo(f"Rebuilt rollups for the last {days} day(s).")
+
+@app.cli.command("archive-records")
+@click.option("--keep-months", type=click.IntRange(min=1), default=None,
+              help="Months kept in the hot table, the current one included (default: HEALTHBUDDY_ARCHIVE_KEEP_MONTHS).")
+@click.option("--compress/--no-compress", default=None,
+              help="Gzip the partition files (default: HEALTHBUDDY_ARCHIVE_COMPRESS).")
+def archive_records_command(keep_months, compress):
+    """Move past months out of health_records into read-only per-month partition files."""
+    init_db()
+    moved = archive_records(keep_months, compress)
+    for month, rows in moved.items():
+        click.echo(f"{month}: {rows} record(s) archived")
+    click.echo(f"Archived {sum(moved.values())} record(s) into {partition_store.directory}.")
+
+@app.cli.command("check-tips")
+def check_tips_command():
+    """Exhaustively evaluate the tip decision table against every translation catalog."""
+    problems = []
+    for lang, catalog in translations.items():
+        missing = tips.missing_keys(catalog)
+        if missing:
+            problems.append(f"{lang}: missing tip keys {', '.join(missing)}")
+    uncoded = sorted(tips.all_tip_keys() - set(codes.TIP_BITS))
+    if uncoded:
+        problems.append(f"Tip keys without a storage code: {', '.join(uncoded)}")
+    count = 0
+    for profile in tips.iter_profiles():
+        keys = tips.tip_keys(profile)
+        if len(set(keys)) != len(keys):
+            problems.append(f"Duplicate tips for {profile}: {keys}")
+        elif not uncoded and codes.decode_tips(codes.encode_tips(keys)) != list(keys):
+            problems.append(f"Tip bitmask does not round-trip for {profile}: {keys}")
+        count += 1
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise SystemExit(1)
+    click.echo(f"Evaluated {count} profiles; every tip key resolves in {', '.join(translations)}.")
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    init_db()
+    click.echo(f"Database schema is at v{MIGRATIONS[-1].version}.")
+
+@app.cli.command("migrate-storage")
+def migrate_storage_command():
+    """Migrate legacy text-encoded health_records to the compact v2 schema (safe while older versions serve)."""
+    init_db()
+    click.echo(f"Storage schema is at v{codes.SCHEMA_VERSION}.")
+
+IMPORT_TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+def validate_import_record(record):
+    """Validate an imported row like the assessment form; returns (values, timestamp) or raises ValueError.
+
+    An optional timestamp column keeps the time the assessment was collected in the field.
+    """
+    try:
+        values, invalid_field = parse_assessment(record)
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Enter valid numeric values.")
+    if invalid_field:
+        raise ValueError(f"{invalid_field}: {assessment_error_message(translations['en'], invalid_field)}")
+    collected = str(record.get("timestamp") or "").strip()
+    if not collected:
+        return values, None
+    for fmt in IMPORT_TIMESTAMP_FORMATS:
+        try:
+            return values, datetime.strptime(collected, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    raise ValueError(f"timestamp: expected YYYY-MM-DD HH:MM:SS, got {collected!r}")
+
+@app.cli.command("import-records")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(sorted(set(importer.FORMATS.values()))),
+              help="File format; guessed from the extension by default.")
+@click.option("--chunk-rows", default=importer.CHUNK_ROWS, show_default=True,
+              help="Rows per insert transaction and per scoring task.")
+@click.option("--workers", type=int, help="Tip-scoring processes (default: CPU count; 0 scores in this process).")
+@click.option("--rejects", type=click.Path(dir_okay=False),
+              help="Append rejected rows as JSON lines here (default: PATH.rejects.jsonl).")
+@click.option("--restart", is_flag=True, help="Ignore the saved checkpoint and import the file from the start.")
+def import_records_command(path, fmt, chunk_rows, workers, rejects, restart):
+    """Stream assessments from a CSV or JSON Lines file into health_records, resuming where a previous run stopped."""
+    init_db()
+
+    def progress(stats):
+        click.echo(f"{stats['rows_read']} rows read, {stats['imported']} imported, {stats['rejected']} rejected "
+                   f"({stats['rows_per_second']:.0f} rows/s)", err=True)
+
+    with open(rejects or f"{path}.rejects.jsonl", "w" if restart else "a", encoding="utf-8") as rejects_file:
+        record_importer = importer.Importer(db.pool, INSERT_HEALTH_RECORD, validate_import_record,
+                                            health_record_values, chunk_rows=chunk_rows, workers=workers,
+                                            rejects=rejects_file, progress=progress)
+        try:
+            stats = record_importer.run(path, fmt, restart)
+        except importer.ImportFileError as e:
+            raise click.ClickException(str(e))
+        except KeyboardInterrupt:
+            raise click.ClickException("Interrupted; run the same command again to resume after the last saved chunk.")
+    resumed = f", resumed after row {stats['resumed_at']}" if stats['resumed_at'] else ""
+    click.echo(f"Imported {stats['imported']} of {stats['rows_read']} rows ({stats['rejected']} rejected{resumed}) "
+               f"in {stats['seconds']:.1f} s, {stats['rows_per_second']:.0f} rows/s.")
+    if stats['rejected']:
+        click.echo(f"Rejected rows are in {rejects_file.name}.")
+
 if __name__ == "__main__":
     try:
         init_db()
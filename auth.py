@@ -0,0 +1,122 @@
+"""Password hashing off the request path and login attempt limiting.
+
+Hashes are computed on a small per-process thread pool (hashlib releases the
+GIL while hashing), with a cap on how many verifications may be queued; once
+the cap is reached new logins are refused immediately instead of piling up
+behind the expensive hash. LoginLimiter counts recent failures per client IP
+and per username so excess attempts are rejected before any hashing runs.
+
+LoginLimiter keeps its counters in process memory, so each gunicorn worker
+counts on its own and a client can make up to workers x the configured
+failures before every worker refuses it. The IP it is given is
+request.remote_addr; behind a router that is the router's address unless
+HEALTHBUDDY_PROXY_HOPS makes the app trust X-Forwarded-For (the default on
+Heroku), otherwise every client shares one IP bucket.
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:600000'
+
+
+class HasherBusy(Exception):
+    """Raised when the password hashing pool is saturated or too slow."""
+
+
+class PasswordHasher:
+    """Bounded pool for generating and verifying password hashes."""
+
+    def __init__(self, method=DEFAULT_HASH_METHOD, workers=2, max_pending=8, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Executor threads do not survive fork, so each worker process builds its own
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Too many password hashes in progress")
+        try:
+            future = self._pool().submit(func, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                raise HasherBusy("Password hashing timed out")
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different method or cost than the configured one."""
+        return password_hash.split('$', 1)[0] != self.method
+
+
+class LoginLimiter:
+    """Sliding-window failure counter keyed on client IP and username."""
+
+    def __init__(self, max_per_ip=20, max_per_username=5, window=300, max_keys=10000):
+        self.limits = {'ip': max_per_ip, 'user': max_per_username}
+        self.window = window
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return 0
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return 0
+        return len(attempts)
+
+    def allow(self, ip, username):
+        """False when either the IP or the username has too many recent failures."""
+        now = time.monotonic()
+        with self._lock:
+            blocked = (self._recent(('ip', ip), now) >= self.limits['ip']
+                       or self._recent(('user', username), now) >= self.limits['user'])
+            if blocked:
+                self.rejected += 1
+            return not blocked
+
+    def failed(self, ip, username):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) >= self.max_keys:
+                for key in list(self._failures):
+                    self._recent(key, now)
+            for key in (('ip', ip), ('user', username)):
+                self._failures.setdefault(key, deque(maxlen=max(self.limits.values()))).append(now)
+
+    def succeeded(self, username):
+        with self._lock:
+            self._failures.pop(('user', username), None)
+
+    def stats(self):
+        with self._lock:
+            return {'tracked_keys': len(self._failures), 'rejected': self.rejected}
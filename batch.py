@@ -0,0 +1,121 @@
+"""Vectorized batch assessment engine.
+
+Scores many people at once from columnar input (a pandas DataFrame or a
+mapping of column name -> array). Results match the scalar calculate_bmi,
+calculate_water_intake and generate_health_tips functions in app.py (and the
+tips.py decision table), but tips come back as translation keys so rendering
+stays a separate step.
+"""
+import numpy as np
+import pandas as pd
+
+import tips
+
+# One column per tip the scalar engine can emit, in the order it emits them
+TIP_SLOTS = ('bmi', 'activity', 'sleep', 'sleep_disturbance', 'mental', 'chronic', 'substance',
+             'menstrual', 'pregnancy', 'contraceptive', 'nutrition')
+
+WATER_ML_PER_KG = {'high': 35, 'moderate': 32.5, 'low': 30}
+SMALL_WATER_CONSUMPTION = ('water_glass_1', 'water_glass_2_3')
+
+REQUIRED_COLUMNS = ('weight', 'height', 'age', 'gender', 'activity_level', 'sleep_hours',
+                    'sleep_disturbance', 'mental_health', 'water_consumption')
+OPTIONAL_COLUMNS = {'chronic_diseases': '', 'substance_use': 'no', 'menstrual_regularity': '',
+                    'pregnancy_history': '', 'contraceptive_use': 'none'}
+
+
+def round2(values):
+    """Round to 2 decimals exactly like Python's round(x, 2), element-wise."""
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, 2)
+    # np.round scales by 100 first, which can disagree with round() right at a half; fix those few in Python
+    scaled = values * 100
+    near_half = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded.flat[i] = round(float(values.flat[i]), 2)
+    return rounded
+
+
+def _frame(data):
+    frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise KeyError(f"missing columns: {', '.join(missing)}")
+    for column, default in OPTIONAL_COLUMNS.items():
+        if column not in frame.columns:
+            frame = frame.assign(**{column: default})
+    return frame
+
+
+def _text(frame, column):
+    return frame[column].fillna('').astype(str).to_numpy(dtype=str)
+
+
+def bmi(weight, height):
+    """Vectorized calculate_bmi."""
+    weight = np.asarray(weight, dtype=float)
+    height = np.asarray(height, dtype=float)
+    return round2(weight / ((height / 100) ** 2))
+
+
+def water_intake(weight, activity_level, water_consumption):
+    """Vectorized calculate_water_intake."""
+    weight = np.asarray(weight, dtype=float)
+    activity_level = np.asarray(activity_level, dtype=str)
+    per_kg = np.full(weight.shape, float(WATER_ML_PER_KG['low']))
+    for level, ml in WATER_ML_PER_KG.items():
+        per_kg[activity_level == level] = ml
+    water_ml = weight * per_kg
+    water_ml = np.where(np.isin(np.asarray(water_consumption, dtype=str), SMALL_WATER_CONSUMPTION),
+                        water_ml + 500, water_ml)
+    return round2(water_ml / 1000)
+
+
+def tip_keys(frame, bmi_values):
+    """Return an (n, len(TIP_SLOTS)) array of translation keys; '' marks a slot with no tip."""
+    n = len(frame)
+    age_group = np.where(frame['age'].to_numpy(dtype=float) <= tips.YOUTH_MAX_AGE, 'youth', 'elderly')
+    female = _text(frame, 'gender') == 'female'
+    keys = np.full((n, len(TIP_SLOTS)), '', dtype=object)
+    slot = {name: i for i, name in enumerate(TIP_SLOTS)}
+
+    keys[:, slot['bmi']] = np.select([bmi_values < threshold for threshold, _ in tips.BMI_BANDS],
+                                     [tips.BMI_RULES[band] for _, band in tips.BMI_BANDS],
+                                     tips.BMI_RULES[tips.BMI_BAND_OVER])
+    keys[:, slot['activity']] = np.char.add(np.char.add('activity_', _text(frame, 'activity_level')),
+                                            np.char.add('_', age_group))
+    keys[:, slot['sleep']] = np.where(frame['sleep_hours'].to_numpy(dtype=float) >= tips.GOOD_SLEEP_HOURS, 'sleep_good',
+                                      np.char.add('sleep_poor_', age_group))
+    keys[:, slot['sleep_disturbance']] = np.char.add('sleep_disturbance_', _text(frame, 'sleep_disturbance'))
+    mental = np.char.replace(_text(frame, 'mental_health'), '_mental', '')
+    keys[:, slot['mental']] = np.where(mental == 'good', 'mental_good',
+                                       np.char.add(np.char.add('mental_', mental), np.char.add('_', age_group)))
+    keys[:, slot['chronic']] = np.where(np.char.str_len(_text(frame, 'chronic_diseases')) > 0, 'chronic_disease', '')
+    keys[:, slot['substance']] = np.where(np.char.lower(_text(frame, 'substance_use')) == 'yes',
+                                          np.char.add('substance_use_yes_', age_group), 'substance_use_no')
+    menstrual = np.char.lower(_text(frame, 'menstrual_regularity'))
+    keys[:, slot['menstrual']] = np.where(female & (np.char.str_len(menstrual) > 0),
+                                          np.char.add('menstrual_', menstrual), '')
+    keys[:, slot['pregnancy']] = np.where(female & (np.char.str_len(_text(frame, 'pregnancy_history')) > 0),
+                                          'pregnancy_history', '')
+    keys[:, slot['contraceptive']] = np.where(female & (_text(frame, 'contraceptive_use') != 'none'),
+                                              'contraceptive_use', '')
+    keys[:, slot['nutrition']] = np.char.add('general_nutrition_', age_group)
+    return keys
+
+
+def assess(data):
+    """Score a batch; returns a dict with 'bmi', 'water_intake' arrays and the 'tip_keys' matrix."""
+    frame = _frame(data)
+    bmi_values = bmi(frame['weight'], frame['height'])
+    return {
+        'bmi': bmi_values,
+        'water_intake': water_intake(frame['weight'], _text(frame, 'activity_level'),
+                                     _text(frame, 'water_consumption')),
+        'tip_keys': tip_keys(frame, bmi_values),
+    }
+
+
+def row_tip_keys(tip_key_matrix, i):
+    """The non-empty tip keys of row i, in the order the scalar engine emits them."""
+    return [key for key in tip_key_matrix[i] if key]
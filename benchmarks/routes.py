@@ -0,0 +1,140 @@
+"""Load and latency benchmarks for the HealthBuddy Flask routes.
+
+Seeds a database at the requested scales, then drives /assessment (POST), the
+JSON /api/v1/assessments endpoints, /admin/dashboard and /admin/export_csv
+through the Flask test client, first
+sequentially and then from concurrent worker processes, and prints
+throughput and p50/p95/p99 latency as JSON for comparison between commits.
+
+Usage: python benchmarks/routes.py --scales 10000,100000 [--requests 200] [--workers 4] [--output FILE]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from seed import DEFAULT_DB, ROOT, seed_database
+
+ASSESSMENT_FORM = {
+    'weight': '68.5', 'height': '165', 'age': '29', 'gender': 'female', 'activity_level': 'moderate',
+    'chronic_diseases': '', 'sleep_hours': '6.5', 'sleep_disturbance': 'waking_tired', 'substance_use': 'no',
+    'mental_health': 'moderate_mental', 'fruit_veggie_intake': 'fruit_veggie_daily',
+    'water_consumption': 'water_glass_2_3', 'oily_sugary_food_use': 'oily_sugary_moderate',
+    'menstrual_regularity': 'regular', 'pregnancy_history': 'no_pregnancy', 'contraceptive_use': 'none'
+}
+
+# name -> (method, path, form data, whether the admin session is needed); /api/ paths are sent as JSON
+SCENARIOS = {
+    'assessment_post': ('POST', '/assessment?lang=en', ASSESSMENT_FORM, False),
+    'api_assessment': ('POST', '/api/v1/assessments', ASSESSMENT_FORM, False),
+    'api_assessment_async': ('POST', '/api/v1/assessments/async', ASSESSMENT_FORM, False),
+    'admin_dashboard': ('GET', '/admin/dashboard', None, True),
+    'admin_dashboard_filtered': ('GET', '/admin/dashboard?gender_filter=female&activity_filter=low', None, True),
+    'export_csv': ('GET', '/admin/export_csv', None, True),
+}
+# The full export reads every row, so it gets fewer iterations
+EXPORT_REQUESTS = 3
+
+
+def _client(app_module, admin):
+    client = app_module.app.test_client()
+    client.environ_base['wsgi.url_scheme'] = 'https'
+    if admin:
+        with client.session_transaction() as session:
+            session['admin'] = True
+    return client
+
+
+def _drive(scenario, count, database):
+    """Issue `count` requests for one scenario; return per-request latencies in seconds."""
+    os.environ['HEALTHBUDDY_DB'] = database
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    method, path, data, admin = SCENARIOS[scenario]
+    client = _client(app_module, admin)
+    body = {'json': data} if path.startswith('/api/') else {'data': data}
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = client.open(path, method=method, **body)
+        response.get_data()
+        latencies.append(time.perf_counter() - started)
+        if response.status_code not in (200, 202):
+            raise RuntimeError(f"{scenario}: HTTP {response.status_code}")
+    return latencies
+
+
+def summarize(latencies, wall_seconds):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'requests': int(latencies.size),
+        'throughput_rps': round(latencies.size / wall_seconds, 2),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'max_ms': round(float(latencies.max()), 3),
+    }
+
+
+def run_sequential(scenario, count, database):
+    started = time.perf_counter()
+    latencies = _drive(scenario, count, database)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_concurrent(scenario, count, workers, database):
+    per_worker = max(1, count // workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Warm up worker imports before timing
+        list(executor.map(_drive, [scenario] * workers, [0] * workers, [database] * workers))
+        started = time.perf_counter()
+        results = list(executor.map(_drive, [scenario] * workers, [per_worker] * workers, [database] * workers))
+        wall = time.perf_counter() - started
+    return summarize([latency for worker in results for latency in worker], wall)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='10000', help='comma-separated row counts, e.g. 10000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent worker processes')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    args = parser.parse_args()
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'timestamp': time.time(),
+              'requests': args.requests, 'workers': args.workers, 'scales': []}
+    for rows in [int(scale) for scale in args.scales.split(',')]:
+        seed_seconds = seed_database(args.db, rows)
+        scale = {'rows': rows, 'seed_seconds': round(seed_seconds, 2), 'sequential': {}, 'concurrent': {}}
+        for scenario in args.scenarios.split(','):
+            count = EXPORT_REQUESTS if scenario == 'export_csv' else args.requests
+            scale['sequential'][scenario] = run_sequential(scenario, count, args.db)
+            scale['concurrent'][scenario] = run_concurrent(scenario, max(count, args.workers), args.workers, args.db)
+        report['scales'].append(scale)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Seed a HealthBuddy database with synthetic, realistic health records.
+
+Rows are generated column-wise with NumPy and scored with the vectorized
+batch engine, then bulk-inserted with executemany in large transactions.
+
+Usage: python benchmarks/seed.py --rows 100000 [--db PATH] [--days 365] [--seed 42]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DEFAULT_DB = os.path.join(ROOT, 'benchmarks', 'bench.db')
+
+INSERT_CHUNK_ROWS = 50000
+
+
+def generate(rows, days=365, seed=42):
+    """Return a dict of column arrays for `rows` synthetic assessments."""
+    import app
+    rng = np.random.default_rng(seed)
+    gender = rng.choice(app.ASSESSMENT_CHOICES['gender'], rows)
+    female = gender == 'female'
+    height = np.round(np.where(female, rng.normal(160, 7, rows), rng.normal(172, 8, rows)).clip(135, 210), 1)
+    bmi = rng.lognormal(np.log(24), 0.18, rows).clip(14, 55)
+    weight = np.round(bmi * (height / 100) ** 2, 1)
+    now = time.time()
+    timestamps = np.sort(now - rng.uniform(0, days * 86400, rows))
+
+    def pick(field, p=None):
+        # Only answers the form accepts; the code tables also hold 'other' for unrecognized legacy answers
+        return rng.choice(app.ASSESSMENT_CHOICES[field], rows, p=p)
+
+    menstrual = np.where(female, rng.choice(['regular', 'irregular'], rows, p=[0.75, 0.25]), '')
+    pregnancy = np.where(female, rng.choice(['has_pregnancy', 'no_pregnancy'], rows), '')
+    contraceptive = np.where(female, rng.choice(['none', 'pill', 'iud', 'other'], rows, p=[0.5, 0.2, 0.15, 0.15]), 'none')
+    return {
+        'weight': weight,
+        'height': height,
+        'age': rng.integers(12, 90, rows),
+        'gender': gender,
+        'activity_level': pick('activity_level', [0.45, 0.4, 0.15]),
+        'chronic_diseases': rng.choice(['', '', '', '', 'diabetes', 'hypertension', 'asthma', 'heart disease'], rows),
+        'sleep_hours': np.round(rng.normal(6.8, 1.3, rows).clip(2, 12), 1),
+        'sleep_disturbance': pick('sleep_disturbance'),
+        'substance_use': rng.choice(['no', 'no', 'no', 'yes'], rows),
+        'mental_health': pick('mental_health', [0.5, 0.35, 0.15]),
+        'fruit_veggie_intake': pick('fruit_veggie_intake'),
+        'water_consumption': pick('water_consumption'),
+        'oily_sugary_food_use': pick('oily_sugary_food_use'),
+        'menstrual_regularity': menstrual,
+        'pregnancy_history': pregnancy,
+        'contraceptive_use': contraceptive,
+        'timestamp': np.array([time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)) for ts in timestamps]),
+    }
+
+
+def encode_rows(columns):
+    """Score and encode generated columns into health_records insert tuples."""
+    import app
+    import batch
+    import codes
+    scored = batch.assess(columns)
+    # Encode each distinct tip-key row once instead of once per record
+    masks = {}
+    tip_masks = []
+    for keys in map(tuple, scored['tip_keys']):
+        if keys not in masks:
+            masks[keys] = codes.encode_tips(key for key in keys if key)
+        tip_masks.append(masks[keys])
+    encoded = dict(columns, water_intake=scored['water_intake'], tip_mask=np.array(tip_masks))
+    for field, values in codes.CATEGORY_CODES.items():
+        lookup = {value: code for code, value in enumerate(values)}
+        encoded[field] = np.array([lookup[value] for value in columns[field]])
+    ordered = [encoded[column].tolist() for column in app.HEALTH_RECORD_COLUMNS]
+    return list(zip(*ordered))
+
+
+def seed_database(path, rows, days=365, seed=42, replace=True):
+    """Create (or extend) the database at `path` with `rows` synthetic records; returns seconds taken."""
+    if replace:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    os.environ['HEALTHBUDDY_DB'] = path
+    import app
+    import db
+    if db.pool.database != path:
+        db.pool.close_all()
+        db.pool.database = path
+    app.init_db()
+    started = time.perf_counter()
+    conn = db.get_db()
+    conn.execute("PRAGMA synchronous = OFF")
+    for offset in range(0, rows, INSERT_CHUNK_ROWS):
+        count = min(INSERT_CHUNK_ROWS, rows - offset)
+        values = encode_rows(generate(count, days, seed + offset))
+        with db.pool.transaction() as conn:
+            conn.executemany(app.INSERT_HEALTH_RECORD, values)
+    conn.execute(f"PRAGMA synchronous = {db.PRAGMAS['synchronous']}")
+    conn.execute("PRAGMA optimize")
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--days', type=int, default=365, help='spread timestamps over this many past days')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--append', action='store_true', help='add rows instead of starting from an empty database')
+    args = parser.parse_args()
+    elapsed = seed_database(args.db, args.rows, args.days, args.seed, replace=not args.append)
+    print(f"Seeded {args.rows} records into {args.db} in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare per-request template rendering cost before and after the precompiled registry.
+
+Usage: python benchmarks/template_render.py [--iterations N] [--json]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HEALTHBUDDY_DB', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from flask import render_template_string
+import app as healthbuddy
+
+
+def measure(func, iterations):
+    """Return the mean cost of one call in microseconds."""
+    func()
+    return timeit.timeit(func, number=iterations) / iterations * 1e6
+
+
+def run(iterations):
+    results = []
+    flask_app = healthbuddy.app
+    for name in ('about', 'assessment'):
+        for lang in ('en', 'sw'):
+            t = healthbuddy.translations[lang]
+            source = healthbuddy.TEMPLATE_SOURCES[name]
+            with flask_app.test_request_context(f'/?lang={lang}'):
+                before = measure(lambda: render_template_string(source, t=t, lang=lang), iterations)
+                registry = measure(lambda: healthbuddy.render_page(name, t=t, lang=lang), iterations)
+                healthbuddy.prerendered_pages.clear()
+                cached = measure(lambda: healthbuddy.render_static_page(name, t, lang), iterations)
+            results.append({'template': name, 'lang': lang, 'render_template_string_us': round(before, 1),
+                            'registry_us': round(registry, 1), 'prerendered_us': round(cached, 1)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    args = parser.parse_args()
+    results = run(args.iterations)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'template':<12}{'lang':<6}{'from source':>14}{'registry':>12}{'prerendered':>14}")
+    for r in results:
+        print(f"{r['template']:<12}{r['lang']:<6}{r['render_template_string_us']:>12.1f}us"
+              f"{r['registry_us']:>10.1f}us{r['prerendered_us']:>12.1f}us")
+
+
+if __name__ == '__main__':
+    main()
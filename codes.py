@@ -0,0 +1,102 @@
+"""Compact storage codes for health_records.
+
+Categorical answers are stored as small integers and health tips as a bitmask
+of tip IDs instead of translated sentences. Codes are positional and
+append-only: never reorder or remove an entry, only add new ones at the end.
+Each field ends in 'other', the code for legacy answers outside the table.
+"""
+
+SCHEMA_VERSION = 2
+
+CATEGORY_CODES = {
+    'gender': ('male', 'female', 'other'),
+    'activity_level': ('low', 'moderate', 'high', 'other'),
+    'sleep_disturbance': ('insomnia', 'waking_tired', 'no_disturbance', 'other'),
+    'mental_health': ('good_mental', 'moderate_mental', 'poor_mental', 'other'),
+    'fruit_veggie_intake': ('fruit_veggie_no', 'fruit_veggie_daily', 'fruit_veggie_rarely', 'other'),
+    'water_consumption': ('water_glass_1', 'water_glass_2_3', 'water_liter_1', 'water_liter_1_plus', 'other'),
+    'oily_sugary_food_use': ('oily_sugary_no', 'oily_sugary_moderate', 'oily_sugary_frequent', 'oily_sugary_daily',
+                             'other'),
+    'menstrual_regularity': ('', 'regular', 'irregular', 'other'),
+    'pregnancy_history': ('', 'has_pregnancy', 'no_pregnancy', 'other'),
+    'contraceptive_use': ('none', 'pill', 'iud', 'other'),
+}
+
+# (tip key, display slot); the bit for a tip is its index in this list
+TIP_CODES = (
+    ('bmi_underweight', 0), ('bmi_healthy', 0), ('bmi_overweight', 0), ('bmi_obese', 0),
+    ('activity_low_youth', 1), ('activity_low_elderly', 1), ('activity_moderate_youth', 1),
+    ('activity_moderate_elderly', 1), ('activity_high_youth', 1), ('activity_high_elderly', 1),
+    ('sleep_good', 2), ('sleep_poor_youth', 2), ('sleep_poor_elderly', 2),
+    ('sleep_disturbance_insomnia', 3), ('sleep_disturbance_waking_tired', 3), ('sleep_disturbance_no_disturbance', 3),
+    ('mental_good', 4), ('mental_moderate_youth', 4), ('mental_moderate_elderly', 4),
+    ('mental_poor_youth', 4), ('mental_poor_elderly', 4),
+    ('chronic_disease', 5),
+    ('substance_use_yes_youth', 6), ('substance_use_yes_elderly', 6), ('substance_use_no', 6),
+    ('menstrual_regular', 7), ('menstrual_irregular', 7),
+    ('pregnancy_history', 8),
+    ('contraceptive_use', 9),
+    ('general_nutrition_youth', 10), ('general_nutrition_elderly', 10),
+)
+
+# Spellings found in pre-v2 databases (after lower-casing) -> the value the code table uses
+LEGACY_ALIASES = {
+    'gender': {'m': 'male', 'f': 'female'},
+    'sleep_disturbance': {'waking tired': 'waking_tired', 'none': 'no_disturbance', 'no': 'no_disturbance'},
+    'mental_health': {'good': 'good_mental', 'moderate': 'moderate_mental', 'poor': 'poor_mental'},
+    'fruit_veggie_intake': {'no': 'fruit_veggie_no', 'daily': 'fruit_veggie_daily', 'rarely': 'fruit_veggie_rarely'},
+    'oily_sugary_food_use': {'no': 'oily_sugary_no', 'moderate': 'oily_sugary_moderate',
+                             'frequent': 'oily_sugary_frequent', 'daily': 'oily_sugary_daily'},
+    'pregnancy_history': {'yes': 'has_pregnancy', 'no': 'no_pregnancy'},
+}
+
+_CATEGORY_LOOKUP = {field: {value: code for code, value in enumerate(values)}
+                    for field, values in CATEGORY_CODES.items()}
+TIP_BITS = {key: bit for bit, (key, _) in enumerate(TIP_CODES)}
+# Bits in display order, so decoding a mask yields tips in the order the rules emit them
+_TIPS_IN_ORDER = sorted(range(len(TIP_CODES)), key=lambda bit: (TIP_CODES[bit][1], bit))
+
+
+def encode(field, value):
+    """Integer code for a categorical value; None for values outside the code table."""
+    return _CATEGORY_LOOKUP[field].get(value)
+
+
+def legacy_value(field, value):
+    """The code-table value for a pre-v2 answer, or None when its spelling is not known."""
+    value = (value or '').strip().lower()
+    value = LEGACY_ALIASES.get(field, {}).get(value, value)
+    return value if value in _CATEGORY_LOOKUP[field] else None
+
+
+def decode(field, code):
+    """Categorical value for a stored code; '' for NULL or unknown codes."""
+    values = CATEGORY_CODES[field]
+    return values[code] if code is not None and 0 <= code < len(values) else ''
+
+
+def encode_tips(keys):
+    """Bitmask for a collection of tip keys."""
+    mask = 0
+    for key in keys:
+        mask |= 1 << TIP_BITS[key]
+    return mask
+
+
+def decode_tips(mask):
+    """Ordered tip keys for a stored bitmask."""
+    mask = mask or 0
+    return [TIP_CODES[bit][0] for bit in _TIPS_IN_ORDER if mask >> bit & 1]
+
+
+def seed_code_tables(c):
+    """(Re)write the category_codes and tip_codes lookup tables from the definitions above."""
+    c.execute("CREATE TABLE IF NOT EXISTS category_codes (field TEXT NOT NULL, code INTEGER NOT NULL, "
+              "value TEXT NOT NULL, PRIMARY KEY (field, code)) WITHOUT ROWID")
+    c.execute("CREATE TABLE IF NOT EXISTS tip_codes (bit INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, "
+              "slot INTEGER NOT NULL)")
+    c.executemany("INSERT OR REPLACE INTO category_codes (field, code, value) VALUES (?, ?, ?)",
+                  [(field, code, value) for field, values in CATEGORY_CODES.items()
+                   for code, value in enumerate(values)])
+    c.executemany("INSERT OR REPLACE INTO tip_codes (bit, key, slot) VALUES (?, ?, ?)",
+                  [(bit, key, slot) for bit, (key, slot) in enumerate(TIP_CODES)])
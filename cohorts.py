@@ -0,0 +1,235 @@
+"""Per-worker columnar cache of health_records for ad-hoc cohort breakdowns.
+
+Every dimension (categorical answers plus derived bands such as age band and
+BMI category) is held as a small-integer NumPy code array, and every metric
+as a float array. A group-by is then a few vectorized passes: build one
+combined key per row, and bincount counts and metric sums per key.
+
+The cache refreshes incrementally by reading only rows whose id is above the
+last one seen. Deletes and edits are not visible to an id watermark, so the
+cache reloads in full when its row count disagrees with the record count the
+caller passes in, and on a fixed interval regardless. Archived months are
+read-only, so only a full reload reads them.
+"""
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+import batch
+import codes
+import tips
+
+FETCH_ROWS = 10000
+MAX_GROUP_BY = 4
+METRICS = ('bmi', 'age', 'sleep_hours', 'water_intake')
+SELECT_COLUMNS = ('id', 'weight', 'height', 'age', 'sleep_hours', 'water_intake', 'substance_use',
+                  'chronic_diseases', 'timestamp') + tuple(codes.CATEGORY_CODES)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Label reported for NULL or out-of-range codes; always the last code of a dimension
+UNKNOWN = 'unknown'
+
+
+def dimension_labels(age_groups, age_over):
+    """dimension -> labels in code order (UNKNOWN last) for age bands given as ((upper bound, label), ...)."""
+    labels = {
+        'age_band': tuple(label for _, label in age_groups) + (age_over,),
+        'bmi_category': tuple(band for _, band in tips.BMI_BANDS) + (tips.BMI_BAND_OVER,),
+        'sleep_band': ('short', 'good'),
+        'substance_use': ('no', 'yes'),
+        'chronic_disease': ('no', 'yes'),
+    }
+    labels.update(codes.CATEGORY_CODES)
+    return {name: tuple(values) + (UNKNOWN,) for name, values in labels.items()}
+
+
+class _Columns:
+    """Append-only NumPy arrays with amortized doubling, so refreshes copy only the new rows."""
+
+    def __init__(self, dtypes):
+        self.dtypes = dtypes
+        self.size = 0
+        self.arrays = {name: np.empty(0, dtype=dtype) for name, dtype in dtypes.items()}
+
+    def append(self, new):
+        count = len(next(iter(new.values())))
+        needed = self.size + count
+        capacity = len(next(iter(self.arrays.values())))
+        if needed > capacity:
+            capacity = max(needed, capacity * 2, 1024)
+            for name, array in self.arrays.items():
+                grown = np.empty(capacity, dtype=self.dtypes[name])
+                grown[:self.size] = array[:self.size]
+                self.arrays[name] = grown
+        for name, values in new.items():
+            self.arrays[name][self.size:needed] = values
+        self.size = needed
+
+    def views(self):
+        # Later appends write past size or into a new array, so these views stay valid without the lock
+        return {name: array[:self.size] for name, array in self.arrays.items()}
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+class CohortCache:
+    """Columnar health_records cache with watermark refreshes and group-by aggregation."""
+
+    def __init__(self, age_groups, age_over, refresh_interval=5.0, full_reload_interval=600.0, archived=None):
+        self.labels = dimension_labels(age_groups, age_over)
+        self._codes = {name: {label: code for code, label in enumerate(values)} for name, values in self.labels.items()}
+        self._age_bounds = np.array([bound for bound, _ in age_groups], dtype=float)
+        self._bmi_bounds = np.array([bound for bound, _ in tips.BMI_BANDS], dtype=float)
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        # archived(conn) yields the health_records tables of archived partitions, each attached while read
+        self.archived = archived
+        self._lock = threading.Lock()
+        self._reset()
+        self._checked = 0.0
+        self.refresh_ms = 0.0
+
+    def _reset(self):
+        dtypes = {name: np.int8 for name in self.labels}
+        dtypes.update({metric: np.float64 for metric in METRICS})
+        dtypes['timestamp'] = 'datetime64[s]'
+        self._columns = _Columns(dtypes)
+        self.watermark = 0
+        self.loaded_at = time.monotonic()
+
+    def _coded(self, name, values):
+        """Map raw codes to dimension codes, sending NULL and out-of-range values to UNKNOWN."""
+        unknown = len(self.labels[name]) - 1
+        values = np.array(values, dtype=float)
+        valid = np.isfinite(values) & (values >= 0) & (values < unknown)
+        return np.where(valid, values, unknown).astype(np.int8)
+
+    def _banded(self, name, values, bounds):
+        # A value equal to a bound belongs to the band above it, matching the "value < bound" rules elsewhere
+        banded = np.searchsorted(bounds, values, side='right')
+        return np.where(np.isfinite(values), banded, len(self.labels[name]) - 1).astype(np.int8)
+
+    def _convert(self, rows):
+        raw = dict(zip(SELECT_COLUMNS, zip(*rows)))
+        new = {metric: np.array(raw[metric], dtype=float) for metric in ('age', 'sleep_hours', 'water_intake')}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bmi = batch.bmi(raw['weight'], raw['height'])
+        new['bmi'] = np.where(np.isfinite(bmi), bmi, np.nan)
+        for field in codes.CATEGORY_CODES:
+            new[field] = self._coded(field, raw[field])
+        new['age_band'] = self._banded('age_band', new['age'], self._age_bounds)
+        new['bmi_category'] = self._banded('bmi_category', new['bmi'], self._bmi_bounds)
+        new['sleep_band'] = np.where(np.isnan(new['sleep_hours']), 2,
+                                     new['sleep_hours'] >= tips.GOOD_SLEEP_HOURS).astype(np.int8)
+        # Free-text answer; like the tip rules, anything other than "yes" counts as no
+        substance = np.char.lower(np.array([value or '' for value in raw['substance_use']], dtype=str))
+        new['substance_use'] = (substance == 'yes').astype(np.int8)
+        new['chronic_disease'] = np.array([1 if value else 0 for value in raw['chronic_diseases']], dtype=np.int8)
+        new['timestamp'] = pd.to_datetime(pd.Series(raw['timestamp'], dtype=object), format=TIMESTAMP_FORMAT,
+                                          errors='coerce').to_numpy(dtype='datetime64[s]')
+        return new, raw['id'][-1]
+
+    def _load(self, conn, table='health_records', after_id=None):
+        after_id = self.watermark if after_id is None else after_id
+        cursor = conn.execute(f"SELECT {', '.join(SELECT_COLUMNS)} FROM {table} WHERE id > ? ORDER BY id", (after_id,))
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                new, last_id = self._convert(rows)
+                self._columns.append(new)
+                # Late imports for an archived month can leave a partition holding higher ids than the hot table
+                self.watermark = max(self.watermark, last_id)
+        finally:
+            cursor.close()
+
+    def refresh(self, conn, count_sql=None, force=False):
+        """Pull rows above the watermark (at most once per refresh_interval unless forced).
+
+        count_sql selects the authoritative number of health_records. It runs in the same read transaction
+        as the load, so a mismatch can only mean rows were deleted, rewritten or archived below the
+        watermark, and the cache is rebuilt. Call it outside a transaction so partitions can be detached.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_interval:
+            return False
+        with self._lock:
+            started = time.perf_counter()
+            full = not self.watermark or now - self.loaded_at > self.full_reload_interval
+            for attempt in (1, 2):
+                if full:
+                    self._reset()
+                    for table in self.archived(conn) if self.archived else ():
+                        self._load(conn, table, 0)
+                own_transaction = not conn.in_transaction
+                if own_transaction:
+                    conn.execute("BEGIN")
+                try:
+                    self._load(conn, 'health_records', 0 if full else None)
+                    consistent = not count_sql or self._columns.size == conn.execute(count_sql).fetchone()[0]
+                finally:
+                    if own_transaction:
+                        conn.rollback()
+                # A second mismatch means rows moved between the partitions and the hot table while loading
+                if consistent or attempt == 2:
+                    break
+                full = True
+            self._checked = now
+            self.refresh_ms = (time.perf_counter() - started) * 1000
+        return True
+
+    def aggregate(self, group_by, filters=None, date_from=None, date_to=None):
+        """Count and metric means per group of the group_by dimensions among rows matching filters.
+
+        filters maps dimension -> label; date_from/date_to are inclusive 'YYYY-MM-DD' strings.
+        Raises ValueError for unknown dimensions or labels.
+        """
+        group_by = list(group_by)
+        if len(group_by) > MAX_GROUP_BY:
+            raise ValueError(f"group by at most {MAX_GROUP_BY} dimensions")
+        for name in group_by:
+            if name not in self.labels:
+                raise ValueError(f"unknown dimension {name}")
+        with self._lock:
+            columns = self._columns.views()
+        mask = np.ones(len(columns['age']), dtype=bool)
+        for name, label in (filters or {}).items():
+            if name not in self.labels or label not in self._codes[name]:
+                raise ValueError(f"unknown value {label!r} for {name}")
+            mask &= columns[name] == self._codes[name][label]
+        if date_from:
+            mask &= columns['timestamp'] >= np.datetime64(date_from, 's')
+        if date_to:
+            mask &= columns['timestamp'] < np.datetime64(date_to, 's') + np.timedelta64(1, 'D')
+        sizes = [len(self.labels[name]) for name in group_by]
+        if group_by:
+            keys = np.ravel_multi_index([columns[name][mask].astype(np.intp) for name in group_by], sizes)
+        else:
+            keys = np.zeros(int(mask.sum()), dtype=np.intp)
+        groups = int(np.prod(sizes)) if group_by else 1
+        counts = np.bincount(keys, minlength=groups)
+        averages = {}
+        for metric in METRICS:
+            values = columns[metric][mask]
+            present = ~np.isnan(values)
+            totals = np.bincount(keys[present], weights=values[present], minlength=groups)
+            counted = np.bincount(keys[present], minlength=groups)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                averages[metric] = np.round(totals / counted, 2)
+        results = []
+        for key in np.flatnonzero(counts):
+            group = dict(zip(group_by, (self.labels[name][code] for name, code
+                                        in zip(group_by, np.unravel_index(key, sizes)))))
+            group['count'] = int(counts[key])
+            for metric in METRICS:
+                value = averages[metric][key]
+                group[f"avg_{metric}"] = float(value) if np.isfinite(value) else None
+            results.append(group)
+        return results
+
+    def stats(self):
+        return {'rows': self._columns.size, 'watermark': self.watermark, 'bytes': self._columns.nbytes(),
+                'refresh_ms': round(self.refresh_ms, 2)}
@@ -0,0 +1,74 @@
+"""Chronic-disease tags normalized from the free-text chronic_diseases answer.
+
+Each condition has English and Swahili synonyms. The synonyms live in the
+condition_synonyms table, so triggers can tag records inside SQLite on every
+insert and update. They match whole words or phrases after lower-casing and
+turning punctuation into spaces. Text that matches no synonym is still
+searchable through the health_records_fts full-text index.
+"""
+
+# tag -> synonyms (lower case, words separated by single spaces); tags are append-only like codes.py.
+# Words that also appear in unrelated answers ("low sugar diet", "low blood pressure", "healthy heart") are only
+# listed inside a phrase that names the condition. After changing synonyms, add a migration that re-tags records.
+CONDITIONS = {
+    'diabetes': ('diabetes', 'diabetic', 'high sugar', 'high blood sugar', 'sugar disease', 'kisukari', 'sukari',
+                 'ugonjwa wa sukari'),
+    'hypertension': ('hypertension', 'high blood pressure', 'high pressure', 'high bp', 'shinikizo la damu',
+                     'presha'),
+    'asthma': ('asthma', 'asthmatic', 'pumu', 'athma'),
+    'heart disease': ('heart disease', 'heart problem', 'heart problems', 'heart failure', 'heart condition',
+                      'cardiac', 'ugonjwa wa moyo', 'matatizo ya moyo'),
+}
+
+# Characters treated as word separators before matching
+SEPARATORS = (',', ';', ':', '/', '\\', '.', '-', '_', '(', ')', '&', '+', '|', '!', '?', '"', "'",
+              '\n', '\r', '\t')
+
+
+def normalized_sql(expr):
+    """SQL that lower-cases expr, turns separators into spaces and pads it with spaces for whole-word instr()."""
+    for separator in SEPARATORS:
+        literal = {'\n': 'char(10)', '\r': 'char(13)', '\t': 'char(9)', "'": "''''"}.get(separator, f"'{separator}'")
+        expr = f"replace({expr}, {literal}, ' ')"
+    return f"(' ' || lower({expr}) || ' ')"
+
+
+def tag_records_sql(row, table=None):
+    """INSERT adding the (tag, record) pairs for {row}'s chronic_diseases.
+
+    Inside a trigger row is NEW; for a backfill pass the table to read and row as its alias.
+    """
+    source = f"{table} {row}, condition_synonyms s" if table else "condition_synonyms s"
+    return (f"INSERT OR IGNORE INTO health_record_conditions (tag_id, record_id) "
+            f"SELECT DISTINCT s.tag_id, {row}.id FROM {source} WHERE {row}.chronic_diseases != '' "
+            f"AND instr({normalized_sql(f'{row}.chronic_diseases')}, ' ' || s.synonym || ' ') > 0")
+
+
+def fts5_available(c):
+    c.execute("PRAGMA compile_options")
+    return any(option == 'ENABLE_FTS5' for option, in c.fetchall())
+
+
+def seed_condition_tables(c):
+    """Create the tag, synonym and record-tag tables and (re)write the tags and synonyms defined above."""
+    c.execute("CREATE TABLE IF NOT EXISTS condition_tags (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, "
+              "record_count INTEGER NOT NULL DEFAULT 0)")
+    c.execute("CREATE TABLE IF NOT EXISTS condition_synonyms (synonym TEXT PRIMARY KEY, "
+              "tag_id INTEGER NOT NULL REFERENCES condition_tags(id)) WITHOUT ROWID")
+    # Keyed on tag first so filtering and counting by condition are index range scans
+    c.execute("CREATE TABLE IF NOT EXISTS health_record_conditions (tag_id INTEGER NOT NULL, "
+              "record_id INTEGER NOT NULL, PRIMARY KEY (tag_id, record_id)) WITHOUT ROWID")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_health_record_conditions_record ON health_record_conditions(record_id)")
+    c.executemany("INSERT INTO condition_tags (id, name) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET name = excluded.name",
+                  [(tag_id, name) for tag_id, name in enumerate(CONDITIONS, start=1)])
+    c.execute("DELETE FROM condition_synonyms")
+    c.executemany("INSERT INTO condition_synonyms (synonym, tag_id) VALUES (?, ?)",
+                  [(synonym, tag_id) for tag_id, synonyms in enumerate(CONDITIONS.values(), start=1)
+                   for synonym in synonyms])
+
+
+def fts_query(text):
+    """Turn user search text into a safe FTS5 query: every word must match, as a prefix."""
+    # Terms without a letter or digit produce no tokens and would make the query invalid
+    terms = [term.replace('"', '""') for term in text.split() if any(ch.isalnum() for ch in term)]
+    return ' '.join(f'"{term}"*' for term in terms)
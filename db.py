@@ -0,0 +1,357 @@
+"""Shared SQLite connection layer for HealthBuddy.
+
+Each worker process keeps one connection per thread and reuses it across
+requests instead of opening a new one every time. Connections run in WAL mode
+with tuned pragmas, are discarded (never shared) across fork, and count how
+often statements had to wait on a database lock.
+
+Long admin reads can instead use a SnapshotPool: a periodically refreshed
+copy of the database, so exports and analytics never hold a read
+transaction on the live file and never compete with submissions for it.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+import locks
+
+logger = logging.getLogger(__name__)
+
+DATABASE = os.environ.get('HEALTHBUDDY_DB',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), 'healthbuddy.db'))
+
+# Pragmas applied to every new connection; journal_mode is persistent and set once per database
+PRAGMAS = {
+    'synchronous': os.environ.get('HEALTHBUDDY_DB_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': -int(os.environ.get('HEALTHBUDDY_DB_CACHE_KB', 20000)),
+    'mmap_size': int(os.environ.get('HEALTHBUDDY_DB_MMAP_BYTES', 128 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+BUSY_TIMEOUT_MS = int(os.environ.get('HEALTHBUDDY_DB_BUSY_TIMEOUT_MS', 5000))
+# SQLite waits this long on a lock before handing control back so the wait can be counted
+LOCK_SLICE_MS = 50
+# Connections inherited across fork. Kept referenced so the child never closes (or finalizes) the parent's handles
+_inherited = []
+
+
+def is_lock_error(error):
+    """Return True if an sqlite3 error means the database was locked or busy."""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class PooledCursor(sqlite3.Cursor):
+    """Cursor whose statements retry on lock contention and report their execution time."""
+
+    def execute(self, sql, parameters=()):
+        pool = self.connection.pool
+        started = time.perf_counter()
+        try:
+            return pool.retry(super().execute, sql, parameters)
+        finally:
+            pool.observe(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        pool = self.connection.pool
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            # A retry must replay every row; an iterator would resume after the rows already consumed
+            seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return pool.retry(super().executemany, sql, seq_of_parameters)
+        finally:
+            pool.observe(sql, time.perf_counter() - started)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection bound to a pool; cursors and commits go through lock accounting."""
+
+    pool = None
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or PooledCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        self.pool.retry(super().commit)
+
+
+class ConnectionPool:
+    """Per-process, per-thread cache of SQLite connections."""
+
+    def __init__(self, database=DATABASE, pragmas=None, busy_timeout_ms=BUSY_TIMEOUT_MS):
+        self.database = database
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = {}
+        self._pid = os.getpid()
+        self._wal_checked = False
+        # Callables taking (sql, seconds), run after every statement
+        self.observers = []
+        self._counters = {'opened': 0, 'reused': 0, 'lock_waits': 0, 'lock_timeouts': 0, 'lock_wait_seconds': 0.0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """Drop connections inherited from the parent without touching their file handles."""
+        _inherited.extend(self._connections.values())
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = {}
+        self._pid = os.getpid()
+        for key in self._counters:
+            self._counters[key] = 0
+
+    def _open(self):
+        conn = sqlite3.connect(self.database, factory=PooledConnection, isolation_level='IMMEDIATE',
+                               check_same_thread=False)
+        conn.pool = self
+        conn.execute(f"PRAGMA busy_timeout = {min(LOCK_SLICE_MS, self.busy_timeout_ms)}")
+        if not self._wal_checked:
+            mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if mode.lower() != 'wal':
+                logger.warning(f"SQLite journal_mode is {mode}, expected wal")
+            self._wal_checked = True
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _prune(self):
+        """Close connections whose owning thread has exited."""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._connections if ident not in alive]:
+            try:
+                self._connections.pop(ident).close()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to close stale connection: {e}")
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        if self._pid != os.getpid():
+            self._after_fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._counters['reused'] += 1
+            return conn
+        conn = self._open()
+        with self._lock:
+            self._prune()
+            self._connections[threading.get_ident()] = conn
+            self._counters['opened'] += 1
+        self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Yield this thread's connection inside BEGIN IMMEDIATE; commit on success, roll back on error.
+
+        The explicit BEGIN makes DDL part of the transaction too (sqlite3 only opens one implicitly before DML).
+        """
+        conn = self.connection()
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def release(self):
+        """End any transaction left open on this thread's connection (called at request teardown)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+    def retry(self, func, *args):
+        """Run func, waiting out lock contention up to the configured busy timeout.
+
+        The busy handler already waits up to LOCK_SLICE_MS on an ordinary lock. Some lock errors
+        (a stale WAL snapshot, or two writers upgrading from read transactions) come back at once,
+        so a retry that failed quickly first sleeps with exponential backoff.
+        """
+        deadline = None
+        started = None
+        delay = 0.001
+        while True:
+            attempt = time.monotonic()
+            try:
+                result = func(*args)
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e):
+                    raise
+                now = time.monotonic()
+                if deadline is None:
+                    started = attempt
+                    deadline = attempt + self.busy_timeout_ms / 1000
+                    self._counters['lock_waits'] += 1
+                if now >= deadline:
+                    self._counters['lock_timeouts'] += 1
+                    self._counters['lock_wait_seconds'] += now - started
+                    raise
+                if now - attempt < min(LOCK_SLICE_MS, self.busy_timeout_ms) / 2000:
+                    time.sleep(min(delay, deadline - now))
+                    delay = min(delay * 2, LOCK_SLICE_MS / 1000)
+                continue
+            if started is not None:
+                self._counters['lock_wait_seconds'] += time.monotonic() - started
+            return result
+
+    def observe(self, sql, seconds):
+        for observer in self.observers:
+            observer(sql, seconds)
+
+    def close_all(self):
+        """Close every connection owned by this process."""
+        with self._lock:
+            for conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to close connection: {e}")
+            self._connections.clear()
+            self._local = threading.local()
+
+    def stats(self):
+        """Connection and lock-wait counters for this worker process."""
+        with self._lock:
+            open_connections = len(self._connections)
+        stats = dict(self._counters, pid=self._pid, open_connections=open_connections)
+        stats['lock_wait_seconds'] = round(stats['lock_wait_seconds'], 4)
+        return stats
+
+
+class SnapshotPool(ConnectionPool):
+    """Read-only connections to a point-in-time copy of the database, refreshed once it is max_age seconds old.
+
+    The copy is a single file shared by every worker. Whichever worker first finds it stale rebuilds it
+    in a background thread with the backup API, writes to a temporary file and renames it into place.
+    Requests keep reading the current copy meanwhile and only wait when there is no copy yet.
+    Connections to the old copy are reopened the next time their thread asks for one.
+    """
+
+    def __init__(self, source, path, max_age, pragmas=None, busy_timeout_ms=BUSY_TIMEOUT_MS):
+        super().__init__(path, pragmas, busy_timeout_ms)
+        self.source = source
+        self.max_age = max_age
+        # The copy is written in rollback-journal mode and only ever read
+        self._wal_checked = True
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        self._counters.update(refreshes=0, refresh_seconds=0.0)
+
+    def _after_fork(self):
+        super()._after_fork()
+        # The refresh thread did not survive the fork and may have held the lock
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+
+    def _version(self):
+        try:
+            st = os.stat(self.database)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _open(self):
+        conn = super()._open()
+        conn.execute("PRAGMA query_only = 1")
+        conn.version = self._version()
+        return conn
+
+    def taken_at(self):
+        """Unix time the current copy was started, or None before the first refresh."""
+        try:
+            return os.stat(self.database).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _due(self, taken_at):
+        return taken_at is None or time.time() - taken_at >= self.max_age
+
+    def refresh(self, force=False):
+        """Recopy the source database if the copy is missing or stale; return True if this call copied it."""
+        taken_at = self.taken_at()
+        if not force and not self._due(taken_at):
+            return False
+        with self._refresh_lock:
+            # Only wait for another worker's copy when there is no copy to read meanwhile
+            with locks.file_lock(f"{self.database}.lock", blocking=force or taken_at is None) as locked:
+                if not locked or (not force and self.taken_at() != taken_at):
+                    return False
+                started = time.time()
+                tmp = f"{self.database}.{os.getpid()}.tmp"
+                source = sqlite3.connect(self.source, timeout=self.busy_timeout_ms / 1000)
+                target = sqlite3.connect(tmp)
+                try:
+                    # One step copies inside a single WAL read transaction: consistent, and writers never wait
+                    source.backup(target)
+                    target.execute("PRAGMA journal_mode = DELETE")
+                finally:
+                    target.close()
+                    source.close()
+                # The copy's mtime records when it was taken, so every worker can tell its age
+                os.utime(tmp, (started, started))
+                os.replace(tmp, self.database)
+                self._counters['refreshes'] += 1
+                self._counters['refresh_seconds'] += time.time() - started
+        logger.info(f"Refreshed snapshot {self.database} in {(time.time() - started) * 1000:.0f} ms")
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._background_refresh, name='healthbuddy-snapshot',
+                                               daemon=True)
+            self._refresher.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Snapshot refresh of {self.database} failed: {e}")
+
+    def connection(self):
+        """Return this thread's connection to the current copy; a due refresh runs in the background."""
+        if self._pid != os.getpid():
+            self._after_fork()
+        taken_at = self.taken_at()
+        if taken_at is None:
+            self.refresh()
+        elif self._due(taken_at):
+            self._refresh_in_background()
+        conn = super().connection()
+        if conn.version != self._version():
+            # Another refresh renamed a new copy into place; this connection still reads the old file
+            with self._lock:
+                self._connections.pop(threading.get_ident(), None)
+            self._local.conn = None
+            conn.close()
+            conn = super().connection()
+        return conn
+
+    def stats(self):
+        stats = super().stats()
+        taken_at = self.taken_at()
+        stats['refresh_seconds'] = round(stats['refresh_seconds'], 4)
+        stats['age_seconds'] = round(time.time() - taken_at, 1) if taken_at is not None else None
+        return stats
+
+
+pool = ConnectionPool()
+
+
+def get_db():
+    """Return the current thread's pooled connection."""
+    return pool.connection()
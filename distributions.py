@@ -0,0 +1,115 @@
+"""Fixed-bin histograms for BMI, sleep, water intake and age, and the quantiles they answer.
+
+Every metric has fine bins of a fixed width over a fixed range, plus an
+underflow bin (-1) and an overflow bin (n). Recording a value is one counter
+increment, whatever has been recorded before. Two histograms of the same
+metric merge by adding counts, so histograms kept by different processes or
+over different partitions combine exactly. Quantiles are read off the
+cumulative counts with linear interpolation inside a bin, so they are accurate
+to within one bin width.
+"""
+from collections import Counter, namedtuple
+
+# per_unit bins per unit of the metric (width 1/per_unit) covering [low, high)
+Histogram = namedtuple('Histogram', ['low', 'high', 'per_unit', 'display_per_unit'])
+
+HISTOGRAMS = {
+    'bmi': Histogram(10, 60, 2, 1),
+    'sleep_hours': Histogram(0, 24, 4, 1),
+    'water_intake': Histogram(0, 10, 20, 4),
+    'age': Histogram(0, 120, 1, 0.2),
+}
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# Values are stored rounded to 2 decimals; the nudge keeps one sitting exactly on a bin edge out of the bin below
+EDGE_EPSILON = 1e-9
+
+
+def bin_count(spec):
+    return int(round((spec.high - spec.low) * spec.per_unit))
+
+
+def bin_sql(metric, value):
+    """SQL giving the bin of a value expression (NULL when the value is NULL)."""
+    spec = HISTOGRAMS[metric]
+    return (f"CASE WHEN ({value}) < {spec.low} THEN -1 WHEN ({value}) >= {spec.high} THEN {bin_count(spec)} "
+            f"ELSE CAST((({value}) - {spec.low}) * {spec.per_unit} + {EDGE_EPSILON} AS INTEGER) END")
+
+
+def bin_edges(metric, index):
+    """(lower, upper) edge of a bin; the underflow and overflow bins are open on one side (None)."""
+    spec = HISTOGRAMS[metric]
+    if index < 0:
+        return None, spec.low
+    if index >= bin_count(spec):
+        return spec.high, None
+    return spec.low + index / spec.per_unit, spec.low + (index + 1) / spec.per_unit
+
+
+def merge(*histograms):
+    """Add bin counts of histograms of one metric."""
+    merged = Counter()
+    for histogram in histograms:
+        merged.update(histogram)
+    return merged
+
+
+def quantile(metric, counts, q):
+    """Estimate the q-quantile from bin counts; None when there are no values.
+
+    Quantiles falling in the underflow or overflow bin are reported as the range bound.
+    """
+    total = sum(counts.values())
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for index in sorted(counts):
+        count = counts[index]
+        if count <= 0:
+            continue
+        if seen + count >= target:
+            lower, upper = bin_edges(metric, index)
+            if lower is None or upper is None:
+                return upper if lower is None else lower
+            return round(lower + (upper - lower) * (target - seen) / count, 2)
+        seen += count
+    return HISTOGRAMS[metric].high
+
+
+def share_below(metric, counts, threshold):
+    """Fraction of values below threshold; exact when threshold is a bin edge."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    below = 0.0
+    for index, count in counts.items():
+        lower, upper = bin_edges(metric, index)
+        if upper is not None and upper <= threshold:
+            below += count
+        elif lower is not None and upper is not None and lower < threshold:
+            below += count * (threshold - lower) / (upper - lower)
+    return below / total
+
+
+def display_bins(metric, counts):
+    """(labels, counts) for a chart, with fine bins folded into display bins and empty ends trimmed."""
+    spec = HISTOGRAMS[metric]
+    fold = int(round(spec.per_unit / spec.display_per_unit))
+    folded = Counter()
+    for index, count in counts.items():
+        # Floor division keeps underflow at -1 and sends the overflow bin to display_count
+        folded[index // fold] += count
+    display_count = bin_count(spec) // fold
+    occupied = [index for index, count in folded.items() if count > 0]
+    if not occupied:
+        return [], []
+    labels, values = [], []
+    for index in range(min(occupied), max(occupied) + 1):
+        if index < 0:
+            labels.append(f"< {spec.low:g}")
+        elif index >= display_count:
+            labels.append(f"≥ {spec.high:g}")
+        else:
+            labels.append(f"{spec.low + index / spec.display_per_unit:g}")
+        values.append(folded.get(index, 0))
+    return labels, values
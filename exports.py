@@ -0,0 +1,206 @@
+"""Streaming health record exports: CSV, NDJSON (both optionally gzipped) and Parquet.
+
+Rows are read from the cursor in chunks and each chunk is handled
+column-wise: categorical codes are decoded, BMI is computed for the whole
+chunk with the vectorized batch engine, and the chunk is serialized before
+the next one is fetched, so memory stays flat whatever the table size.
+Parquet needs the optional pyarrow package.
+"""
+import io
+import csv
+import json
+import math
+import zlib
+
+import numpy as np
+
+import batch
+import codes
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+CHUNK_ROWS = 1000
+
+# (field, CSV header); bmi and health_tips are derived, the rest are health_records columns
+COLUMNS = (
+    ('id', 'ID'), ('weight', 'Weight (kg)'), ('height', 'Height (cm)'), ('age', 'Age'), ('gender', 'Gender'),
+    ('activity_level', 'Activity Level'), ('water_intake', 'Water Intake (L)'), ('bmi', 'BMI'),
+    ('chronic_diseases', 'Chronic Diseases'), ('sleep_hours', 'Sleep Hours'),
+    ('sleep_disturbance', 'Sleep Disturbance'), ('substance_use', 'Substance Use'),
+    ('mental_health', 'Mental Health'), ('fruit_veggie_intake', 'Fruit/Veggie Intake'),
+    ('water_consumption', 'Water Consumption'), ('oily_sugary_food_use', 'Oily/Sugary Food Use'),
+    ('menstrual_regularity', 'Menstrual Regularity'), ('pregnancy_history', 'Pregnancy History'),
+    ('contraceptive_use', 'Contraceptive Use'), ('health_tips', 'Health Tips'), ('timestamp', 'Timestamp')
+)
+FIELDS = tuple(field for field, _ in COLUMNS)
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'ndjson.gz': ('application/gzip', 'ndjson.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# code -> value per categorical column; NULL and unknown codes decode to '' like codes.decode()
+CATEGORY_LOOKUPS = {field: dict(enumerate(values)) for field, values in codes.CATEGORY_CODES.items()}
+INTEGER_FIELDS = ('id', 'age')
+FLOAT_FIELDS = ('weight', 'height', 'water_intake', 'bmi', 'sleep_hours')
+
+
+def available_formats():
+    return [name for name in FORMATS if name != 'parquet' or pq is not None]
+
+
+def iter_chunks(cursor, render_tips, chunk_rows=CHUNK_ROWS):
+    """Yield {field: list} column chunks; render_tips(tip_mask, chronic_diseases) returns a list of tip texts."""
+    names = [description[0] for description in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        raw = dict(zip(names, zip(*rows)))
+        weight = np.array(raw['weight'], dtype=float)
+        height = np.array(raw['height'], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bmi = batch.bmi(weight, height)
+        chunk = {field: list(raw[field]) for field in FIELDS if field in raw}
+        chunk['bmi'] = [float(value) if np.isfinite(value) else None for value in bmi]
+        for field, lookup in CATEGORY_LOOKUPS.items():
+            chunk[field] = [lookup.get(code, '') for code in raw[field]]
+        chunk['health_tips'] = [render_tips(mask, chronic)
+                                for mask, chronic in zip(raw['tip_mask'], raw['chronic_diseases'])]
+        yield chunk
+
+
+def _rows(chunk):
+    return zip(*(chunk[field] for field in FIELDS))
+
+
+def iter_csv(chunks):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([header for _, header in COLUMNS])
+    tips_index = FIELDS.index('health_tips')
+    for chunk in chunks:
+        for row in _rows(chunk):
+            row = list(row)
+            row[tips_index] = ';'.join(row[tips_index])
+            writer.writerow(row)
+        yield output.getvalue().encode('utf-8')
+        output.seek(0)
+        output.truncate()
+    if output.tell():
+        yield output.getvalue().encode('utf-8')
+
+
+def json_safe(value):
+    """value with non-finite floats, which JSON cannot represent, replaced by None (through dicts and lists)."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    return value
+
+
+def json_line(record):
+    try:
+        return json.dumps(record, ensure_ascii=False, allow_nan=False) + '\n'
+    except ValueError:
+        # Rare (rows saved before infinite values were refused), so only those rows pay for the walk
+        return json.dumps(json_safe(record), ensure_ascii=False, allow_nan=False) + '\n'
+
+
+def iter_ndjson(chunks):
+    for chunk in chunks:
+        yield ''.join(json_line(dict(zip(FIELDS, row))) for row in _rows(chunk)).encode('utf-8')
+
+
+def gzip_blocks(blocks):
+    """Gzip a stream of byte blocks on the fly."""
+    gzipper = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        compressed = gzipper.compress(block)
+        if compressed:
+            yield compressed
+    yield gzipper.flush()
+
+
+class _StreamSink:
+    """Write-only file object that hands written bytes back to a generator instead of keeping them."""
+
+    def __init__(self):
+        self.closed = False
+        self._position = 0
+        self._pending = []
+
+    def write(self, data):
+        data = bytes(data)
+        self._pending.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._pending)
+        self._pending.clear()
+        return data
+
+
+def parquet_schema():
+    def column_type(field):
+        if field in INTEGER_FIELDS:
+            return pa.int64()
+        if field in FLOAT_FIELDS:
+            return pa.float64()
+        if field == 'health_tips':
+            return pa.list_(pa.string())
+        return pa.string()
+    return pa.schema([(field, column_type(field)) for field in FIELDS])
+
+
+def iter_parquet(chunks):
+    """Stream a Parquet file with one row group per chunk."""
+    if pq is None:
+        raise RuntimeError("Parquet export needs the pyarrow package")
+    schema = parquet_schema()
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for chunk in chunks:
+            writer.write_table(pa.table({field: chunk[field] for field in FIELDS}, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream(fmt, chunks):
+    """Serialized byte blocks for an export format."""
+    if fmt.startswith('csv'):
+        blocks = iter_csv(chunks)
+    elif fmt.startswith('ndjson'):
+        blocks = iter_ndjson(chunks)
+    else:
+        blocks = iter_parquet(chunks)
+    return gzip_blocks(blocks) if fmt.endswith('.gz') else blocks
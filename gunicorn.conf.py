@@ -0,0 +1,43 @@
+"""Gunicorn settings, picked up automatically by `gunicorn app:app` from the working directory."""
+import os
+import time
+
+# Load the app once in the master so workers fork with templates compiled and share one secret key
+preload_app = os.environ.get('HEALTHBUDDY_PRELOAD', '1') == '1'
+
+
+def on_starting(server):
+    """Compile translations, migrate the database and clear stale metrics once in the master, before workers fork."""
+    started = time.perf_counter()
+    import app
+    app.translations.build()
+    app.init_db()
+    app.metrics_registry.clear()
+    server.log.info(f"HealthBuddy master ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def child_exit(server, worker):
+    """Fold an exited worker's metrics into the retired totals so its pid file can go."""
+    import app
+    app.metrics_registry.retire(worker.pid)
+
+
+def when_ready(server):
+    """Archive past months every HEALTHBUDDY_ARCHIVE_INTERVAL_HOURS from a master thread (off by default)."""
+    hours = float(os.environ.get('HEALTHBUDDY_ARCHIVE_INTERVAL_HOURS', 0))
+    if hours <= 0:
+        return
+    import threading
+    import app
+
+    def run():
+        while True:
+            try:
+                moved = app.archive_records()
+                if moved:
+                    server.log.info(f"Archived {sum(moved.values())} record(s) from {', '.join(moved)}")
+            except Exception as e:
+                server.log.error(f"Archival failed: {e}")
+            time.sleep(hours * 3600)
+
+    threading.Thread(target=run, name='healthbuddy-archiver', daemon=True).start()
@@ -0,0 +1,196 @@
+"""Compiled, memory-mapped translation catalogs.
+
+Source catalogs are JSON files named <lang>.json. build() validates them
+together (identical key sets, matching str.format placeholders, every
+required key present) and compiles each one into compiled/<lang>.cat:
+
+    magic, key count, offset/length of the pre-serialized JSON form,
+    then (key offset, key length, value offset, value length) per key,
+    then the UTF-8 strings themselves.
+
+A catalog is mapped read-only the first time its language is requested, so
+workers forked from one master share its pages through the page cache; each
+process only keeps a small key -> offset index and decodes values on access.
+"""
+import os
+import json
+import mmap
+import string
+import struct
+import threading
+from collections.abc import Mapping
+
+from markupsafe import Markup
+from jinja2.utils import htmlsafe_json_dumps
+
+MAGIC = b'HBCAT1\0\0'
+HEADER = struct.Struct('<8sIII')
+ENTRY = struct.Struct('<IIII')
+
+
+class CatalogError(ValueError):
+    """A source catalog failed validation."""
+
+
+def placeholders(text):
+    """The str.format field names used in a translation value."""
+    return sorted(field or '' for _, field, _, _ in string.Formatter().parse(text) if field is not None)
+
+
+def validate(sources, required=()):
+    """Problems with a {lang: {key: text}} set of source catalogs; empty when they are consistent."""
+    problems = []
+    reference_lang = 'en' if 'en' in sources else next(iter(sources))
+    reference = sources[reference_lang]
+    for key in sorted(set(required) - set(reference)):
+        problems.append(f"{reference_lang}: missing required key {key}")
+    for lang, catalog in sources.items():
+        for key, text in catalog.items():
+            if not isinstance(text, str):
+                problems.append(f"{lang}: {key} is not a string")
+        if lang == reference_lang:
+            continue
+        for key in sorted(set(reference) - set(catalog)):
+            problems.append(f"{lang}: missing key {key}")
+        for key in sorted(set(catalog) - set(reference)):
+            problems.append(f"{lang}: key {key} is not in {reference_lang}")
+        for key in sorted(set(reference) & set(catalog)):
+            if isinstance(catalog[key], str) and placeholders(catalog[key]) != placeholders(reference[key]):
+                problems.append(f"{lang}: placeholders in {key} differ from {reference_lang}")
+    return problems
+
+
+def compile_catalog(catalog):
+    """Serialize one catalog to the binary .cat layout."""
+    keys = sorted(catalog)
+    blob = bytearray()
+    entries = []
+    offset = HEADER.size + ENTRY.size * len(keys)
+    json_bytes = str(htmlsafe_json_dumps(catalog, sort_keys=True)).encode('utf-8')
+    json_offset = offset
+    blob += json_bytes
+    for key in keys:
+        key_bytes, value_bytes = key.encode('utf-8'), catalog[key].encode('utf-8')
+        key_offset = offset + len(blob)
+        blob += key_bytes
+        value_offset = offset + len(blob)
+        blob += value_bytes
+        entries.append(ENTRY.pack(key_offset, len(key_bytes), value_offset, len(value_bytes)))
+    return HEADER.pack(MAGIC, len(keys), json_offset, len(json_bytes)) + b''.join(entries) + bytes(blob)
+
+
+def build(source_dir, required=()):
+    """Validate every <lang>.json in source_dir and write compiled/<lang>.cat; return the languages built."""
+    sources = {}
+    for filename in sorted(os.listdir(source_dir)):
+        if filename.endswith('.json'):
+            with open(os.path.join(source_dir, filename), encoding='utf-8') as f:
+                sources[filename[:-5]] = json.load(f)
+    if not sources:
+        raise CatalogError(f"No translation catalogs in {source_dir}")
+    problems = validate(sources, required)
+    if problems:
+        raise CatalogError("Invalid translation catalogs:\n" + "\n".join(problems))
+    out_dir = os.path.join(source_dir, 'compiled')
+    os.makedirs(out_dir, exist_ok=True)
+    for lang, catalog in sources.items():
+        path = os.path.join(out_dir, f'{lang}.cat')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(compile_catalog(catalog))
+        os.replace(tmp, path)
+    return list(sources)
+
+
+class Catalog(Mapping):
+    """Read-only mapping over one memory-mapped compiled catalog."""
+
+    def __init__(self, lang, path):
+        self.lang = lang
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, self._json_offset, self._json_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise CatalogError(f"{path} is not a compiled catalog")
+        self._index = {}
+        for i in range(count):
+            key_offset, key_length, value_offset, value_length = ENTRY.unpack_from(
+                self._map, HEADER.size + i * ENTRY.size)
+            key = self._map[key_offset:key_offset + key_length].decode('utf-8')
+            self._index[key] = (value_offset, value_length)
+
+    def __getitem__(self, key):
+        offset, length = self._index[key]
+        return self._map[offset:offset + length].decode('utf-8')
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def to_json(self):
+        """The whole catalog as HTML-safe JSON, for embedding in a <script> block."""
+        return Markup(self._map[self._json_offset:self._json_offset + self._json_length].decode('utf-8'))
+
+
+class Catalogs(Mapping):
+    """Languages available in source_dir, each loaded on first access and rebuilt when its source changes."""
+
+    def __init__(self, source_dir, required=()):
+        self.source_dir = source_dir
+        self.required = set(required)
+        # New languages are picked up on restart, like any other code change
+        self.languages = sorted(name[:-5] for name in os.listdir(source_dir) if name.endswith('.json'))
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def require(self, keys):
+        """Add keys every catalog must define; checked when catalogs are built or loaded."""
+        self.required.update(keys)
+
+    def _compiled_path(self, lang):
+        return os.path.join(self.source_dir, 'compiled', f'{lang}.cat')
+
+    def stale(self):
+        """True when any compiled catalog is missing or older than its source."""
+        for lang in self.languages:
+            compiled = self._compiled_path(lang)
+            if (not os.path.exists(compiled)
+                    or os.path.getmtime(compiled) < os.path.getmtime(os.path.join(self.source_dir, f'{lang}.json'))):
+                return True
+        return False
+
+    def build(self, force=False):
+        """Compile the catalogs if any is missing or stale; returns True when a build ran."""
+        with self._lock:
+            if not force and not self.stale():
+                return False
+            build(self.source_dir, self.required)
+            self._loaded.clear()
+            return True
+
+    def __getitem__(self, lang):
+        catalog = self._loaded.get(lang)
+        if catalog is None:
+            if lang not in self.languages:
+                raise KeyError(lang)
+            self.build()
+            with self._lock:
+                catalog = self._loaded.get(lang)
+                if catalog is None:
+                    catalog = Catalog(lang, self._compiled_path(lang))
+                    missing = sorted(self.required - set(catalog))
+                    if missing:
+                        raise CatalogError(f"{lang}: compiled catalog lacks {', '.join(missing)}; rebuild it")
+                    self._loaded[lang] = catalog
+        return catalog
+
+    def __contains__(self, lang):
+        return lang in self._loaded or lang in self.languages
+
+    def __iter__(self):
+        return iter(self.languages)
+
+    def __len__(self):
+        return len(self.languages)
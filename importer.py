@@ -0,0 +1,264 @@
+"""Streaming, resumable bulk import of assessments from CSV or JSON Lines files.
+
+The file is read record by record and validated in the parent process. Valid
+rows are sent in chunks to a process pool, which scores them with the
+vectorized batch engine. Scored chunks are inserted in file order, one
+executemany per chunk, and each chunk is its own transaction. The same
+transaction moves the file's checkpoint (byte offset and row count) in
+import_progress, so an interrupted import resumes after the last committed
+chunk without inserting a row twice. Rejected rows are logged only once their
+chunk has committed.
+
+A checkpoint also records a hash of the file's first bytes, up to the
+checkpoint offset (at most FINGERPRINT_BYTES), and the file's size and
+modification time. A file that shrank, whose imported prefix changed, or that
+changed without growing needs --restart. A file that only grew resumes, so
+rows appended since the last run are picked up, however small the file.
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import batch
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 5000
+# Most bytes hashed to recognise a file again; only the already imported prefix counts, so appending keeps it
+FINGERPRINT_BYTES = 64 * 1024
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+class ImportFileError(Exception):
+    """The file cannot be imported (unknown format or a checkpoint for different content)."""
+
+
+def detect_format(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ImportFileError(f"Cannot tell the format of {path}; use .csv, .jsonl or .ndjson or pass --format")
+    return fmt
+
+
+def fingerprint(path, length=FINGERPRINT_BYTES):
+    """Hash of the first length bytes of path."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+
+def file_state(path):
+    """(size in bytes, modification time in ns), saved with each checkpoint."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def read_records(path, fmt, offset=0):
+    """Yield (offset after the record, record or error message) from offset onwards.
+
+    Offsets are byte positions, so a checkpointed import can seek straight back to them.
+    """
+    with open(path, 'rb') as f:
+        header = None
+        if fmt == 'csv':
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode('utf-8-sig')]), [])
+            header = [name.strip() for name in header]
+        if offset:
+            f.seek(offset)
+        position = f.tell()
+
+        def lines():
+            nonlocal position
+            for line in f:
+                position += len(line)
+                yield line.decode('utf-8', errors='replace')
+
+        if fmt == 'csv':
+            # csv.reader pulls lines lazily, so position is exact whenever it yields, even for quoted newlines
+            for row in csv.reader(lines()):
+                if not any(cell.strip() for cell in row):
+                    continue
+                if len(row) != len(header):
+                    yield position, f"expected {len(header)} columns, found {len(row)}"
+                else:
+                    yield position, dict(zip(header, row))
+            return
+        for line in lines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield position, f"invalid JSON: {e}"
+                continue
+            yield position, record if isinstance(record, dict) else "expected a JSON object"
+
+
+def score_chunk(values):
+    """Water intake and tip keys per validated assessment; runs in a pool worker."""
+    scored = batch.assess(values)
+    return [(float(scored['water_intake'][row]), batch.row_tip_keys(scored['tip_keys'], row))
+            for row in range(len(values))]
+
+
+def create_import_progress(c):
+    c.execute("CREATE TABLE IF NOT EXISTS import_progress (source TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+              "byte_offset INTEGER NOT NULL, rows_read INTEGER NOT NULL, imported INTEGER NOT NULL, "
+              "rejected INTEGER NOT NULL, updated_at TEXT NOT NULL)")
+
+
+def add_import_file_state(c):
+    c.execute("ALTER TABLE import_progress ADD COLUMN file_size INTEGER")
+    c.execute("ALTER TABLE import_progress ADD COLUMN file_mtime_ns INTEGER")
+
+
+def add_fingerprint_length(c):
+    c.execute("ALTER TABLE import_progress ADD COLUMN fingerprint_bytes INTEGER")
+
+
+def load_checkpoint(conn, source, path, state, restart=False):
+    """(byte offset, rows read, imported, rejected) to resume from; zeros for a new or restarted import."""
+    row = conn.execute("SELECT fingerprint, byte_offset, rows_read, imported, rejected, file_size, file_mtime_ns, "
+                       "fingerprint_bytes FROM import_progress WHERE source = ?", (source,)).fetchone()
+    if row is None or restart:
+        return 0, 0, 0, 0
+    size, mtime_ns = state
+    # Checkpoints saved before file_size was recorded only have the offset to go by
+    saved_size = row[1] if row[5] is None else row[5]
+    if size < max(saved_size, row[1]):
+        raise ImportFileError(f"{source} shrank since its last import; pass --restart to import it from the start")
+    # Checkpoints saved before fingerprint_bytes was recorded hashed a full FINGERPRINT_BYTES
+    length = FINGERPRINT_BYTES if row[7] is None else row[7]
+    if row[0] != fingerprint(path, length) or (size == row[5] and mtime_ns != row[6]):
+        raise ImportFileError(f"{source} changed since its last import; pass --restart to import it from the start")
+    return tuple(row[1:5])
+
+
+def save_checkpoint(conn, source, file_fingerprint, fingerprint_bytes, state, offset, rows_read, imported,
+                    rejected):
+    conn.execute("INSERT INTO import_progress (source, fingerprint, fingerprint_bytes, file_size, file_mtime_ns, "
+                 "byte_offset, rows_read, imported, rejected, updated_at) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now')) "
+                 "ON CONFLICT(source) DO UPDATE SET fingerprint = excluded.fingerprint, "
+                 "fingerprint_bytes = excluded.fingerprint_bytes, "
+                 "file_size = excluded.file_size, file_mtime_ns = excluded.file_mtime_ns, "
+                 "byte_offset = excluded.byte_offset, rows_read = excluded.rows_read, imported = excluded.imported, "
+                 "rejected = excluded.rejected, updated_at = excluded.updated_at",
+                 (source, file_fingerprint, fingerprint_bytes, *state, offset, rows_read, imported, rejected))
+
+
+class Importer:
+    """Import one file; validate(record) -> (values, timestamp) raises ValueError with a reason for bad rows.
+
+    to_row(values, water_intake, tip_keys, timestamp) builds the insert parameters for sql.
+    """
+
+    def __init__(self, pool, sql, validate, to_row, chunk_rows=CHUNK_ROWS, workers=None, rejects=None,
+                 progress=None):
+        self.pool = pool
+        self.sql = sql
+        self.validate = validate
+        self.to_row = to_row
+        self.chunk_rows = chunk_rows
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.rejects = rejects
+        self.progress = progress
+
+    def _chunks(self, records, rows_read):
+        """Yield (end offset, rows read so far, values, timestamps, rejects) per chunk_rows records."""
+        values, timestamps, rejects = [], [], []
+        offset = None
+        for offset, record in records:
+            rows_read += 1
+            try:
+                if isinstance(record, str):
+                    raise ValueError(record)
+                row_values, timestamp = self.validate(record)
+            except ValueError as e:
+                rejects.append((rows_read, str(e), record if isinstance(record, dict) else None))
+            else:
+                values.append(row_values)
+                timestamps.append(timestamp)
+            if len(values) + len(rejects) >= self.chunk_rows:
+                yield offset, rows_read, values, timestamps, rejects
+                values, timestamps, rejects = [], [], []
+        if offset is not None and (values or rejects):
+            yield offset, rows_read, values, timestamps, rejects
+
+    def _write_rejects(self, rejects):
+        if self.rejects is None or not rejects:
+            return
+        for row_number, reason, record in rejects:
+            self.rejects.write(json.dumps({'row': row_number, 'error': reason, 'record': record},
+                                          ensure_ascii=False) + '\n')
+        self.rejects.flush()
+
+    def run(self, path, fmt=None, restart=False):
+        """Import path and return counters; a KeyboardInterrupt leaves the last committed checkpoint in place."""
+        fmt = fmt or detect_format(path)
+        source = os.path.abspath(path)
+        state = file_state(path)
+        offset, rows_read, imported, rejected = load_checkpoint(self.pool.connection(), source, path, state,
+                                                                restart)
+        # (length, hash) of the prefix last fingerprinted; it stops changing once the offset passes FINGERPRINT_BYTES
+        prefix = (None, None)
+        resumed_at = rows_read
+        started = time.perf_counter()
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 0 else None
+        # Keep a few chunks scoring ahead of the writer without reading the whole file into memory
+        in_flight = deque()
+        max_in_flight = max(2, self.workers * 2)
+
+        def commit(chunk, scored):
+            nonlocal rows_read, imported, rejected, prefix
+            end_offset, chunk_rows_read, values, timestamps, rejects = chunk
+            length = min(FINGERPRINT_BYTES, end_offset)
+            if prefix[0] != length:
+                prefix = (length, fingerprint(path, length))
+            rows = [self.to_row(row_values, water_intake, tip_keys, timestamp)
+                    for row_values, (water_intake, tip_keys), timestamp in zip(values, scored, timestamps)]
+            with self.pool.transaction() as conn:
+                conn.executemany(self.sql, rows)
+                save_checkpoint(conn, source, prefix[1], length, state, end_offset, chunk_rows_read,
+                                imported + len(rows), rejected + len(rejects))
+            # After the commit, so a chunk that rolls back and is retried on resume never logs its rejects twice
+            self._write_rejects(rejects)
+            rows_read = chunk_rows_read
+            imported += len(rows)
+            rejected += len(rejects)
+            if self.progress:
+                self.progress(self._stats(rows_read, resumed_at, imported, rejected, started))
+
+        def commit_oldest():
+            chunk, future = in_flight.popleft()
+            commit(chunk, future.result() if future is not None else [])
+
+        try:
+            for chunk in self._chunks(read_records(path, fmt, offset), rows_read):
+                values = chunk[2]
+                if executor is None:
+                    commit(chunk, score_chunk(values) if values else [])
+                    continue
+                in_flight.append((chunk, executor.submit(score_chunk, values) if values else None))
+                # Commit finished chunks in file order; block on the oldest once enough are queued
+                while in_flight and (len(in_flight) >= max_in_flight or in_flight[0][1] is None
+                                     or in_flight[0][1].done()):
+                    commit_oldest()
+            while in_flight:
+                commit_oldest()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return self._stats(rows_read, resumed_at, imported, rejected, started)
+
+    @staticmethod
+    def _stats(rows_read, resumed_at, imported, rejected, started):
+        elapsed = time.perf_counter() - started
+        return {'rows_read': rows_read, 'resumed_at': resumed_at, 'imported': imported, 'rejected': rejected,
+                'seconds': round(elapsed, 2),
+                'rows_per_second': round((rows_read - resumed_at) / elapsed, 1) if elapsed else 0.0}
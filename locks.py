@@ -0,0 +1,31 @@
+"""Advisory file locks shared by the worker processes.
+
+file_lock takes an flock on a lock file so gunicorn workers can serialize
+work that touches shared files: snapshot refreshes in db.py and retiring
+versus scraping metrics in metrics.py. On platforms without fcntl (Windows)
+it always succeeds, so that work is then only serialized within a process.
+"""
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, shared=False, blocking=True):
+    """Hold an exclusive (or shared) lock on path; yields False if it is taken and blocking is False, else True."""
+    if fcntl is None:
+        yield True
+        return
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
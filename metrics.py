@@ -0,0 +1,255 @@
+"""Process-local metrics with cross-worker aggregation and Prometheus text output.
+
+Each worker keeps its histograms and counters in memory and periodically
+writes a JSON snapshot to a shared directory (one file per pid). A scrape
+merges every snapshot: counters and histograms are summed across all
+processes and gauges are summed across live processes only.
+
+When a worker exits, gunicorn's child_exit hook folds its counters and
+histograms into retired.json and removes its file, so the directory does not
+grow with every restart and a new worker that reuses the pid cannot overwrite
+the old totals. A process that finds a leftover file for its own pid retires
+it the same way before the first write. The master clears the directory on
+startup.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+import locks
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get('HEALTHBUDDY_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'healthbuddy_metrics'))
+FLUSH_INTERVAL = float(os.environ.get('HEALTHBUDDY_METRICS_FLUSH_SECONDS', 1.0))
+RETIRED = 'retired'
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    """Named histograms, counters and collected gauges for one process."""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+        self._last_flush = 0.0
+        self._pid = os.getpid()
+        self._claimed = False
+
+    def _reset_after_fork(self):
+        # A forked worker starts from zero so the parent's samples are not counted twice
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        self._claimed = False
+        for metric in self._metrics.values():
+            metric['series'] = {}
+
+    def _metric(self, name, kind, help_text, label, buckets=None):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = {'type': kind, 'help': help_text, 'label': label, 'series': {}}
+            if buckets is not None:
+                metric['buckets'] = list(buckets)
+            self._metrics[name] = metric
+        return metric
+
+    def histogram(self, name, help_text, label, buckets=DEFAULT_BUCKETS):
+        self._metric(name, 'histogram', help_text, label, buckets)
+
+    def counter(self, name, help_text, label=None):
+        self._metric(name, 'counter', help_text, label)
+
+    def add_collector(self, collect):
+        """Register collect() -> {name: (type, help, label, {label_value: value})}, called at snapshot time."""
+        self._collectors.append(collect)
+
+    def observe(self, name, label_value, value):
+        """Record one histogram sample."""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        metric = self._metrics[name]
+        with self._lock:
+            series = metric['series'].get(label_value)
+            if series is None:
+                series = metric['series'][label_value] = [0] * (len(metric['buckets']) + 2)
+            for i, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def inc(self, name, label_value=None, amount=1):
+        """Increment a counter."""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        metric = self._metrics[name]
+        with self._lock:
+            metric['series'][label_value] = metric['series'].get(label_value, 0) + amount
+
+    def snapshot(self):
+        """This process's metrics as a JSON-serializable dict."""
+        with self._lock:
+            data = {name: dict(metric, series={str(k) if k is not None else '': list(v) if isinstance(v, list) else v
+                                               for k, v in metric['series'].items()})
+                    for name, metric in self._metrics.items()}
+        for collect in self._collectors:
+            try:
+                collected = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+                continue
+            for name, (kind, help_text, label, series) in collected.items():
+                data[name] = {'type': kind, 'help': help_text, 'label': label,
+                              'series': {str(k) if k is not None else '': v for k, v in series.items()}}
+        return data
+
+    def flush(self, force=False):
+        """Write this process's snapshot to the shared directory (rate-limited unless forced)."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if not self._claimed:
+                # A file under our pid belongs to an earlier process that was never retired
+                self.retire(os.getpid())
+                self._claimed = True
+            _write_json(self._path(os.getpid()), self.snapshot())
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+    def _path(self, name):
+        return os.path.join(self.directory, f'{name}.json')
+
+    def clear(self):
+        """Remove every snapshot, including retired totals; run once in the master before workers start."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for filename in names:
+            if filename.endswith(('.json', '.tmp')):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def retire(self, pid):
+        """Fold an exited process's counters and histograms into retired.json and remove its snapshot."""
+        path = self._path(pid)
+        if not os.path.exists(path):
+            return
+        try:
+            # Exclusive against scrapes' shared lock, so no total is counted twice or dropped
+            with locks.file_lock(os.path.join(self.directory, '.lock')):
+                snapshot = _read_json(path)
+                if snapshot is None:
+                    return
+                retired = _read_json(self._path(RETIRED)) or {}
+                _merge(retired, snapshot, gauges=False)
+                _write_json(self._path(RETIRED), retired)
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to retire metrics for pid {pid}: {e}")
+
+    def collect_all(self):
+        """Merge every process snapshot and the retired totals, using live values for this process."""
+        snapshots = {os.getpid(): self.snapshot()}
+        try:
+            with locks.file_lock(os.path.join(self.directory, '.lock'), shared=True):
+                for filename in os.listdir(self.directory):
+                    name = filename[:-5] if filename.endswith('.json') else None
+                    if name == RETIRED or (name and name.isdigit() and int(name) != os.getpid()):
+                        snapshot = _read_json(os.path.join(self.directory, filename))
+                        if snapshot is not None:
+                            snapshots[name if name == RETIRED else int(name)] = snapshot
+        except OSError:
+            pass
+        merged = {}
+        for pid, snapshot in snapshots.items():
+            _merge(merged, snapshot, gauges=pid == os.getpid() or (pid != RETIRED and _pid_alive(pid)))
+        return merged
+
+    def render(self):
+        """All merged metrics in Prometheus text exposition format."""
+        lines = []
+        for name, metric in sorted(self.collect_all().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            label = metric.get('label')
+            for label_value, value in sorted(metric['series'].items()):
+                labels = f'{label}="{_escape(label_value)}"' if label else ''
+                if metric['type'] == 'histogram':
+                    prefix = f'{labels},' if labels else ''
+                    for bound, count in zip(metric['buckets'], value):
+                        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {value[-1]}')
+                    lines.append(f'{name}_sum{{{labels}}} {value[-2]}' if labels else f'{name}_sum {value[-2]}')
+                    lines.append(f'{name}_count{{{labels}}} {value[-1]}' if labels else f'{name}_count {value[-1]}')
+                else:
+                    lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge(merged, snapshot, gauges):
+    """Add snapshot's series into merged, skipping gauges unless they belong to a live process."""
+    for name, metric in snapshot.items():
+        if metric['type'] == 'gauge' and not gauges:
+            continue
+        target = merged.setdefault(name, dict(metric, series={}))
+        for label_value, value in metric['series'].items():
+            current = target['series'].get(label_value)
+            if current is None:
+                target['series'][label_value] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                target['series'][label_value] = [a + b for a, b in zip(current, value)]
+            else:
+                target['series'][label_value] = current + value
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable metrics snapshot {path}: {e}")
+        return None
+
+
+def _write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def statement_label(sql):
+    """A short readable prefix plus a hash of the whole statement, so distinct statements never share a label."""
+    text = ' '.join(sql.split())
+    digest = hashlib.sha1(text.encode()).hexdigest()[:10]
+    prefix = text if len(text) <= 60 else f'{text[:57]}...'
+    return f'{prefix} [{digest}]'
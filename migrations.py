@@ -0,0 +1,61 @@
+"""Versioned schema migrations keyed on PRAGMA user_version.
+
+A migration is applied when its version is above the database's user_version.
+Pending migrations run together in one BEGIN IMMEDIATE transaction that ends
+by setting user_version, so a database is never left half-migrated and
+concurrent boots serialize on the write lock and re-check the version. When
+the schema is already current the only work done is one PRAGMA read.
+
+A migration whose `online(c)` hook returns a job (e.g. a chunked copy of a
+large table) breaks the batch: everything before it is committed, the job runs
+on its own short transactions and must set user_version itself when done.
+"""
+import time
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# apply(c) runs inside the shared transaction; online(c) -> callable or None, see the module docstring
+Migration = namedtuple('Migration', ['version', 'name', 'apply', 'online'], defaults=(None,))
+
+
+def user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run(pool, migrations):
+    """Bring the database up to the last migration's version; return the versions applied."""
+    started = time.perf_counter()
+    target = migrations[-1].version
+    version = user_version(pool.connection())
+    if version >= target:
+        logger.info(f"Database schema is current at v{version} ({(time.perf_counter() - started) * 1000:.1f} ms)")
+        return []
+    applied = []
+    while True:
+        job = None
+        with pool.transaction() as conn:
+            # Re-read under the write lock: another process may have migrated while we waited
+            version = user_version(conn)
+            c = conn.cursor()
+            for migration in migrations:
+                if migration.version <= version:
+                    continue
+                job = migration.online(c) if migration.online else None
+                if job is not None:
+                    break
+                logger.info(f"Applying migration v{migration.version}: {migration.name}")
+                migration.apply(c)
+                applied.append(migration.version)
+                version = migration.version
+            c.execute(f"PRAGMA user_version = {version}")
+        if job is None:
+            break
+        logger.info(f"Running online migration v{migration.version}: {migration.name}")
+        job()
+        if user_version(pool.connection()) < migration.version:
+            raise RuntimeError(f"Online migration v{migration.version} did not record its schema version")
+        applied.append(migration.version)
+    logger.info(f"Database schema migrated to v{target} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return applied
@@ -0,0 +1,226 @@
+"""Monthly partitions of health_records in per-month SQLite files.
+
+Months older than the retention window move out of the hot database into
+<archive dir>/health_records_YYYY_MM.<max id>.db (gzipped to .db.gz on
+request). The health_partitions catalog in the hot database lists them. Each
+file is written in full and made read-only first; only then is it committed
+to the catalog, in the same transaction that deletes its rows from the hot
+table. Readers therefore find every record in exactly one place. Delete
+triggers on health_records are guarded by ARCHIVE_GUARD, so the all-time
+summary tables keep counting archived rows.
+
+Readers attach only the partitions their date or id range touches, one at a
+time, since SQLite allows only a handful of attached databases. A compressed
+partition is decompressed once into a local cache directory.
+"""
+import os
+import re
+import gzip
+import shutil
+import hashlib
+import sqlite3
+import logging
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Delete triggers on health_records only fire when no archival is moving rows out
+ARCHIVE_GUARD = "NOT EXISTS (SELECT 1 FROM health_archive_guard)"
+MONTH_PATTERN = '[0-9][0-9][0-9][0-9]-[0-9][0-9]'
+
+Partition = namedtuple('Partition', ['month', 'filename', 'row_count', 'min_id', 'max_id', 'compressed'])
+
+
+def month_bounds(month):
+    """('YYYY-MM-01', first day of the next month) for 'YYYY-MM'; the range every timestamp in the month sorts into."""
+    year, number = int(month[:4]), int(month[5:7])
+    following = date(year + number // 12, number % 12 + 1, 1)
+    return f"{month}-01", f"{following:%Y-%m-%d}"
+
+
+def months_before(today, keep_months):
+    """First day of the oldest month kept hot; months before it are archived."""
+    index = today.year * 12 + today.month - 1 - (keep_months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_catalog(c):
+    """Create the partition catalog and archival guard, and guard existing delete triggers."""
+    c.execute("CREATE TABLE IF NOT EXISTS health_partitions (month TEXT PRIMARY KEY, filename TEXT NOT NULL, "
+              "row_count INTEGER NOT NULL, min_id INTEGER, max_id INTEGER, compressed INTEGER NOT NULL DEFAULT 0, "
+              "archived_at TEXT NOT NULL)")
+    c.execute("CREATE TABLE IF NOT EXISTS health_archive_guard (month TEXT PRIMARY KEY)")
+    guard_delete_triggers(c)
+
+
+def guard_delete_triggers(c):
+    """Recreate every AFTER DELETE trigger on health_records with ARCHIVE_GUARD added to its WHEN clause."""
+    c.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'health_records'")
+    for name, sql in c.fetchall():
+        if not re.search(r'\bAFTER\s+DELETE\b', sql, re.IGNORECASE) or ARCHIVE_GUARD in sql:
+            continue
+        header, begin, body = re.split(r'\b(BEGIN)\b', sql, maxsplit=1, flags=re.IGNORECASE)
+        when = re.search(r'\bWHEN\b', header, re.IGNORECASE)
+        if when:
+            header = f"{header[:when.start()]}WHEN {ARCHIVE_GUARD} AND ({header[when.end():].strip()}) "
+        else:
+            header = f"{header.rstrip()} WHEN {ARCHIVE_GUARD} "
+        c.execute(f"DROP TRIGGER {name}")
+        c.execute(header + begin + body)
+
+
+def list_partitions(conn, date_from=None, date_to=None, min_id=None, max_id=None, before_id=None):
+    """Partitions overlapping an inclusive 'YYYY-MM-DD' date range and id range, oldest month first."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'health_partitions'").fetchone():
+        return []
+    query = "SELECT month, filename, row_count, min_id, max_id, compressed FROM health_partitions WHERE 1=1"
+    params = []
+    if date_from:
+        query += " AND month >= ?"
+        params.append(date_from[:7])
+    if date_to:
+        query += " AND month <= ?"
+        params.append(date_to[:7])
+    if min_id is not None:
+        query += " AND max_id >= ?"
+        params.append(min_id)
+    if max_id is not None:
+        query += " AND min_id <= ?"
+        params.append(max_id)
+    if before_id is not None:
+        query += " AND min_id < ?"
+        params.append(before_id)
+    return [Partition(*row) for row in conn.execute(query + " ORDER BY month", params).fetchall()]
+
+
+def archived_until(conn):
+    """First day after the newest archived month, or None; the hot table holds no rows before it."""
+    partitions = list_partitions(conn)
+    return date.fromisoformat(month_bounds(partitions[-1].month)[1]) if partitions else None
+
+
+class PartitionStore:
+    """Archive files of one hot database, and attaching them to its connections."""
+
+    def __init__(self, directory, cache_dir=None):
+        self.directory = directory
+        # Decompressed copies are named like their partition, so keep one cache per archive directory
+        self.cache_dir = cache_dir or os.path.join(
+            tempfile.gettempdir(), 'healthbuddy_partitions',
+            hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()[:12])
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def readable_path(self, partition):
+        """A path SQLite can open; compressed partitions are decompressed into the cache once."""
+        path = self.path(partition.filename)
+        if not partition.compressed:
+            return path
+        cached = os.path.join(self.cache_dir, partition.filename[:-len('.gz')])
+        if not os.path.exists(cached):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            with gzip.open(path, 'rb') as source, open(tmp, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, cached)
+        return cached
+
+    @contextmanager
+    def attached(self, conn, partition):
+        """Attach a partition and yield its health_records table name; use outside a transaction.
+
+        Partition files are mode 0444, so SQLite opens them read-only (a file: URI with mode=ro would be
+        ignored unless the hot connection was opened with URI filenames enabled).
+        """
+        schema = f"part_{partition.month.replace('-', '_')}"
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (self.readable_path(partition),))
+        try:
+            yield f"{schema}.health_records"
+        finally:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+    def each(self, conn, partitions=None):
+        """Yield the table name of each partition (all by default), attached only until the next one is requested."""
+        for partition in list_partitions(conn) if partitions is None else partitions:
+            with self.attached(conn, partition) as table:
+                yield table
+
+    def archive_month(self, pool, month, ddl, compress=False, before_delete=None):
+        """Move the hot rows of one month into its partition file; returns the number of rows moved.
+
+        ddl is the health_records CREATE TABLE statement with a {table} placeholder. before_delete(c, where,
+        params) runs in the deleting transaction just before the rows go, e.g. to unindex them.
+        """
+        start, end = month_bounds(month)
+        where = "timestamp >= ? AND timestamp < ? AND id <= ?"
+        conn = pool.connection()
+        count, min_id, max_id = conn.execute("SELECT COUNT(*), MIN(id), MAX(id) FROM health_records "
+                                             "WHERE timestamp >= ? AND timestamp < ?", (start, end)).fetchone()
+        if not count:
+            return 0
+        params = (start, end, max_id)
+        existing = next((p for p in list_partitions(conn) if p.month == month), None)
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"health_records_{month.replace('-', '_')}.{max_id}.db"
+        tmp = self.path(f"{filename}.tmp")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if existing:
+            # Rows imported later for an archived month: rewrite the partition with them added
+            shutil.copyfile(self.readable_path(existing), tmp)
+            os.chmod(tmp, 0o644)
+        # Copy through a separate connection so the hot database is only read (WAL readers never block writers)
+        part = sqlite3.connect(tmp)
+        try:
+            part.execute(ddl.format(table='health_records'))
+            part.execute("ATTACH DATABASE ? AS hot", (pool.database,))
+            copied = part.execute(f"INSERT INTO health_records SELECT * FROM hot.health_records WHERE {where}",
+                                  params).rowcount
+            part.execute("CREATE INDEX IF NOT EXISTS idx_health_records_timestamp ON health_records(timestamp)")
+            part.commit()
+            part.execute("DETACH DATABASE hot")
+        finally:
+            part.close()
+        if compress:
+            with open(tmp, 'rb') as source, gzip.open(f"{tmp}.gz", 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(tmp)
+            filename, tmp = f"{filename}.gz", f"{tmp}.gz"
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, self.path(filename))
+        try:
+            with pool.transaction() as conn:
+                remaining = conn.execute(f"SELECT COUNT(*) FROM health_records WHERE {where}", params).fetchone()[0]
+                if remaining != copied:
+                    raise RuntimeError(f"{month}: {remaining} rows to archive but {copied} copied; try again")
+                c = conn.cursor()
+                if before_delete:
+                    before_delete(c, where, params)
+                c.execute("INSERT INTO health_archive_guard (month) VALUES (?)", (month,))
+                c.execute(f"DELETE FROM health_records WHERE {where}", params)
+                c.execute("DELETE FROM health_archive_guard")
+                c.execute("INSERT OR REPLACE INTO health_partitions (month, filename, row_count, min_id, max_id, "
+                          "compressed, archived_at) VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
+                          (month, filename, copied + (existing.row_count if existing else 0),
+                           min(min_id, existing.min_id) if existing else min_id,
+                           max(max_id, existing.max_id) if existing else max_id, int(compress)))
+        except BaseException:
+            os.remove(self.path(filename))
+            raise
+        if existing and existing.filename != filename:
+            os.remove(self.path(existing.filename))
+        logger.info(f"Archived {copied} record(s) from {month} into {filename}")
+        return copied
+
+    def archive(self, pool, ddl, keep_months=1, compress=False, today=None, before_delete=None):
+        """Archive every month before the last keep_months (the current month counts); returns {month: rows}."""
+        cutoff = months_before(today or date.today(), keep_months)
+        months = [month for month, in pool.connection().execute(
+            "SELECT DISTINCT substr(timestamp, 1, 7) FROM health_records WHERE timestamp < ? "
+            "AND substr(timestamp, 1, 7) GLOB ? ORDER BY 1", (f"{cutoff:%Y-%m-%d}", MONTH_PATTERN)).fetchall()]
+        return {month: self.archive_month(pool, month, ddl, compress, before_delete) for month in months}
@@ -0,0 +1,124 @@
+"""Point the app at a throwaway database before it is imported, so tests never touch healthbuddy.db."""
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_data_dir = tempfile.mkdtemp(prefix='healthbuddy-tests-')
+os.environ['HEALTHBUDDY_DB'] = os.path.join(_data_dir, 'healthbuddy.db')
+os.environ['HEALTHBUDDY_METRICS_DIR'] = os.path.join(_data_dir, 'metrics')
+sys.path.insert(0, REPO)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    app.init_db()
+    yield app
+    app.db.pool.close_all()
+    shutil.rmtree(_data_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def assessments(app_module):
+    """Assessment values covering every reachable tip profile, plus the band boundaries."""
+    tips = app_module.tips
+    # Height 200 cm makes BMI weight / 4: 74, 100 and 120 kg sit exactly on the band thresholds
+    weights = {'underweight': 66, 'healthy': 88, 'overweight': 108, 'obese': 132}
+    records = []
+    for p in tips.iter_profiles():
+        records.append({
+            'weight': float(weights[p.bmi_band]), 'height': 200.0,
+            'age': 30 if p.age_group == 'youth' else 50, 'gender': p.gender, 'activity_level': p.activity_level,
+            'chronic_diseases': 'asthma' if p.has_chronic_disease else '',
+            'sleep_hours': 8.0 if p.sleep_band == 'good' else 5.5, 'sleep_disturbance': p.sleep_disturbance,
+            'substance_use': 'yes' if p.uses_substances else 'no', 'mental_health': f'{p.mental_health}_mental',
+            'fruit_veggie_intake': 'fruit_veggie_daily', 'water_consumption': 'water_liter_1',
+            'oily_sugary_food_use': 'oily_sugary_no', 'menstrual_regularity': p.menstrual_regularity,
+            'pregnancy_history': 'has_pregnancy' if p.has_pregnancy_history else '',
+            'contraceptive_use': 'pill' if p.uses_contraceptives else 'none',
+        })
+    base = dict(records[0])
+    for weight in (73.99, 74, 99.99, 100, 119.99, 120):
+        records.append(dict(base, weight=float(weight)))
+    for age in (35, 36):
+        records.append(dict(base, age=age))
+    for sleep_hours in (6.99, 7.0):
+        records.append(dict(base, sleep_hours=sleep_hours))
+    # Water intake lands on a rounding half for some weights; the batch engine must round like round()
+    for weight in (40.1, 57.3, 61.7, 70.15, 88.85):
+        for level in tips.ACTIVITY_LEVELS:
+            for consumption in ('water_glass_1', 'water_liter_1_plus'):
+                records.append(dict(base, weight=weight, height=163.4, activity_level=level,
+                                    water_consumption=consumption))
+    return records
+
+
+# The schema and answer spellings of databases written before the v2 storage migration
+BASELINE_SCHEMA = """
+    CREATE TABLE health_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        weight REAL, height REAL, age INTEGER, gender TEXT, activity_level TEXT,
+        water_intake REAL, health_tips TEXT, chronic_diseases TEXT, sleep_hours REAL,
+        sleep_disturbance TEXT, substance_use TEXT, mental_health TEXT,
+        fruit_veggie_intake TEXT, water_consumption TEXT, oily_sugary_food_use TEXT,
+        menstrual_regularity TEXT, pregnancy_history TEXT, contraceptive_use TEXT,
+        timestamp TEXT
+    );
+    CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password_hash TEXT);
+"""
+BASELINE_COLUMNS = ('weight', 'height', 'age', 'gender', 'activity_level', 'water_intake', 'health_tips',
+                    'chronic_diseases', 'sleep_hours', 'sleep_disturbance', 'substance_use', 'mental_health',
+                    'fruit_veggie_intake', 'water_consumption', 'oily_sugary_food_use', 'menstrual_regularity',
+                    'pregnancy_history', 'contraceptive_use', 'timestamp')
+BASELINE_ROWS = [
+    (56.0, 157.0, 23, 'male', 'moderate', 2.32, 'Healthy weight: Keep eating well and staying active!', 'no',
+     5.0, 'waking_tired', 'no', 'moderate_mental', 'no', 'water_glass_2_3', 'moderate', '', '', 'none',
+     '2025-07-11 00:22:17'),
+    (52.0, 158.0, 26, 'female', 'low', 1.56, 'Young? Walk or play sports for 30 min daily to stay active.', 'no',
+     5.0, 'no_disturbance', 'no', 'moderate_mental', 'rarely', 'water_liter_1', 'moderate', 'regular',
+     'no_pregnancy', 'none', '2025-07-11 00:37:28'),
+    (54.0, 162.0, 29, 'Female', 'Moderate', 1.75, 'Waking tired? Ensure 7-9 hours and limit caffeine.', '',
+     6.0, 'waking_tired', 'alcohol', 'good', 'Daily ', 'water_liter_1', 'Frequent', 'Regular', 'no_pregnancy',
+     'pill', '2025-07-12 09:15:00'),
+    (80.0, 175.0, 41, 'Male', 'high', 3.1, 'Good activity! Try dancing or football to stay fit.', 'asthma',
+     8.0, 'insomnia', 'no', 'poor_mental', 'fruit_veggie_daily', 'water_liter_1_plus', 'oily_sugary_no', '', '',
+     'none', '2025-07-12 10:40:00'),
+]
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """Return a factory writing a pre-migration (user_version 0) database.
+
+    Each extra row is a dict of answers overriding the first baseline row.
+    """
+    def make(extra_rows=()):
+        first = dict(zip(BASELINE_COLUMNS, BASELINE_ROWS[0]))
+        extra_rows = [tuple(dict(first, **row)[column] for column in BASELINE_COLUMNS) for row in extra_rows]
+        path = str(tmp_path / 'baseline.db')
+        conn = sqlite3.connect(path)
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany(f"INSERT INTO health_records ({', '.join(BASELINE_COLUMNS)}) "
+                         f"VALUES ({', '.join('?' * len(BASELINE_COLUMNS))})", BASELINE_ROWS + extra_rows)
+        conn.commit()
+        conn.close()
+        return path
+    return make
+
+
+@pytest.fixture
+def run_migrations():
+    """Migrate a database file in a fresh interpreter, since the app binds its pool to one file at import."""
+    def run(path):
+        env = dict(os.environ, HEALTHBUDDY_DB=path, HEALTHBUDDY_SNAPSHOT_PATH=f'{path}.snapshot')
+        result = subprocess.run([sys.executable, '-c', 'import app; app.init_db()'], cwd=REPO, env=env,
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        return result.stderr
+    return run
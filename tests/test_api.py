@@ -0,0 +1,48 @@
+"""Malformed JSON bodies get a 4xx answer with a message, never a 500."""
+import pytest
+
+RECORD = dict(weight=70, height=170, age=30, gender='female', activity_level='moderate', chronic_diseases='',
+              sleep_hours=7, sleep_disturbance='no_disturbance', substance_use='no', mental_health='good_mental',
+              fruit_veggie_intake='fruit_veggie_daily', water_consumption='water_glass_1',
+              oily_sugary_food_use='oily_sugary_no', menstrual_regularity='regular', pregnancy_history='no_pregnancy',
+              contraceptive_use='none')
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    client.environ_base['wsgi.url_scheme'] = 'https'
+    return client
+
+
+@pytest.mark.parametrize('body', [[RECORD], 'records', None])
+def test_batch_rejects_non_object_body(client, body):
+    response = client.post('/api/v1/assessments/batch', json=body)
+    assert response.status_code == 400
+    assert 'records' in response.get_json()['error']
+
+
+def test_batch_reads_non_string_fields_as_text(client):
+    records = [dict(RECORD, chronic_diseases=3, substance_use=True), dict(RECORD, gender=['female'])]
+    response = client.post('/api/v1/assessments/batch', json={'records': records})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result['index'] for result in body['results']] == [0]
+    assert body['errors'] == [{'index': 1, 'field': 'gender', 'error': 'Select gender.'}]
+
+
+@pytest.mark.parametrize('lang', [['en'], 3, 'xx'])
+def test_assessment_rejects_unsupported_lang(client, lang):
+    response = client.post('/api/v1/assessments', json=dict(RECORD, lang=lang, save=False))
+    assert response.status_code == 400
+    assert response.get_json()['field'] == 'lang'
+
+
+def test_assessment_reads_non_string_fields_as_text(client):
+    response = client.post('/api/v1/assessments', json=dict(RECORD, chronic_diseases=3, substance_use=True,
+                                                             lang='sw', save=False))
+    assert response.status_code == 200
+    assert response.get_json()['saved'] is False
+    response = client.post('/api/v1/assessments', json=dict(RECORD, activity_level=2, save=False))
+    assert response.status_code == 422
+    assert response.get_json()['field'] == 'activity_level'
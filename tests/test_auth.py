@@ -0,0 +1,36 @@
+"""LoginLimiter locks out a username or IP after too many failures and lets it back in after a success or the window."""
+import auth
+
+
+def test_username_lockout_and_reset():
+    limiter = auth.LoginLimiter(max_per_ip=10, max_per_username=3, window=300)
+    for attempt in range(3):
+        assert limiter.allow('10.0.0.1', 'admin')
+        limiter.failed('10.0.0.1', 'admin')
+    assert not limiter.allow('10.0.0.2', 'admin')
+    assert limiter.allow('10.0.0.1', 'other')
+    limiter.succeeded('admin')
+    assert limiter.allow('10.0.0.2', 'admin')
+    assert limiter.stats()['rejected'] == 1
+
+
+def test_ip_lockout_outlasts_a_success():
+    limiter = auth.LoginLimiter(max_per_ip=3, max_per_username=10, window=300)
+    for name in ('a', 'b', 'c'):
+        limiter.failed('10.0.0.1', name)
+    assert not limiter.allow('10.0.0.1', 'd')
+    limiter.succeeded('d')
+    assert not limiter.allow('10.0.0.1', 'd')
+    assert limiter.allow('10.0.0.2', 'd')
+
+
+def test_failures_expire_after_the_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(auth.time, 'monotonic', lambda: now[0])
+    limiter = auth.LoginLimiter(max_per_ip=10, max_per_username=2, window=60)
+    limiter.failed('10.0.0.1', 'admin')
+    limiter.failed('10.0.0.1', 'admin')
+    assert not limiter.allow('10.0.0.1', 'admin')
+    now[0] += 61
+    assert limiter.allow('10.0.0.1', 'admin')
+    assert limiter.stats()['tracked_keys'] == 0
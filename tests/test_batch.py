@@ -0,0 +1,17 @@
+"""batch.assess must score every record exactly like the one-at-a-time path used by the form."""
+import pandas as pd
+
+
+def test_batch_matches_scalar_path(app_module, assessments):
+    scored = app_module.batch.assess(pd.DataFrame(assessments))
+    for row, values in enumerate(assessments):
+        water_intake, tip_keys, bmi = app_module.score_assessment(values)
+        assert scored['bmi'][row] == bmi, values
+        assert scored['water_intake'][row] == water_intake, values
+        assert app_module.batch.row_tip_keys(scored['tip_keys'], row) == list(tip_keys), values
+
+
+def test_batch_accepts_column_mapping(app_module, assessments):
+    columns = {name: [values[name] for values in assessments[:50]] for name in assessments[0]}
+    scored = app_module.batch.assess(columns)
+    assert list(scored['bmi']) == [app_module.calculate_bmi(v['weight'], v['height']) for v in assessments[:50]]
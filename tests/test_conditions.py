@@ -0,0 +1,34 @@
+"""Condition tagging must catch the common ways people name a condition, and nothing that merely shares a word."""
+import sqlite3
+
+import pytest
+
+import conditions
+
+
+def tags_for(text):
+    conn = sqlite3.connect(':memory:')
+    c = conn.cursor()
+    conditions.seed_condition_tables(c)
+    c.execute("CREATE TABLE answers (id INTEGER PRIMARY KEY, chronic_diseases TEXT NOT NULL)")
+    c.execute("INSERT INTO answers (id, chronic_diseases) VALUES (1, ?)", (text,))
+    c.execute(conditions.tag_records_sql("r", "answers"))
+    c.execute("SELECT t.name FROM health_record_conditions h JOIN condition_tags t ON t.id = h.tag_id ORDER BY t.name")
+    return [name for name, in c.fetchall()]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Kisukari, presha", ['diabetes', 'hypertension']),
+    ("HIGH BLOOD-PRESSURE", ['hypertension']),
+    ("high blood sugar", ['diabetes']),
+    ("heart problem; pumu", ['asthma', 'heart disease']),
+    ("ugonjwa wa moyo", ['heart disease']),
+    ("low sugar diet", []),
+    ("low blood pressure", []),
+    ("heartburn", []),
+    ("healthy heart", []),
+    ("pressure at work", []),
+    ("bp normal", []),
+])
+def test_condition_tags(text, expected):
+    assert tags_for(text) == expected
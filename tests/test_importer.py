@@ -0,0 +1,49 @@
+"""A checkpointed import resumes after rows are appended and refuses a file whose imported rows changed."""
+import csv
+
+import pytest
+
+FIELDS = ['weight', 'height', 'age', 'gender', 'activity_level', 'chronic_diseases', 'sleep_hours',
+          'sleep_disturbance', 'mental_health', 'fruit_veggie_intake', 'water_consumption', 'oily_sugary_food_use',
+          'menstrual_regularity', 'pregnancy_history', 'timestamp']
+
+
+def write_rows(path, count, mode='a'):
+    with open(path, mode, newline='') as f:
+        writer = csv.writer(f)
+        if mode == 'w':
+            writer.writerow(FIELDS)
+        for i in range(count):
+            writer.writerow([60 + i, 170, 30, 'male', 'moderate', '', 7, 'no_disturbance', 'good_mental',
+                             'fruit_veggie_daily', 'water_glass_1', 'oily_sugary_no', '', '', '2025-03-01 08:00'])
+
+
+def run_import(app_module, path):
+    record_importer = app_module.importer.Importer(app_module.db.pool, app_module.INSERT_HEALTH_RECORD,
+                                                   app_module.validate_import_record,
+                                                   app_module.health_record_values, workers=0)
+    return record_importer.run(str(path))
+
+
+def test_small_file_resumes_after_append(app_module, tmp_path):
+    path = tmp_path / 'small.csv'
+    write_rows(path, 3, 'w')
+    assert path.stat().st_size < app_module.importer.FINGERPRINT_BYTES
+    stats = run_import(app_module, path)
+    assert (stats['rows_read'], stats['imported'], stats['rejected']) == (3, 3, 0)
+
+    write_rows(path, 2)
+    stats = run_import(app_module, path)
+    assert stats['resumed_at'] == 3
+    assert (stats['rows_read'], stats['imported']) == (5, 5)
+
+
+def test_edited_prefix_needs_restart(app_module, tmp_path):
+    path = tmp_path / 'edited.csv'
+    write_rows(path, 3, 'w')
+    run_import(app_module, path)
+
+    data = path.read_bytes()
+    path.write_bytes(data.replace(b'\n60,', b'\n61,', 1) + b'\n')
+    with pytest.raises(app_module.importer.ImportFileError):
+        run_import(app_module, path)
@@ -0,0 +1,43 @@
+"""Migrating a pre-v2 database must keep every categorical answer, whatever its legacy spelling."""
+import sqlite3
+
+import codes
+
+
+def decoded_answers(path):
+    conn = sqlite3.connect(path)
+    fields = list(codes.CATEGORY_CODES)
+    rows = conn.execute(f"SELECT id, {', '.join(fields)} FROM health_records ORDER BY id").fetchall()
+    tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    return [dict(zip(fields, (codes.decode(field, code) for field, code in zip(fields, row[1:])))) for row in rows], tables
+
+
+def test_legacy_spellings_map_to_codes(baseline_db, run_migrations):
+    path = baseline_db()
+    run_migrations(path)
+    answers, tables = decoded_answers(path)
+    assert [a['gender'] for a in answers] == ['male', 'female', 'female', 'male']
+    assert [a['activity_level'] for a in answers] == ['moderate', 'low', 'moderate', 'high']
+    assert [a['mental_health'] for a in answers] == ['moderate_mental', 'moderate_mental', 'good_mental', 'poor_mental']
+    assert [a['fruit_veggie_intake'] for a in answers] == ['fruit_veggie_no', 'fruit_veggie_rarely',
+                                                           'fruit_veggie_daily', 'fruit_veggie_daily']
+    assert [a['oily_sugary_food_use'] for a in answers] == ['oily_sugary_moderate', 'oily_sugary_moderate',
+                                                            'oily_sugary_frequent', 'oily_sugary_no']
+    assert [a['menstrual_regularity'] for a in answers] == ['', 'regular', 'regular', '']
+    assert not any('other' in a.values() for a in answers)
+    # Everything mapped, so the old table is gone
+    assert 'health_records_legacy' not in tables
+
+
+def test_unmapped_answers_keep_the_old_table(baseline_db, run_migrations):
+    path = baseline_db([{'gender': 'nonbinary', 'fruit_veggie_intake': 'weekly'}])
+    log = run_migrations(path)
+    answers, tables = decoded_answers(path)
+    assert answers[-1]['gender'] == 'other' and answers[-1]['fruit_veggie_intake'] == 'other'
+    assert 'health_records_legacy' in tables
+    assert "'nonbinary'" in log and "'weekly'" in log
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT gender, fruit_veggie_intake FROM health_records_legacy WHERE id = 5").fetchone() == \
+        ('nonbinary', 'weekly')
+    conn.close()
@@ -0,0 +1,31 @@
+"""A baseline (user_version 0) database upgrades through every migration to the same schema as a new one."""
+import sqlite3
+
+import db
+
+
+def schema(conn):
+    return sorted(conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+
+
+def test_baseline_upgrades_through_every_migration(app_module, baseline_db, run_migrations):
+    path = baseline_db()
+    log = run_migrations(path)
+    for migration in app_module.MIGRATIONS:
+        assert f"migration v{migration.version}: {migration.name}" in log
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == app_module.MIGRATIONS[-1].version
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+        assert conn.execute("SELECT COUNT(*) FROM health_records").fetchone()[0] == 4
+        assert schema(conn) == schema(db.pool.connection())
+    finally:
+        conn.close()
+
+
+def test_current_database_is_left_alone(baseline_db, run_migrations):
+    path = baseline_db()
+    run_migrations(path)
+    log = run_migrations(path)
+    assert "schema is current" in log
+    assert "Applying migration" not in log
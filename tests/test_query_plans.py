@@ -0,0 +1,12 @@
+"""Every dashboard filter combination must be served by an index, never a full scan of health_records."""
+
+
+def test_dashboard_queries_use_an_index(app_module):
+    assert app_module.check_query_plans() == []
+
+
+def test_full_scan_is_reported(app_module, monkeypatch):
+    # Guard against the check passing vacuously: a query with no usable index must be flagged
+    monkeypatch.setattr(app_module, 'dashboard_query',
+                        lambda filters, before: ("SELECT id FROM health_records WHERE water_intake > ?", (1,)))
+    assert app_module.check_query_plans()
@@ -0,0 +1,52 @@
+"""The decision table in tips.py must give the same tips as the hand-written rules it replaced."""
+
+
+def scalar_tip_keys(age, gender, weight, height, activity_level, chronic_diseases, sleep_hours,
+                    sleep_disturbance, substance_use, mental_health, menstrual_regularity,
+                    pregnancy_history, contraceptive_use, **unused):
+    """The original if/else rules from generate_health_tips, returning keys instead of text.
+
+    Two fixes made with the table are kept: BMI >= 30 gets bmi_obese (it used to get no BMI tip), and good
+    mental health maps to mental_good (the old mental_good_<age group> lookup raised KeyError).
+    """
+    keys = []
+    bmi = round(weight / ((height / 100) ** 2), 2)
+    if bmi < 18.5:
+        keys.append("bmi_underweight")
+    elif bmi < 25:
+        keys.append("bmi_healthy")
+    elif bmi < 30:
+        keys.append("bmi_overweight")
+    else:
+        keys.append("bmi_obese")
+    age_group = "youth" if age <= 35 else "elderly"
+    keys.append(f"activity_{activity_level}_{age_group}")
+    keys.append("sleep_good" if sleep_hours >= 7 else f"sleep_poor_{age_group}")
+    keys.append(f"sleep_disturbance_{sleep_disturbance}")
+    mental_health_base = mental_health.replace("_mental", "")
+    keys.append("mental_good" if mental_health_base == "good" else f"mental_{mental_health_base}_{age_group}")
+    if chronic_diseases:
+        keys.append("chronic_disease")
+    if substance_use.lower() == 'yes':
+        keys.append(f"substance_use_yes_{age_group}")
+    else:
+        keys.append("substance_use_no")
+    if gender == 'female':
+        if menstrual_regularity:
+            keys.append(f"menstrual_{menstrual_regularity.lower()}")
+        if pregnancy_history:
+            keys.append("pregnancy_history")
+        if contraceptive_use != 'none':
+            keys.append("contraceptive_use")
+    keys.append(f"general_nutrition_{age_group}")
+    return keys
+
+
+def test_decision_table_matches_scalar_rules(app_module, assessments):
+    for values in assessments:
+        assert list(app_module.health_tip_keys(**values)) == scalar_tip_keys(**values), values
+
+
+def test_every_tip_key_is_translated(app_module):
+    for lang, catalog in app_module.translations.items():
+        assert app_module.tips.missing_keys(catalog) == [], lang
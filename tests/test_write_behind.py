@@ -0,0 +1,84 @@
+"""WriteBehindQueue group-commits queued rows, isolates bad rows, and drains on stop."""
+import sqlite3
+
+import pytest
+
+import db
+import write_behind
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'queue.db'), busy_timeout_ms=200)
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+    yield pool
+    pool.close_all()
+
+
+def stored(pool):
+    return [row[0] for row in pool.connection().execute("SELECT x FROM t ORDER BY x")]
+
+
+def test_rows_flush_in_one_batch(pool):
+    queue = write_behind.WriteBehindQueue(pool, "INSERT INTO t VALUES (?)", batch_size=5, max_delay=5)
+    pending = [queue.submit((i,)) for i in range(5)]
+    assert all(write.wait(5) for write in pending)
+    assert stored(pool) == [0, 1, 2, 3, 4]
+    assert queue.stats == {'queued': 5, 'written': 5, 'failed': 0, 'batches': 1}
+    queue.stop()
+
+
+def test_constraint_violation_only_fails_its_row(pool):
+    with pool.transaction() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+    queue = write_behind.WriteBehindQueue(pool, "INSERT INTO t VALUES (?)", batch_size=3, max_delay=5)
+    good, bad, other = (queue.submit((x,)) for x in (10, 1, 11))
+    assert good.wait(5) and other.wait(5)
+    with pytest.raises(sqlite3.IntegrityError):
+        bad.wait(5)
+    assert stored(pool) == [1, 10, 11]
+    assert (queue.stats['written'], queue.stats['failed']) == (2, 1)
+    queue.stop()
+
+
+def test_wait_returns_false_until_a_locked_batch_commits(pool):
+    queue = write_behind.WriteBehindQueue(pool, "INSERT INTO t VALUES (?)", batch_size=1, retries=20,
+                                          retry_delay=0.05)
+    blocker = sqlite3.connect(pool.database, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        pending = queue.submit((1,))
+        assert not pending.wait(0.1)
+        assert not pending.done()
+    finally:
+        blocker.rollback()
+        blocker.close()
+    assert pending.wait(10)
+    assert stored(pool) == [1]
+    queue.stop()
+
+
+def test_strict_save_waits_for_the_commit(app_module, monkeypatch):
+    form = dict(weight='70', height='170', age='30', gender='male', activity_level='low', sleep_hours='7',
+                sleep_disturbance='no_disturbance', mental_health='good_mental',
+                fruit_veggie_intake='fruit_veggie_daily', water_consumption='water_glass_1',
+                oily_sugary_food_use='oily_sugary_no')
+    values, invalid_field = app_module.parse_assessment(form)
+    assert invalid_field is None
+    record = app_module.health_record_values(values, *app_module.score_assessment(values)[:2])
+    count = "SELECT COUNT(*) FROM health_records"
+    before = db.pool.connection().execute(count).fetchone()[0]
+    monkeypatch.setitem(app_module.app.config, 'WRITE_BEHIND', True)
+    monkeypatch.setitem(app_module.app.config, 'WRITE_BEHIND_STRICT', True)
+    assert app_module.save_health_record(record) is True
+    assert db.pool.connection().execute(count).fetchone()[0] == before + 1
+
+
+def test_stop_drains_the_queue(pool):
+    queue = write_behind.WriteBehindQueue(pool, "INSERT INTO t VALUES (?)", batch_size=1000, max_delay=60)
+    pending = [queue.submit((i,)) for i in range(50)]
+    queue.stop(timeout=5)
+    assert all(write.done() for write in pending)
+    assert stored(pool) == list(range(50))
+    queue.stop()
@@ -0,0 +1,131 @@
+"""Decision-table health tip engine.
+
+Every input to the tip rules is categorical once BMI, age and sleep hours are
+banded, so an assessment reduces to a small Profile tuple. The rules below
+map a Profile to an ordered tuple of translation keys; results are memoized
+in a bounded LRU cache, and turning keys into text in a given language is a
+separate final step done by the caller.
+"""
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+
+BMI_BANDS = ((18.5, 'underweight'), (25, 'healthy'), (30, 'overweight'))
+BMI_BAND_OVER = 'obese'
+YOUTH_MAX_AGE = 35
+GOOD_SLEEP_HOURS = 7
+
+AGE_GROUPS = ('youth', 'elderly')
+ACTIVITY_LEVELS = ('low', 'moderate', 'high')
+SLEEP_BANDS = ('poor', 'good')
+SLEEP_DISTURBANCES = ('insomnia', 'waking_tired', 'no_disturbance')
+MENTAL_HEALTH = ('good', 'moderate', 'poor')
+GENDERS = ('male', 'female')
+MENSTRUAL_REGULARITY = ('', 'regular', 'irregular')
+
+TIP_CACHE_SIZE = 4096
+
+Profile = namedtuple('Profile', [
+    'bmi_band', 'age_group', 'activity_level', 'sleep_band', 'sleep_disturbance', 'mental_health',
+    'has_chronic_disease', 'uses_substances', 'gender', 'menstrual_regularity', 'has_pregnancy_history',
+    'uses_contraceptives'
+])
+
+
+def bmi_band(bmi):
+    for threshold, band in BMI_BANDS:
+        if bmi < threshold:
+            return band
+    return BMI_BAND_OVER
+
+
+def age_group(age):
+    return 'youth' if age <= YOUTH_MAX_AGE else 'elderly'
+
+
+def sleep_band(sleep_hours):
+    return 'good' if sleep_hours >= GOOD_SLEEP_HOURS else 'poor'
+
+
+def profile(age, gender, bmi, activity_level, chronic_diseases, sleep_hours, sleep_disturbance,
+            substance_use, mental_health, menstrual_regularity, pregnancy_history, contraceptive_use):
+    """Discretize one assessment into the Profile the decision table is keyed on."""
+    female = gender == 'female'
+    return Profile(
+        bmi_band=bmi_band(bmi),
+        age_group=age_group(age),
+        activity_level=activity_level,
+        sleep_band=sleep_band(sleep_hours),
+        sleep_disturbance=sleep_disturbance,
+        mental_health=mental_health.replace('_mental', ''),
+        has_chronic_disease=bool(chronic_diseases),
+        uses_substances=substance_use.lower() == 'yes',
+        gender=gender,
+        menstrual_regularity=(menstrual_regularity or '').lower() if female else '',
+        has_pregnancy_history=bool(pregnancy_history) if female else False,
+        uses_contraceptives=contraceptive_use != 'none' if female else False,
+    )
+
+
+# Rule tables, compiled once: each maps a profile factor (and age group where advice differs) to a key
+BMI_RULES = {band: f'bmi_{band}' for band in [band for _, band in BMI_BANDS] + [BMI_BAND_OVER]}
+ACTIVITY_RULES = {(level, group): f'activity_{level}_{group}' for level in ACTIVITY_LEVELS for group in AGE_GROUPS}
+SLEEP_RULES = {('good', group): 'sleep_good' for group in AGE_GROUPS}
+SLEEP_RULES.update({('poor', group): f'sleep_poor_{group}' for group in AGE_GROUPS})
+SLEEP_DISTURBANCE_RULES = {value: f'sleep_disturbance_{value}' for value in SLEEP_DISTURBANCES}
+MENTAL_RULES = {('good', group): 'mental_good' for group in AGE_GROUPS}
+MENTAL_RULES.update({(value, group): f'mental_{value}_{group}'
+                     for value in MENTAL_HEALTH if value != 'good' for group in AGE_GROUPS})
+SUBSTANCE_RULES = {(True, group): f'substance_use_yes_{group}' for group in AGE_GROUPS}
+SUBSTANCE_RULES.update({(False, group): 'substance_use_no' for group in AGE_GROUPS})
+MENSTRUAL_RULES = {value: f'menstrual_{value}' for value in MENSTRUAL_REGULARITY if value}
+NUTRITION_RULES = {group: f'general_nutrition_{group}' for group in AGE_GROUPS}
+
+
+@lru_cache(maxsize=TIP_CACHE_SIZE)
+def tip_keys(p):
+    """Ordered tip translation keys for a Profile."""
+    keys = [
+        BMI_RULES[p.bmi_band],
+        ACTIVITY_RULES[(p.activity_level, p.age_group)],
+        SLEEP_RULES[(p.sleep_band, p.age_group)],
+        SLEEP_DISTURBANCE_RULES[p.sleep_disturbance],
+        MENTAL_RULES[(p.mental_health, p.age_group)],
+    ]
+    if p.has_chronic_disease:
+        keys.append('chronic_disease')
+    keys.append(SUBSTANCE_RULES[(p.uses_substances, p.age_group)])
+    if p.gender == 'female':
+        if p.menstrual_regularity:
+            keys.append(MENSTRUAL_RULES[p.menstrual_regularity])
+        if p.has_pregnancy_history:
+            keys.append('pregnancy_history')
+        if p.uses_contraceptives:
+            keys.append('contraceptive_use')
+    keys.append(NUTRITION_RULES[p.age_group])
+    return tuple(keys)
+
+
+def iter_profiles():
+    """Every reachable Profile, for exhaustive checks of the rules."""
+    female_options = list(itertools.product(MENSTRUAL_REGULARITY, (False, True), (False, True)))
+    for (band, group, level, sleep, disturbance, mental, chronic, substances, gender) in itertools.product(
+            [band for _, band in BMI_BANDS] + [BMI_BAND_OVER], AGE_GROUPS, ACTIVITY_LEVELS, SLEEP_BANDS,
+            SLEEP_DISTURBANCES, MENTAL_HEALTH, (False, True), (False, True), GENDERS):
+        for menstrual, pregnancy, contraceptives in (female_options if gender == 'female' else [('', False, False)]):
+            yield Profile(band, group, level, sleep, disturbance, mental, chronic, substances, gender,
+                          menstrual, pregnancy, contraceptives)
+
+
+def all_tip_keys():
+    """Every translation key the rules can produce."""
+    keys = set(BMI_RULES.values()) | set(ACTIVITY_RULES.values()) | set(SLEEP_RULES.values())
+    keys |= set(SLEEP_DISTURBANCE_RULES.values()) | set(MENTAL_RULES.values()) | set(SUBSTANCE_RULES.values())
+    keys |= set(MENSTRUAL_RULES.values()) | set(NUTRITION_RULES.values())
+    keys |= {'chronic_disease', 'pregnancy_history', 'contraceptive_use'}
+    return keys
+
+
+def missing_keys(catalog):
+    """Tip keys the rules can produce that are absent from a translation catalog."""
+    return sorted(key for key in all_tip_keys() if key not in catalog)
@@ -0,0 +1,167 @@
+"""Group-commit write-behind queue for health record inserts.
+
+Requests hand validated rows to an in-process queue; a background thread
+collects them into batches and writes each batch with one executemany inside
+a single transaction, so many submissions share one commit.
+
+A batch that times out on a lock is retried whole, with backoff. Only a
+constraint violation, which one bad row can cause, splits it into single-row
+inserts, so the other rows still commit.
+"""
+import os
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+import time
+
+import db
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class PendingWrite:
+    """Handle for a queued row; wait() blocks until its batch has committed."""
+
+    def __init__(self, values):
+        self.values = values
+        self.error = None
+        self._done = threading.Event()
+
+    def _finish(self, error=None):
+        self.error = error
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the commit and return True, or False if the row is still queued after timeout.
+
+        Re-raises the write error, if any. A timeout is not a failure: the row may still commit.
+        """
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+class WriteBehindQueue:
+    """Background writer that flushes queued rows in batches."""
+
+    def __init__(self, pool, sql, batch_size=100, max_delay=0.05, max_queue=10000, retries=3, retry_delay=0.1):
+        self.pool = pool
+        self.sql = sql
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'failed': 0, 'batches': 0}
+        atexit.register(self.stop)
+
+    def _ensure_started(self):
+        # The writer thread does not survive fork, so each worker starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='health-record-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, values, timeout=5):
+        """Queue one row of insert parameters and return its PendingWrite."""
+        self._ensure_started()
+        pending = PendingWrite(values)
+        try:
+            self._queue.put(pending, timeout=timeout)
+        except queue.Full:
+            raise sqlite3.OperationalError("write-behind queue is full")
+        self.stats['queued'] += 1
+        return pending
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, batch):
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                with self.pool.transaction() as conn:
+                    conn.executemany(self.sql, [pending.values for pending in batch])
+            except sqlite3.IntegrityError as e:
+                logger.error(f"Batch insert of {len(batch)} record(s) violated a constraint, saving individually: {e}")
+                self._write_rows(batch)
+                return
+            except sqlite3.Error as e:
+                if db.is_lock_error(e) and attempt < self.retries:
+                    logger.warning(f"Batch of {len(batch)} record(s) timed out on a lock, retrying in {delay:.2f}s")
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+                logger.error(f"Batch insert of {len(batch)} record(s) failed: {e}")
+                self.stats['failed'] += len(batch)
+                for pending in batch:
+                    pending._finish(e)
+                return
+            self.stats['batches'] += 1
+            self.stats['written'] += len(batch)
+            for pending in batch:
+                pending._finish()
+            return
+
+    def _write_rows(self, batch):
+        for pending in batch:
+            try:
+                with self.pool.transaction() as conn:
+                    conn.execute(self.sql, pending.values)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to save queued health record: {e}")
+                self.stats['failed'] += 1
+                pending._finish(e)
+            else:
+                self.stats['written'] += 1
+                pending._finish()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            self._write(self._collect(item))
+
+    def stop(self, timeout=10):
+        """Flush everything still queued and stop the writer thread."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Write-behind queue did not drain within {timeout}s")
+        else:
+            logger.info(f"Write-behind queue drained ({self.stats['written']} record(s) written)")
+        self._thread = None